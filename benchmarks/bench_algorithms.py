@@ -0,0 +1,103 @@
+"""
+Confronto velocità/qualità degli algoritmi del registry sullo schema PriceRunner.
+
+    python -m benchmarks.bench_algorithms
+    python -m benchmarks.bench_algorithms --algorithms logreg sgd complement_nb --rows 10000
+    python -m benchmarks.bench_algorithms --csv pricerunner_aggregate.csv
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+import joblib
+import pandas as pd
+
+from benchmarks.synthetic import PRICERUNNER_ROWS, synthetic_raw_dataframe
+from src.common.config import FEATURE_COLUMNS
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train.algorithms import ALGORITHMS
+from src.train.core import FeatureSet, _fit_classifier, _to_result, feature_config, featurize
+
+
+def _latency_ms(pipeline: Any, X: pd.DataFrame, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        pipeline.predict(X)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def bench_algorithm(
+    algo: str,
+    features: FeatureSet,
+    X_latency: pd.DataFrame,
+    params: Dict[str, Any],
+    repeats: int,
+) -> Dict[str, Any]:
+    fitted = _fit_classifier(features, algo, params, random_state=42)
+    pipeline = _to_result(features, fitted, algo, params).pipeline
+
+    buf = io.BytesIO()
+    joblib.dump(pipeline, buf)
+
+    # latenza end-to-end (vettorizzazione inclusa) come in inferenza online
+    single = X_latency.iloc[:1]
+    batch = X_latency
+    return {
+        "algo": algo,
+        "model_type": fitted.model_type,
+        "fit_seconds": fitted.fit_seconds,
+        "predict_ms_1_row": _latency_ms(pipeline, single, repeats),
+        "predict_ms_per_row_batch": _latency_ms(pipeline, batch, repeats) / len(batch),
+        "artifact_bytes": len(buf.getvalue()),
+        "f1_macro": fitted.metrics["f1_macro"],
+        "accuracy": fitted.metrics["accuracy"],
+        "has_predict_proba": hasattr(pipeline, "predict_proba"),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", help="CSV raw reale (es. pricerunner_aggregate.csv)")
+    parser.add_argument("--rows", type=int, default=PRICERUNNER_ROWS, help="righe sintetiche se --csv non è dato")
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS))
+    parser.add_argument("--params", default="{}", help='JSON {"algo": {...}} con override per algoritmo')
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    raw = pd.read_csv(args.csv, dtype=str) if args.csv else synthetic_raw_dataframe(args.rows, seed=args.seed)
+    processed = preprocess_dataframe(raw).processed_df
+    config = feature_config()
+
+    t0 = time.perf_counter()
+    features = featurize(processed, config)
+    vectorize_seconds = time.perf_counter() - t0
+
+    # righe per la latenza (la quality si misura su features.X_test)
+    X_latency = processed[FEATURE_COLUMNS].sample(n=min(1000, len(processed)), random_state=args.seed)
+
+    overrides = json.loads(args.params)
+    results = [bench_algorithm(a, features, X_latency, overrides.get(a, {}), args.repeats) for a in args.algorithms]
+    results.sort(key=lambda r: r["fit_seconds"])
+
+    report = {
+        "benchmark": "algorithms",
+        "n_rows": int(len(processed)),
+        "n_features": int(features.X_train.shape[1]),
+        "n_classes": features.n_classes,
+        "vectorize_seconds": vectorize_seconds,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Throughput (righe/s) dei normalizzatori di Product Title.
+
+    python -m benchmarks.bench_text_normalize
+    python -m benchmarks.bench_text_normalize --csv pricerunner_aggregate.csv --min-speedup 1.5
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from benchmarks.synthetic import PRICERUNNER_ROWS, synthetic_raw_dataframe
+from src.common.io_utils import strip_column_names
+from src.preprocess.preprocess_core import TEXT_NORMALIZERS
+
+
+def _best_time(fn, s: pd.Series, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(s)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _python_strings():
+    # Con pandas >= 3 le stringhe sono Arrow-backed e .str.replace(r"\s+") usa RE2 (solo spazi ASCII):
+    # il confronto di identità si fa con la semantica di re/str di Python (dtype object).
+    try:
+        return pd.option_context("future.infer_string", False)
+    except (KeyError, pd.errors.OptionError):
+        return contextlib.nullcontext()
+
+
+def _mismatches(a: pd.Series, b: pd.Series) -> int:
+    return int((a.astype(object) != b.astype(object)).sum())
+
+
+def bench_series(name: str, s: pd.Series, repeats: int) -> Dict[str, Any]:
+    with _python_strings():
+        s_obj = s.astype(object)
+        reference = TEXT_NORMALIZERS["pandas"](s_obj)
+        for engine, fn in TEXT_NORMALIZERS.items():
+            n_diff = _mismatches(fn(s_obj), reference)
+            if n_diff:
+                raise AssertionError(f"Engine '{engine}' output differs from reference on '{name}' ({n_diff} rows)")
+
+    out: Dict[str, Any] = {
+        "dataset": name,
+        "n_rows": int(len(s)),
+        "dtype": str(s.dtype),
+        # righe in cui il backend di stringhe di default (es. Arrow) diverge dalla semantica Python
+        "default_backend_mismatches": _mismatches(TEXT_NORMALIZERS["pandas"](s), TEXT_NORMALIZERS["fast"](s)),
+        "engines": {},
+    }
+
+    for engine, fn in TEXT_NORMALIZERS.items():
+        seconds = _best_time(fn, s, repeats)
+        out["engines"][engine] = {"seconds": seconds, "rows_per_sec": len(s) / seconds if seconds > 0 else None}
+
+    out["speedup_fast_vs_pandas"] = out["engines"]["pandas"]["seconds"] / out["engines"]["fast"]["seconds"]
+    return out
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", help="CSV raw reale (es. pricerunner_aggregate.csv)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-speedup", type=float, default=None, help="exit 1 se fast/pandas scende sotto la soglia")
+    args = parser.parse_args(argv)
+
+    datasets = []
+    if args.csv:
+        df = strip_column_names(pd.read_csv(args.csv, dtype=str))
+        datasets.append(("csv", df["Product Title"]))
+
+    base = synthetic_raw_dataframe(PRICERUNNER_ROWS, seed=args.seed)["Product Title"]
+    datasets.append(("synthetic_pricerunner", base))
+    datasets.append(("synthetic_10x", pd.concat([base] * 10, ignore_index=True)))
+
+    results = [bench_series(name, s, args.repeats) for name, s in datasets]
+    print(json.dumps({"benchmark": "text_normalize", "results": results}, indent=2))
+
+    if args.min_speedup is not None:
+        worst = min(r["speedup_fast_vs_pandas"] for r in results)
+        if worst < args.min_speedup:
+            print(f"Speedup regression: {worst:.2f} < {args.min_speedup:.2f}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Scalabilità di train_model (preprocess -> vettorizzazione -> fit -> predict -> serializzazione)
+su dataset sintetici PriceRunner-like, per dimensione e algoritmo. Report JSON confrontabile.
+
+    python -m benchmarks.bench_train
+    python -m benchmarks.bench_train --sizes 10000 100000 --algorithms logreg sgd --output run.json
+    python -m benchmarks.bench_train --manifest '{"features": {"tfidf_max_features": 50000}}' --compare run.json
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.common.config import FEATURE_COLUMNS
+from src.common.parallel import _child, _mp_context
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train.compact import build_artifact
+from src.train.core import feature_config, featurize, train_on_features
+
+DEFAULT_SIZES = [10_000, 100_000, 500_000, 2_000_000]
+DEFAULT_ALGORITHMS = ["logreg", "sgd", "complement_nb"]
+
+# metriche confrontate da --compare (più alto = peggio)
+COMPARED_METRICS = (
+    "vectorize_seconds",
+    "fit_seconds",
+    "predict_seconds",
+    "serialize_seconds",
+    "total_seconds",
+    "peak_rss_mb",
+    "artifact_bytes",
+)
+
+
+def _rss_mb() -> float:
+    # RSS corrente (Linux); altrove il picco finora
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # macOS: byte, Linux: KiB
+
+
+def _timed(fn, *args, **kwargs) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def run_case(raw: pd.DataFrame, manifest: Dict[str, Any], predict_rows: int) -> Dict[str, Any]:
+    """Un caso (dimensione x algoritmo): gira in un processo figlio dedicato per misurarne il picco di RSS."""
+    baseline_rss = _rss_mb()
+
+    processed, preprocess_seconds = _timed(lambda: preprocess_dataframe(raw).processed_df)
+    # stessi due passi di train_model, cronometrati separatamente
+    features, vectorize_seconds = _timed(featurize, processed, feature_config(manifest))
+    result, fit_seconds = _timed(train_on_features, features, manifest)
+
+    X_predict = processed[FEATURE_COLUMNS].iloc[:predict_rows]
+    _, predict_seconds = _timed(result.pipeline.predict, X_predict)
+    artifact, serialize_seconds = _timed(build_artifact, result.pipeline)
+
+    return {
+        "n_rows_processed": int(len(processed)),
+        "n_features": int(features.X_train.shape[1]),
+        "n_classes": int(features.n_classes),
+        "preprocess_seconds": preprocess_seconds,
+        "vectorize_seconds": vectorize_seconds,
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+        "predict_rows": int(len(X_predict)),
+        "serialize_seconds": serialize_seconds,
+        "total_seconds": preprocess_seconds + vectorize_seconds + fit_seconds + predict_seconds + serialize_seconds,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": _peak_rss_mb(),
+        "artifact_bytes": artifact.stats["bytes"],
+        "artifact_raw_bytes": artifact.stats["raw_bytes"],
+        "accuracy": result.metrics["accuracy"],
+        "f1_macro": result.metrics["f1_macro"],
+    }
+
+
+def _run_in_child(raw: pd.DataFrame, manifest: Dict[str, Any], predict_rows: int) -> Dict[str, Any]:
+    # fork: il dataset raw del padre è ereditato senza copia; il picco di RSS resta del solo figlio
+    ctx = _mp_context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(functools.partial(run_case, raw, manifest), predict_rows, child_conn))
+    proc.start()
+    child_conn.close()
+    try:
+        ok, payload = parent_conn.recv()
+    except EOFError:
+        ok, payload = False, RuntimeError(f"Benchmark process exited with code {proc.exitcode}")
+    finally:
+        parent_conn.close()
+        proc.join()
+    if not ok:
+        raise payload
+    return payload
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Rapporti current/baseline per (n_rows, algo); regression se il rapporto supera 1 + tolerance."""
+    base = {(r["n_rows"], r["algo"]): r for r in baseline.get("results", []) if r.get("status") == "ok"}
+    rows = []
+    for r in current["results"]:
+        b = base.get((r["n_rows"], r["algo"]))
+        if r.get("status") != "ok" or b is None:
+            continue
+        ratios = {m: r[m] / b[m] for m in COMPARED_METRICS if b.get(m)}
+        rows.append({
+            "n_rows": r["n_rows"],
+            "algo": r["algo"],
+            "ratios": ratios,
+            "regressions": sorted(m for m, ratio in ratios.items() if ratio > 1.0 + tolerance),
+        })
+    return rows
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="righe raw sintetiche")
+    parser.add_argument("--algorithms", nargs="+", default=DEFAULT_ALGORITHMS)
+    parser.add_argument("--manifest", default="{}", help="manifest JSON (features/params) applicato a ogni caso")
+    parser.add_argument("--predict-rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="scrive il report JSON anche su file")
+    parser.add_argument("--compare", help="report JSON di riferimento (es. dal deploy precedente)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="con --compare: exit 1 oltre +25%% (default)")
+    args = parser.parse_args(argv)
+
+    base_manifest = json.loads(args.manifest)
+    results = []
+    for n_rows in sorted(args.sizes):
+        raw, generate_seconds = _timed(synthetic_raw_dataframe, n_rows, seed=args.seed)
+        for algo in args.algorithms:
+            manifest = dict(base_manifest, algo=algo)
+            entry: Dict[str, Any] = {"n_rows": n_rows, "algo": algo, "generate_seconds": generate_seconds}
+            try:
+                entry.update(_run_in_child(raw, manifest, args.predict_rows), status="ok")
+            except Exception as e:  # noqa: BLE001 - un caso fallito (es. memoria) non ferma la suite
+                entry.update(status="error", error=f"{type(e).__name__}: {e}")
+            print(f"{n_rows:>9} {algo:<14} {entry['status']} {entry.get('total_seconds', 0):.2f}s", file=sys.stderr)
+            results.append(entry)
+        del raw
+
+    report: Dict[str, Any] = {
+        "benchmark": "train",
+        "created_utc": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "manifest": base_manifest,
+        "seed": args.seed,
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = {
+            "baseline": args.compare,
+            "baseline_created_utc": baseline.get("created_utc"),
+            "tolerance": args.tolerance,
+            "cases": compare(report, baseline, args.tolerance),
+        }
+        regressions = [c for c in report["comparison"]["cases"] if c["regressions"]]
+        for c in regressions:
+            print(f"Regression {c['n_rows']} {c['algo']}: {', '.join(c['regressions'])}", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from src.common.config import RAW_EXPECTED_COLUMNS
+
+# Numero di righe di pricerunner_aggregate.csv
+PRICERUNNER_ROWS = 35311
+
+_BRANDS = [
+    "Samsung", "Apple", "Sony", "LG", "Bosch", "Siemens", "Whirlpool", "Beko", "Hotpoint", "Canon",
+    "Nikon", "Panasonic", "Philips", "Intel", "AMD", "Huawei", "Xiaomi", "Indesit", "Miele", "Fujifilm",
+]
+_CATEGORY_TERMS = {
+    "Mobile Phones": ["galaxy", "iphone", "smartphone", "dual sim", "4g", "5g", "64gb", "128gb", "unlocked"],
+    "TVs": ["4k", "uhd", "smart tv", "oled", "qled", "hdr", "55\"", "65\"", "led"],
+    "CPUs": ["core i7", "core i5", "ryzen 7", "ryzen 5", "3.6ghz", "box", "tray", "socket am4", "lga1151"],
+    "Digital Cameras": ["dslr", "mirrorless", "24mp", "body", "kit", "18-55mm", "lens", "4k video"],
+    "Microwaves": ["microwave", "800w", "solo", "combination", "grill", "20l", "freestanding"],
+    "Dishwashers": ["dishwasher", "integrated", "slimline", "12 place", "a++", "freestanding"],
+    "Washing Machines": ["washing machine", "8kg", "1400 rpm", "a+++", "front loader", "freestanding"],
+    "Freezers": ["freezer", "upright", "chest", "frost free", "a+", "under counter"],
+    "Fridge Freezers": ["fridge freezer", "70/30", "50/50", "frost free", "american style", "a++"],
+    "Fridges": ["fridge", "larder", "under counter", "tall", "a+", "integrated"],
+}
+_COLORS = ["black", "white", "silver", "stainless steel", "graphite", "gold", "blue"]
+# distribuzione delle classi sbilanciata come nel dataset reale
+_CATEGORY_WEIGHTS = np.array([4081, 3564, 3862, 2697, 2342, 3424, 4044, 5501, 5501, 3584], dtype=float)
+
+
+def synthetic_raw_dataframe(
+    n_rows: int,
+    seed: int = 0,
+    n_merchants: int = 306,
+    dirty_fraction: float = 0.15,
+) -> pd.DataFrame:
+    """
+    Dataset raw con lo schema di pricerunner_aggregate.csv:
+    titoli con brand/termini di categoria/codici modello, merchant con cardinalità
+    e popolarità tipo Zipf, classi sbilanciate e una quota di titoli "sporchi"
+    (maiuscole, spazi multipli, tab, valori mancanti).
+    """
+    rng = np.random.default_rng(seed)
+    categories = list(_CATEGORY_TERMS)
+
+    cat_idx = rng.choice(len(categories), size=n_rows, p=_CATEGORY_WEIGHTS / _CATEGORY_WEIGHTS.sum())
+    merchant_ranks = np.minimum(rng.zipf(1.3, size=n_rows), n_merchants)
+    merchants = rng.permutation(n_merchants)[merchant_ranks - 1] + 1
+
+    titles = []
+    for i in range(n_rows):
+        terms = _CATEGORY_TERMS[categories[cat_idx[i]]]
+        words = [_BRANDS[rng.integers(len(_BRANDS))]]
+        words += [terms[j] for j in rng.choice(len(terms), size=rng.integers(1, 4), replace=False)]
+        words.append(f"{chr(65 + rng.integers(26))}{rng.integers(100, 9999)}")
+        if rng.random() < 0.5:
+            words.append(_COLORS[rng.integers(len(_COLORS))])
+        title = " ".join(words)
+        if rng.random() < dirty_fraction:
+            title = "  " + title.upper().replace(" ", rng.choice([" ", "  ", "\t", "  "])) + " "
+        titles.append(title)
+
+    df = pd.DataFrame(
+        {
+            "Product ID": np.arange(1, n_rows + 1).astype(str),
+            "Product Title": titles,
+            "Merchant ID": merchants.astype(str),
+            "Cluster ID": rng.integers(1, n_rows // 3 + 2, size=n_rows).astype(str),
+            "Cluster Label": titles,
+            "Category ID": (cat_idx + 2612).astype(str),
+            "Category Label": [categories[i] for i in cat_idx],
+        },
+        columns=RAW_EXPECTED_COLUMNS,
+    )
+
+    if dirty_fraction > 0:
+        missing = rng.random(n_rows) < dirty_fraction / 20
+        df.loc[missing, "Product Title"] = None
+    return df
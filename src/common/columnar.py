@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+from typing import Dict, Optional
+
+import pandas as pd
+
+from src.common.config import PROCESSED_COLUMNS, TARGET_COLUMN
+from src.common.s3_io import DEFAULT_PART_SIZE, MultipartUploader
+
+# pyarrow è opzionale: senza, il processed dataset resta solo CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+# Colonne a bassa cardinalità: dictionary encoding su disco e categorical in lettura
+DICTIONARY_COLUMNS = ["Merchant ID", TARGET_COLUMN]
+PARQUET_COMPRESSION = "snappy"
+
+
+def columnar_available() -> bool:
+    return pq is not None
+
+
+def _processed_schema():
+    return pa.schema([(c, pa.string()) for c in PROCESSED_COLUMNS])
+
+
+def _to_table(df: pd.DataFrame):
+    return pa.Table.from_pandas(df[PROCESSED_COLUMNS], schema=_processed_schema(), preserve_index=False)
+
+
+def df_to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    pq.write_table(_to_table(df), buf, use_dictionary=DICTIONARY_COLUMNS, compression=PARQUET_COMPRESSION)
+    return buf.getvalue()
+
+
+def read_parquet_bytes(data: bytes) -> pd.DataFrame:
+    table = pq.read_table(io.BytesIO(data), read_dictionary=DICTIONARY_COLUMNS)
+    return table.to_pandas()
+
+
+class ParquetChunkWriter:
+    """
+    Scrive un processed dataset in Parquet un chunk alla volta (un row group per chunk)
+    su un file temporaneo locale (/tmp su Lambda), poi lo carica su S3 a parti.
+    """
+
+    def __init__(self) -> None:
+        fd, self.path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        self._writer = pq.ParquetWriter(
+            self.path,
+            _processed_schema(),
+            use_dictionary=DICTIONARY_COLUMNS,
+            compression=PARQUET_COMPRESSION,
+        )
+
+    def write_chunk(self, df: pd.DataFrame) -> None:
+        self._writer.write_table(_to_table(df))
+
+    def upload(self, s3, bucket: str, key: str, metadata: Optional[Dict[str, str]] = None) -> Optional[str]:
+        self._writer.close()
+        with MultipartUploader(s3, bucket, key, "application/vnd.apache.parquet", metadata=metadata) as uploader:
+            with open(self.path, "rb") as f:
+                for block in iter(lambda: f.read(DEFAULT_PART_SIZE), b""):
+                    uploader.write(block)
+        return uploader.etag
+
+    def discard(self) -> None:
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -15,6 +15,7 @@ PROCESSED_COLUMNS = FEATURE_COLUMNS + [TARGET_COLUMN]
 
 S3_RAW_KEY = "raw/pricerunner/pricerunner_aggregate.csv"
 S3_PROCESSED_KEY = "processed/pricerunner/processed.csv"
+S3_PREPROCESS_MARKERS_PREFIX = "processed/pricerunner/markers"
 S3_SCHEMA_KEY = "processed/pricerunner/schema.json"
 S3_CLASSES_KEY = "processed/pricerunner/classes.json"
 S3_MODEL_KEY = "models/pricerunner/pipeline.joblib"
@@ -24,6 +25,8 @@ S3_MODEL_INFO_KEY = "models/pricerunner/model_info.json"
 S3_MODELS_PREFIX = "models/pricerunner"
 S3_MODEL_VERSIONS_PREFIX = "models/pricerunner/versions"
 S3_MODEL_MARKERS_PREFIX = "models/pricerunner/markers"
+S3_FEATURE_CACHE_PREFIX = "models/pricerunner/feature_cache"
+S3_MODEL_CACHE_PREFIX = "models/pricerunner/cache"
 S3_DEFAULT_POINTER_KEY = "models/pricerunner/default.json"
 
 S3_INFERENCE_INPUT_PREFIX = "inference/input"
@@ -7,10 +7,13 @@ from typing import Dict, Optional
 
 from src.common.config import (
     S3_DEFAULT_POINTER_KEY,
+    S3_FEATURE_CACHE_PREFIX,
     S3_INFERENCE_INPUT_PREFIX,
     S3_INFERENCE_OUTPUT_PREFIX,
+    S3_MODEL_CACHE_PREFIX,
     S3_MODEL_MARKERS_PREFIX,
     S3_MODEL_VERSIONS_PREFIX,
+    S3_PREPROCESS_MARKERS_PREFIX,
 )
 
 
@@ -43,9 +46,11 @@ def preprocess_outputs_for_input_key(input_key: str) -> Dict[str, Optional[str]]
             "mode": "producer",
             "job_id": None,
             "processed": f"{base}/processed.csv",
+            "processed_parquet": f"{base}/processed.parquet",
             "schema": f"{base}/schema.json",
             "classes": f"{base}/classes.json",
             "stats": f"{base}/stats.json",
+            "row_index": f"{base}/row_index.npz",
         }
 
     if input_key.startswith("raw/pricerunner/jobs/"):
@@ -58,14 +63,37 @@ def preprocess_outputs_for_input_key(input_key: str) -> Dict[str, Optional[str]]
             "mode": "job",
             "job_id": job_id,
             "processed": f"{base}/processed.csv",
+            "processed_parquet": f"{base}/processed.parquet",
             "schema": f"{base}/schema.json",
             "classes": f"{base}/classes.json",
             "stats": f"{base}/stats.json",
+            "row_index": f"{base}/row_index.npz",
         }
 
     raise ValueError(f"Unsupported input key: {input_key}")
 
 
+def preprocess_marker_key_for_job(job_id: str, input_etag: str, input_size: int) -> str:
+    return f"{S3_PREPROCESS_MARKERS_PREFIX}/jobs/{job_id}/{input_etag}-{input_size}.json"
+
+
+def preprocess_marker_key_for_producer(input_etag: str, input_size: int) -> str:
+    return f"{S3_PREPROCESS_MARKERS_PREFIX}/producer/{input_etag}-{input_size}.json"
+
+
+def columnar_key_for_processed_key(processed_key: str) -> str:
+    # processed.csv -> processed.parquet (stesso prefisso)
+    if processed_key.endswith(".csv"):
+        return processed_key[: -len(".csv")] + ".parquet"
+    return f"{processed_key}.parquet"
+
+
+def classes_key_for_processed_key(processed_key: str) -> str:
+    # processed.csv e classes.json sono scritti sotto lo stesso prefisso
+    base, _, _ = processed_key.rpartition("/")
+    return f"{base}/classes.json"
+
+
 def parse_context_from_processed_key(processed_key: str) -> Dict[str, Optional[str]]:
     if processed_key.startswith("processed/pricerunner/producer/"):
         return {"mode": "producer", "job_id": None}
@@ -98,6 +126,19 @@ def model_info_key_for_job(job_id: str) -> str:
     return f"{version_prefix_for_job(job_id)}/model_info.json"
 
 
+def sweep_candidate_prefix(version_prefix: str, candidate_id: str) -> str:
+    return f"{version_prefix}/candidates/{candidate_id}"
+
+
+def inference_bundle_key_for_model_key(model_key: str) -> str:
+    # bundle NumPy accanto a pipeline.joblib (stesso version prefix)
+    return f"{model_key.rsplit('/', 1)[0]}/inference_bundle.npz"
+
+
+def checkpoint_prefix(version_prefix: str) -> str:
+    return f"{version_prefix}/checkpoint"
+
+
 def marker_key_for_job(job_id: str, processed_etag: str) -> str:
     return f"{S3_MODEL_MARKERS_PREFIX}/jobs/{job_id}/{processed_etag}.json"
 
@@ -106,6 +147,14 @@ def marker_key_for_producer(processed_etag: str) -> str:
     return f"{S3_MODEL_MARKERS_PREFIX}/producer/{processed_etag}.json"
 
 
+def feature_cache_prefix(content_id: str, config_id: str) -> str:
+    return f"{S3_FEATURE_CACHE_PREFIX}/{content_id}/{config_id}"
+
+
+def model_cache_prefix(cache_key: str) -> str:
+    return f"{S3_MODEL_CACHE_PREFIX}/{cache_key}"
+
+
 def default_pointer_key() -> str:
     return S3_DEFAULT_POINTER_KEY
 
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+from multiprocessing.connection import wait
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def _mp_context():
+    # fork: gli argomenti (anche grandi buffer/matrici) sono ereditati senza pickling
+    if "fork" in mp.get_all_start_methods():
+        return mp.get_context("fork")
+    return mp.get_context()
+
+
+def _child(func: Callable, item, conn) -> None:
+    try:
+        conn.send((True, func(item)))
+    except BaseException as e:  # noqa: BLE001 - l'errore viene rilanciato nel processo padre
+        try:
+            conn.send((False, e))
+        except Exception:
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+    finally:
+        conn.close()
+
+
+def map_in_processes(func: Callable[[T], R], items: Sequence[T], workers: Optional[int] = None) -> List[R]:
+    """
+    Applica func a ogni item in processi separati (al più workers alla volta) e ritorna
+    i risultati nell'ordine degli item. Usa Process + Pipe perché multiprocessing.Pool/Queue
+    non funzionano su Lambda (manca /dev/shm). Con workers <= 1 esegue tutto inline.
+    """
+    workers = default_workers() if workers is None else int(workers)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    ctx = _mp_context()
+    results: List = [None] * len(items)
+    pending = list(enumerate(items))
+    running = {}
+
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                idx, item = pending.pop(0)
+                parent_conn, child_conn = ctx.Pipe(duplex=False)
+                proc = ctx.Process(target=_child, args=(func, item, child_conn), daemon=True)
+                proc.start()
+                child_conn.close()
+                running[parent_conn] = (idx, proc)
+
+            for conn in wait(list(running)):
+                idx, proc = running.pop(conn)
+                try:
+                    ok, payload = conn.recv()
+                except EOFError:
+                    proc.join()
+                    ok, payload = False, RuntimeError(f"Worker process exited with code {proc.exitcode}")
+                conn.close()
+                proc.join()
+                if not ok:
+                    raise payload
+                results[idx] = payload
+    finally:
+        for conn, (_, proc) in running.items():
+            proc.terminate()
+            proc.join()
+            conn.close()
+
+    return results
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+from src.common.columnar import columnar_available, pq, read_parquet_bytes
+from src.common.keys import classes_key_for_processed_key, columnar_key_for_processed_key
+from src.common.s3_io import head_or_none, read_json, safe_etag
+
+# User metadata S3 con cui il preprocess marca processed.csv e processed.parquet della stessa run:
+# il parquet vale come copia di processed.csv solo se la generazione coincide
+PROCESSED_GENERATION_METADATA = "processed-generation"
+
+
+# sha256 (hex) del contenuto di processed.csv, registrato dal preprocess: identità del dataset per
+# feature cache e model cache. L'ETag dipende da come è stato caricato (put singolo o multipart,
+# dimensione delle parti, copia server-side), quindi contenuti identici possono avere ETag diversi
+PROCESSED_SHA256_METADATA = "content-sha256"
+
+
+def processed_generation(head: Dict[str, Any]) -> Optional[str]:
+    return (head.get("Metadata") or {}).get(PROCESSED_GENERATION_METADATA) or None
+
+
+def processed_content_id(head: Dict[str, Any]) -> str:
+    """sha256 del contenuto di processed.csv; ETag per i dataset scritti senza la metadata."""
+    return (head.get("Metadata") or {}).get(PROCESSED_SHA256_METADATA) or safe_etag(head.get("ETag", ""))
+
+
+def matching_parquet_head(s3, bucket: str, processed_key: str, processed_head: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Head di processed.parquet se è della stessa generazione di processed.csv (processed_head), altrimenti None:
+    un parquet di una run precedente o di una run interrotta prima di scrivere il csv non va letto.
+    """
+    generation = processed_generation(processed_head)
+    if not columnar_available() or generation is None:
+        return None
+    head = head_or_none(s3, bucket, columnar_key_for_processed_key(processed_key))
+    if head is None or processed_generation(head) != generation:
+        return None
+    return head
+
+
+def _is_precondition_failed(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code", "") in ("PreconditionFailed", "412")
+
+
+def load_processed_dataframe(s3, bucket: str, processed_key: str) -> Tuple[pd.DataFrame, str]:
+    """
+    Carica un processed dataset preferendo l'artefatto Parquet accanto a processed.csv,
+    se è della stessa generazione; altrimenti processed.csv, letto con IfMatch sull'ETag del head.
+    Ritorna: (df, formato letto: "parquet" | "csv")
+    """
+    head = s3.head_object(Bucket=bucket, Key=processed_key)
+    parquet_head = matching_parquet_head(s3, bucket, processed_key, head)
+    if parquet_head is not None:
+        try:
+            obj = s3.get_object(Bucket=bucket, Key=columnar_key_for_processed_key(processed_key), IfMatch=parquet_head["ETag"])
+            return read_parquet_bytes(obj["Body"].read()), "parquet"
+        except ClientError as e:
+            # parquet riscritto da una nuova run dopo il head: si ripiega sul csv
+            if not _is_precondition_failed(e):
+                raise
+
+    processed_bytes = s3.get_object(Bucket=bucket, Key=processed_key, IfMatch=head["ETag"])["Body"].read()
+    return pd.read_csv(io.BytesIO(processed_bytes), dtype=str), "csv"
+
+
+def iter_processed_chunks(s3, bucket: str, processed_key: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Legge un processed dataset a chunk di chunk_rows righe con memoria limitata:
+    Parquet (stessa generazione di processed.csv) scaricato su file temporaneo e letto per batch,
+    altrimenti il body di processed.csv in streaming.
+    """
+    head = s3.head_object(Bucket=bucket, Key=processed_key)
+    parquet_head = matching_parquet_head(s3, bucket, processed_key, head)
+    if parquet_head is not None:
+        fd, path = tempfile.mkstemp(suffix=".parquet")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                s3.download_fileobj(
+                    bucket, columnar_key_for_processed_key(processed_key), f, ExtraArgs={"IfMatch": parquet_head["ETag"]}
+                )
+            parquet = pq.ParquetFile(path)
+            for batch in parquet.iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        finally:
+            os.remove(path)
+        return
+
+    body = s3.get_object(Bucket=bucket, Key=processed_key, IfMatch=head["ETag"])["Body"]
+    yield from pd.read_csv(body, dtype=str, chunksize=chunk_rows)
+
+
+def load_processed_classes(s3, bucket: str, processed_key: str) -> Optional[List[str]]:
+    try:
+        payload = read_json(s3, bucket, classes_key_for_processed_key(processed_key))
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return [str(c) for c in payload.get("classes", [])] or None
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import io
 import json
+import os
 import re
+import tempfile
 from typing import Any, Dict, Optional
 
 import boto3
@@ -13,17 +17,21 @@ def safe_etag(etag: str) -> str:
     return re.sub(r"[^a-zA-Z0-9\-]", "", etag)
 
 
-def exists(s3, bucket: str, key: str) -> bool:
+def head_or_none(s3, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+    # head_object, None se l'oggetto non esiste
     try:
-        s3.head_object(Bucket=bucket, Key=key)
-        return True
+        return s3.head_object(Bucket=bucket, Key=key)
     except ClientError as e:
         code = e.response.get("Error", {}).get("Code", "")
         if code in ("404", "NoSuchKey", "NotFound"):
-            return False
+            return None
         raise
 
 
+def exists(s3, bucket: str, key: str) -> bool:
+    return head_or_none(s3, bucket, key) is not None
+
+
 def read_bytes(s3, bucket: str, key: str) -> bytes:
     obj = s3.get_object(Bucket=bucket, Key=key)
     return obj["Body"].read()
@@ -42,5 +50,176 @@ def put_json(s3, bucket: str, key: str, obj: Dict[str, Any]) -> None:
     put_bytes(s3, bucket, key, json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"), "application/json")
 
 
+# S3: tutte le parti di un multipart upload tranne l'ultima devono essere >= 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAX_COPY_PART_SIZE = 5 * 1024 * 1024 * 1024
+
+
+class MultipartUploader:
+    """
+    Scrittura incrementale di un oggetto S3.
+    I dati vengono bufferizzati fino a part_size e inviati come parti di un
+    multipart upload; se il totale resta sotto part_size si usa un singolo put_object.
+    metadata (opzionale) diventa la user metadata S3 (x-amz-meta-*) dell'oggetto.
+    Uso:
+        with MultipartUploader(s3, bucket, key, "text/csv") as up:
+            up.write(b"...")
+        up.etag
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        key: str,
+        content_type: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        metadata: Optional[Dict[str, str]] = None,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be >= {MIN_PART_SIZE} bytes")
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self._extra = {"Metadata": dict(metadata)} if metadata else {}
+        self.part_size = part_size
+        self.etag: Optional[str] = None
+        self.bytes_written = 0
+        self._buf = io.BytesIO()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    def write(self, data: bytes) -> None:
+        self._buf.write(data)
+        self.bytes_written += len(data)
+        if self._buf.tell() >= self.part_size:
+            self._flush_part()
+
+    def _ensure_upload(self) -> None:
+        if self._upload_id is None:
+            resp = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type, **self._extra
+            )
+            self._upload_id = resp["UploadId"]
+
+    def copy_from(self, source_key: str, source_size: int, source_etag: Optional[str] = None) -> None:
+        """
+        Accoda il contenuto di un oggetto esistente dello stesso bucket (anche la chiave di destinazione).
+        Con buffer vuoto e sorgente >= MIN_PART_SIZE la copia è server-side (UploadPartCopy),
+        altrimenti l'oggetto viene scaricato e scritto come dati normali.
+        """
+        if self._buf.tell() > 0 or source_size < MIN_PART_SIZE:
+            self.write(read_bytes(self.s3, self.bucket, source_key))
+            return
+
+        self._ensure_upload()
+        copy_source = {"Bucket": self.bucket, "Key": source_key}
+        extra = {"CopySourceIfMatch": source_etag} if source_etag else {}
+
+        n_copy_parts = -(-source_size // MAX_COPY_PART_SIZE)
+        step = -(-source_size // n_copy_parts)
+        for start in range(0, source_size, step):
+            end = min(start + step, source_size) - 1
+            part_number = len(self._parts) + 1
+            resp = self.s3.upload_part_copy(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                CopySource=copy_source,
+                CopySourceRange=f"bytes={start}-{end}",
+                **extra,
+            )
+            self._parts.append({"ETag": resp["CopyPartResult"]["ETag"], "PartNumber": part_number})
+        self.bytes_written += source_size
+
+    def _flush_part(self) -> None:
+        self._ensure_upload()
+
+        part_number = len(self._parts) + 1
+        resp = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=self._buf.getvalue(),
+        )
+        self._parts.append({"ETag": resp["ETag"], "PartNumber": part_number})
+        self._buf = io.BytesIO()
+
+    def close(self) -> str:
+        if self._upload_id is None:
+            resp = self.s3.put_object(
+                Bucket=self.bucket, Key=self.key, Body=self._buf.getvalue(), ContentType=self.content_type, **self._extra
+            )
+        else:
+            if self._buf.tell() > 0:
+                self._flush_part()
+            resp = self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buf = io.BytesIO()
+        self.etag = resp.get("ETag")
+        return self.etag
+
+    def abort(self) -> None:
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._buf = io.BytesIO()
+
+    def __enter__(self) -> "MultipartUploader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class SpooledUpload:
+    """
+    Oggetto S3 scritto prima su un file temporaneo locale (/tmp su Lambda) e caricato a parti
+    solo alla fine: lo sha256 del contenuto è noto prima dell'upload e può andare nella
+    user metadata, che S3 fissa alla creazione dell'oggetto (anche per i multipart upload).
+    """
+
+    def __init__(self) -> None:
+        fd, self.path = tempfile.mkstemp()
+        self._file = os.fdopen(fd, "wb")
+        self._sha256 = hashlib.sha256()
+        self.bytes_written = 0
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._sha256.update(data)
+        self.bytes_written += len(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def upload(
+        self, s3, bucket: str, key: str, content_type: str, metadata: Optional[Dict[str, str]] = None
+    ) -> Optional[str]:
+        self._file.close()
+        with MultipartUploader(s3, bucket, key, content_type, metadata=metadata) as uploader:
+            with open(self.path, "rb") as f:
+                for block in iter(lambda: f.read(DEFAULT_PART_SIZE), b""):
+                    uploader.write(block)
+        return uploader.etag
+
+    def discard(self) -> None:
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 def s3_client_default():
     return boto3.client("s3")
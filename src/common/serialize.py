@@ -11,7 +11,7 @@ def json_bytes(obj: Dict[str, Any]) -> bytes:
     return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
 
 
-def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+def df_to_csv_bytes(df: pd.DataFrame, header: bool = True) -> bytes:
     buf = io.StringIO()
-    df.to_csv(buf, index=False)
+    df.to_csv(buf, index=False, header=header)
     return buf.getvalue().encode("utf-8")
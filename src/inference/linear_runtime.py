@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import io
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+from scipy import sparse
+
+# Formati di inference_bundle.npz supportati (vedi src/train/bundle.py)
+SUPPORTED_FORMAT_VERSIONS = (1,)
+
+
+class LinearBundleModel:
+    """
+    Runtime NumPy/SciPy per inference_bundle.npz: stesse predizioni e probabilità della
+    Pipeline sklearn (TF-IDF titolo + one-hot merchant + classificatore lineare), senza
+    importare sklearn né fare unpickle.
+    Espone predict / predict_proba / classes_ come la Pipeline.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        version = int(arrays["format_version"])
+        if version not in SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported inference bundle format_version {version}")
+
+        self.model_etag = str(arrays["model_etag"])
+        self.probability = str(arrays["probability"])
+        self.classes_ = arrays["classes"].astype(object)
+
+        self._vocabulary = {term: j for j, term in enumerate(arrays["vocabulary"].tolist())}
+        self._n_terms = len(self._vocabulary)
+        self._min_n, self._max_n = (int(n) for n in arrays["ngram_range"])
+        self._token_re = re.compile(str(arrays["token_pattern"]))
+        self._lowercase = bool(arrays["lowercase"])
+        self._sublinear_tf = bool(arrays["sublinear_tf"])
+        self._norm = str(arrays["norm"]) or None
+        self._idf = arrays["idf"]
+
+        self._merchants = {m: j for j, m in enumerate(arrays["merchant_categories"].tolist())}
+
+        if "coef" in arrays:
+            self._coef_t = arrays["coef"].T
+        else:
+            coef = sparse.csr_matrix(
+                (arrays["coef_data"], arrays["coef_indices"], arrays["coef_indptr"]),
+                shape=tuple(int(n) for n in arrays["coef_shape"]),
+            )
+            self._coef_t = coef.T.tocsr()
+        self._intercept = arrays["intercept"]
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LinearBundleModel":
+        with np.load(io.BytesIO(data), allow_pickle=False) as z:
+            return cls({name: z[name] for name in z.files})
+
+    # ---------- features ----------
+    def _terms(self, doc: Any) -> List[str]:
+        if not isinstance(doc, str):
+            # come TfidfVectorizer: un titolo mancante non è un documento valido
+            raise ValueError("np.nan is an invalid document, expected byte or unicode string.")
+        if self._lowercase:
+            doc = doc.lower()
+        tokens = self._token_re.findall(doc)
+        if self._max_n == 1:
+            return tokens
+        terms = list(tokens) if self._min_n == 1 else []
+        for n in range(max(self._min_n, 2), self._max_n + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def _tfidf(self, titles: List[Any]) -> sparse.csr_matrix:
+        indptr = [0]
+        indices: List[int] = []
+        for doc in titles:
+            for term in self._terms(doc):
+                j = self._vocabulary.get(term)
+                if j is not None:
+                    indices.append(j)
+            indptr.append(len(indices))
+
+        X = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(titles), self._n_terms),
+        )
+        X.sum_duplicates()  # conteggi per termine, indici ordinati
+
+        if self._sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        X.data *= self._idf[X.indices]
+
+        if self._norm is not None:
+            row_ids = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            values = X.data * X.data if self._norm == "l2" else np.abs(X.data)
+            norms = np.bincount(row_ids, weights=values, minlength=X.shape[0])
+            if self._norm == "l2":
+                norms = np.sqrt(norms)
+            norms[norms == 0.0] = 1.0
+            X.data /= norms[row_ids]
+        return X
+
+    def _merchant_onehot(self, merchants: List[Any]) -> sparse.csr_matrix:
+        # categorie sconosciute -> riga vuota (handle_unknown="ignore")
+        cols = [self._merchants.get(m) for m in merchants]
+        rows = [i for i, j in enumerate(cols) if j is not None]
+        data = np.ones(len(rows), dtype=np.float64)
+        return sparse.csr_matrix(
+            (data, (rows, [cols[i] for i in rows])),
+            shape=(len(merchants), len(self._merchants)),
+        )
+
+    def _features(self, X: Any) -> sparse.csr_matrix:
+        titles = X["Product Title"].tolist()
+        merchants = X["Merchant ID"].tolist()
+        return sparse.hstack([self._tfidf(titles), self._merchant_onehot(merchants)], format="csr")
+
+    # ---------- scoring ----------
+    def decision_function(self, X: Any) -> np.ndarray:
+        scores = self._features(X) @ self._coef_t
+        if sparse.issparse(scores):
+            scores = scores.toarray()
+        scores = np.asarray(scores) + self._intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        scores = self.decision_function(X)
+        if self.probability == "softmax":
+            scores = scores - scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+            scores /= scores.sum(axis=1, keepdims=True)
+            return scores
+
+        prob = 1.0 / (1.0 + np.exp(-scores))
+        if prob.ndim == 1:
+            return np.stack([1 - prob, prob], axis=1)
+        prob_sum = prob.sum(axis=1)
+        all_zero = prob_sum == 0
+        if np.any(all_zero):
+            prob[all_zero, :] = 1
+            prob_sum[all_zero] = prob.shape[1]
+        prob /= prob_sum.reshape((prob.shape[0], -1))
+        return prob
+
+    def predict(self, X: Any) -> np.ndarray:
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
@@ -2,17 +2,213 @@ from __future__ import annotations
 
 import io
 import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 from typing import Any, Dict, Optional, Tuple
 
-import joblib
 from botocore.exceptions import ClientError
 
 from src.common.config import S3_DEFAULT_POINTER_KEY
-from src.common.s3_io import read_json
+from src.common.keys import inference_bundle_key_for_model_key
+from src.common.s3_io import read_bytes
+from src.inference.linear_runtime import LinearBundleModel
 
-_MODEL = None
-_MODEL_ETAG = None
-_MODEL_KEY = None
+# Usa inference_bundle.npz (runtime NumPy, niente sklearn/unpickle) quando esiste per il modello
+INFERENCE_USE_BUNDLE = os.environ.get("INFERENCE_USE_BUNDLE", "1") == "1"
+
+# Modelli tenuti in memoria tra invocazioni (LRU): numero massimo e budget in byte (0 = nessun limite)
+INFERENCE_MODEL_CACHE_MAX_MODELS = int(os.environ.get("INFERENCE_MODEL_CACHE_MAX_MODELS", "4"))
+INFERENCE_MODEL_CACHE_MAX_BYTES = int(os.environ.get("INFERENCE_MODEL_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Per quanti secondi default.json e l'ETag di un modello già verificati si considerano validi
+# senza chiamate S3 (0 = verifica a ogni richiesta); allo scadere default.json si rilegge con
+# GET condizionale (IfNoneMatch -> 304 se invariato)
+INFERENCE_REVALIDATE_SECONDS = float(os.environ.get("INFERENCE_REVALIDATE_SECONDS", "30"))
+INFERENCE_CONDITIONAL_GET = os.environ.get("INFERENCE_CONDITIONAL_GET", "1") == "1"
+
+# Hot swap: se default.json punta a un modello non ancora in memoria, le richieste continuano a
+# usare il modello corrente mentre il nuovo si carica in un thread in background
+INFERENCE_HOT_SWAP = os.environ.get("INFERENCE_HOT_SWAP", "1") == "1"
+
+
+def estimate_nbytes(obj: Any) -> int:
+    """
+    Stima della memoria occupata da un modello: array NumPy/SciPy (nbytes) più i contenitori
+    Python (es. vocabolario TF-IDF), visitando ogni oggetto una sola volta. Gli oggetti sono
+    visitati tramite __getstate__ (lo stato che finisce nel pickle): copre anche le estensioni
+    Cython senza __dict__ come gli alberi delle foreste.
+    """
+    seen: Dict[int, Any] = {}  # tiene vivi anche gli stati temporanei: id() non riusati
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen[id(o)] = o
+        nbytes = getattr(o, "nbytes", None)
+        if isinstance(nbytes, int) and hasattr(o, "dtype"):
+            # ndarray: i dati (dtype object: anche gli elementi)
+            total += nbytes
+            if o.dtype == object:
+                stack.extend(o.ravel().tolist())
+            continue
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, (str, bytes, int, float, bool, type(None))):
+            continue
+        else:
+            try:
+                state = o.__getstate__()
+            except (AttributeError, TypeError):
+                state = getattr(o, "__dict__", None)
+            if state is not None:
+                stack.append(state)
+    return total
+
+
+@dataclass(frozen=True)
+class _CachedModel:
+    model: Any
+    etag: Optional[str]
+    nbytes: int
+
+
+class ModelCache:
+    """
+    Cache LRU dei modelli per model_key, valida finché l'ETag su S3 non cambia.
+    Evict del meno recente oltre max_models o max_bytes (l'ultimo caricato resta sempre).
+    Ogni entry ricorda quando il suo ETag è stato verificato l'ultima volta (fresh).
+    """
+
+    def __init__(self, max_models: int, max_bytes: int):
+        self.max_models = max(1, int(max_models))
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[str, _CachedModel]" = OrderedDict()
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fresh_hits = 0  # hit senza head_object (ETag verificato da meno del TTL)
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0  # model_key presente ma con ETag diverso (ricaricato)
+
+    def fresh(self, model_key: str, max_age: float) -> Optional[Any]:
+        """Modello il cui ETag è stato verificato da meno di max_age secondi, altrimenti None."""
+        with self._lock:
+            entry = self._entries.get(model_key)
+            checked_at = self._checked_at.get(model_key)
+            if entry is None or checked_at is None or time.monotonic() - checked_at >= max_age:
+                return None
+            self._entries.move_to_end(model_key)
+            self.hits += 1
+            self.fresh_hits += 1
+            return entry.model
+
+    def etag_of(self, model_key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(model_key)
+            return entry.etag if entry is not None else None
+
+    def get(self, model_key: str, etag: Optional[str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(model_key)
+            if entry is not None and entry.etag == etag:
+                self._entries.move_to_end(model_key)
+                self._checked_at[model_key] = time.monotonic()
+                self.hits += 1
+                return entry.model
+            if entry is not None:
+                self.stale += 1
+            self.misses += 1
+            return None
+
+    def put(self, model_key: str, etag: Optional[str], model: Any) -> None:
+        entry = _CachedModel(model=model, etag=etag, nbytes=estimate_nbytes(model))
+        with self._lock:
+            self._entries.pop(model_key, None)
+            self._entries[model_key] = entry
+            self._checked_at[model_key] = time.monotonic()
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models
+                or (self.max_bytes > 0 and self.total_bytes() > self.max_bytes)
+            ):
+                evicted, _ = self._entries.popitem(last=False)
+                self._checked_at.pop(evicted, None)
+                self.evictions += 1
+
+    def total_bytes(self) -> int:
+        return sum(e.nbytes for e in self._entries.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._checked_at.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "bytes": self.total_bytes(),
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "fresh_hits": self.fresh_hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "entries": [{"model_key": k, "etag": e.etag, "bytes": e.nbytes} for k, e in self._entries.items()],
+            }
+
+
+_MODEL_CACHE = ModelCache(INFERENCE_MODEL_CACHE_MAX_MODELS, INFERENCE_MODEL_CACHE_MAX_BYTES)
+
+
+def cache_stats() -> Dict[str, Any]:
+    stats = _MODEL_CACHE.stats()
+    stats["hot_swap"] = _HOT_SWAP.stats()
+    return stats
+
+
+@dataclass(frozen=True)
+class _Pointer:
+    value: Dict[str, Any]
+    etag: Optional[str]
+    checked_at: float
+
+
+# default.json per bucket, con l'ETag per la rilettura condizionale
+_POINTERS: Dict[str, _Pointer] = {}
+
+
+def _read_default_pointer(s3, bucket: str) -> Dict[str, Any]:
+    cached = _POINTERS.get(bucket)
+    now = time.monotonic()
+    if cached is not None and now - cached.checked_at < INFERENCE_REVALIDATE_SECONDS:
+        return cached.value
+
+    extra = {"IfNoneMatch": cached.etag} if (cached is not None and cached.etag and INFERENCE_CONDITIONAL_GET) else {}
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=S3_DEFAULT_POINTER_KEY, **extra)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code in ("304", "NotModified"):
+            _POINTERS[bucket] = _Pointer(value=cached.value, etag=cached.etag, checked_at=now)
+            return cached.value
+        _POINTERS.pop(bucket, None)
+        raise
+
+    value = json.loads(obj["Body"].read().decode("utf-8"))
+    _POINTERS[bucket] = _Pointer(value=value, etag=obj.get("ETag"), checked_at=now)
+    return value
 
 
 def resolve_model_key(s3, bucket: str, event_context: Dict[str, Any]) -> Tuple[str, str, Optional[Dict[str, Any]]]:
@@ -20,7 +216,7 @@ def resolve_model_key(s3, bucket: str, event_context: Dict[str, Any]) -> Tuple[s
         return event_context["model_key"], "event_override", None
 
     try:
-        default = read_json(s3, bucket, S3_DEFAULT_POINTER_KEY)
+        default = _read_default_pointer(s3, bucket)
         if default.get("model_key"):
             return default["model_key"], "default_pointer", default
     except ClientError as e:
@@ -34,19 +230,156 @@ def resolve_model_key(s3, bucket: str, event_context: Dict[str, Any]) -> Tuple[s
     )
 
 
+def _load_bundle(s3, bucket: str, model_key: str, model_etag: Optional[str]) -> Optional[LinearBundleModel]:
+    try:
+        data = read_bytes(s3, bucket, inference_bundle_key_for_model_key(model_key))
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code in ("NoSuchKey", "404", "NotFound"):
+            return None
+        raise
+    bundle = LinearBundleModel.from_bytes(data)
+    # bundle di un pipeline.joblib diverso (es. sovrascritto da un nuovo training): si usa joblib
+    if bundle.model_etag != model_etag:
+        return None
+    return bundle
+
+
+def _load_model(s3, bucket: str, model_key: str, etag: Optional[str]) -> Any:
+    model = _load_bundle(s3, bucket, model_key, etag) if INFERENCE_USE_BUNDLE else None
+    if model is None:
+        # import ritardato: joblib + unpickle della Pipeline importano sklearn
+        import joblib
+
+        obj = s3.get_object(Bucket=bucket, Key=model_key)
+        model = joblib.load(io.BytesIO(obj["Body"].read()))
+    _MODEL_CACHE.put(model_key, etag, model)
+    return model
+
+
 def load_model_cached(s3, bucket: str, model_key: str) -> Any:
-    global _MODEL, _MODEL_ETAG, _MODEL_KEY
+    # percorso caldo: ETag verificato da meno di INFERENCE_REVALIDATE_SECONDS, nessuna chiamata S3
+    model = _MODEL_CACHE.fresh(model_key, INFERENCE_REVALIDATE_SECONDS)
+    if model is not None:
+        return model
+
     head = s3.head_object(Bucket=bucket, Key=model_key)
     etag = head.get("ETag")
-    if _MODEL is not None and _MODEL_KEY == model_key and _MODEL_ETAG == etag:
-        return _MODEL
-
-    obj = s3.get_object(Bucket=bucket, Key=model_key)
-    model = joblib.load(io.BytesIO(obj["Body"].read()))
-    _MODEL = model
-    _MODEL_KEY = model_key
-    _MODEL_ETAG = etag
-    return model
+    model = _MODEL_CACHE.get(model_key, etag)
+    if model is not None:
+        return model
+    return _load_model(s3, bucket, model_key, etag)
+
+
+@dataclass(frozen=True)
+class ServingModel:
+    """Il modello che risponde a una richiesta, con la provenienza da riportare nella risposta."""
+    model: Any
+    model_key: str
+    source: str
+    default_pointer: Optional[Dict[str, Any]]
+    etag: Optional[str] = None
+    swap_pending: bool = False  # default.json punta già a un modello che si sta caricando
+
+
+class _HotSwap:
+    """
+    Modello del default pointer che sta rispondendo (per bucket) e caricamento in background
+    del successivo: lo swap avviene sotto lock solo a modello pronto. Su Lambda il thread avanza
+    durante le invocazioni successive (l'ambiente è congelato tra una richiesta e l'altra).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._serving: Dict[str, ServingModel] = {}
+        self._pending: Dict[str, Tuple[str, Optional[str]]] = {}
+        self.swaps = 0
+        self.background_loads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def serving(self, bucket: str) -> Optional[ServingModel]:
+        with self._lock:
+            return self._serving.get(bucket)
+
+    def set_serving(self, bucket: str, serving: ServingModel) -> None:
+        with self._lock:
+            self._serving[bucket] = serving
+
+    def start(self, s3, bucket: str, pointer: Dict[str, Any], model_key: str, etag: Optional[str]) -> None:
+        with self._lock:
+            if self._pending.get(bucket) == (model_key, etag):
+                return
+            self._pending[bucket] = (model_key, etag)
+            self.background_loads += 1
+        threading.Thread(
+            target=self._run, args=(s3, bucket, pointer, model_key, etag), name="model-hot-swap", daemon=True
+        ).start()
+
+    def _run(self, s3, bucket: str, pointer: Dict[str, Any], model_key: str, etag: Optional[str]) -> None:
+        try:
+            model = _load_model(s3, bucket, model_key, etag)
+        except Exception as e:  # noqa: BLE001 - si continua col modello corrente, nuovo tentativo alla prossima richiesta
+            with self._lock:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._pending.pop(bucket, None)
+            return
+        with self._lock:
+            # swap solo se nel frattempo default.json non è passato a un altro modello
+            if self._pending.get(bucket) == (model_key, etag):
+                self._serving[bucket] = ServingModel(model, model_key, "default_pointer", pointer, etag)
+                self._pending.pop(bucket, None)
+                self.swaps += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": INFERENCE_HOT_SWAP,
+                "pending": {b: k for b, (k, _) in self._pending.items()},
+                "swaps": self.swaps,
+                "background_loads": self.background_loads,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+_HOT_SWAP = _HotSwap()
+
+
+def get_model(s3, bucket: str, event_context: Dict[str, Any]) -> ServingModel:
+    """
+    Risolve e carica il modello della richiesta. Con model_key esplicito (o hot swap spento) il
+    caricamento è sincrono; per il default pointer, se il modello puntato non è ancora in memoria
+    risponde il modello corrente e il nuovo si carica in background (stale-while-revalidate).
+    """
+    model_key, source, default_ptr = resolve_model_key(s3, bucket, event_context)
+    if source != "default_pointer" or not INFERENCE_HOT_SWAP:
+        return ServingModel(load_model_cached(s3, bucket, model_key), model_key, source, default_ptr)
+
+    model = _MODEL_CACHE.fresh(model_key, INFERENCE_REVALIDATE_SECONDS)
+    if model is not None:
+        etag = _MODEL_CACHE.etag_of(model_key)
+    else:
+        etag = s3.head_object(Bucket=bucket, Key=model_key).get("ETag")
+        model = _MODEL_CACHE.get(model_key, etag)
+
+    current = _HOT_SWAP.serving(bucket)
+    if model is None and current is not None and (current.model_key, current.etag) == (model_key, etag):
+        # già caricato in background ma uscito dalla cache LRU
+        model = current.model
+        _MODEL_CACHE.put(model_key, etag, model)
+    if model is None and current is not None:
+        _HOT_SWAP.start(s3, bucket, default_ptr, model_key, etag)
+        return replace(current, swap_pending=True)
+    if model is None:
+        # primo caricamento del container: non c'è un modello con cui rispondere
+        model = _load_model(s3, bucket, model_key, etag)
+
+    if current is None or current.model is not model or current.default_pointer != default_ptr:
+        current = ServingModel(model, model_key, source, default_ptr, etag)
+        _HOT_SWAP.set_serving(bucket, current)
+    return current
 
 
 def get_classes(model: Any):
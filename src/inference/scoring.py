@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Scores:
+    labels: np.ndarray  # etichetta predetta per riga
+    confidence: Optional[np.ndarray] = None  # probabilità dell'etichetta predetta
+    topk_labels: Optional[np.ndarray] = None  # (n, k), probabilità decrescente
+    topk_probs: Optional[np.ndarray] = None
+
+
+def top_k_indices(proba: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indici delle k classi più probabili per riga, in ordine decrescente: argpartition seleziona
+    le k colonne in O(n_classes), poi si ordina solo la fetta (n, k). A parità di probabilità
+    vince l'indice di classe minore, come sorted(..., reverse=True) sull'intera riga.
+    """
+    n_rows, n_classes = proba.shape
+    k = max(0, min(int(k), n_classes))
+    if k == 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+    if k < n_classes:
+        idx = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+        # parità a cavallo della k-esima posizione (es. foreste): argpartition sceglie a caso tra
+        # le classi in parità, per quelle righe si ordina l'intera riga in modo stabile
+        kth = np.take_along_axis(proba, idx, axis=1).min(axis=1)
+        tied = (proba >= kth[:, None]).sum(axis=1) > k
+        if tied.any():
+            idx[tied] = np.argsort(-proba[tied], axis=1, kind="stable")[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(n_classes), (n_rows, n_classes))
+    probs = np.take_along_axis(proba, idx, axis=1)
+    order = np.lexsort((idx, -probs), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def score(model: Any, X: Any, top_k: int, classes: Optional[List[str]] = None) -> Scores:
+    """
+    Una sola passata sul modello: feature + predict_proba una volta, etichetta e top-k derivate
+    dalla matrice di probabilità (argmax = predict per i classificatori con predict_proba).
+    Senza predict_proba (o senza classi) solo predict.
+    """
+    if not hasattr(model, "predict_proba") or not classes:
+        return Scores(labels=np.asarray(model.predict(X)).astype(str))
+
+    proba = np.asarray(model.predict_proba(X), dtype=np.float64)
+    class_arr = np.asarray(classes, dtype=object)
+    best = proba.argmax(axis=1)
+    idx = top_k_indices(proba, top_k)
+    return Scores(
+        labels=class_arr[best],
+        confidence=proba[np.arange(len(best)), best],
+        topk_labels=class_arr[idx],
+        topk_probs=np.take_along_axis(proba, idx, axis=1),
+    )
+
+
+def prediction_rows(records: List[Dict[str, Any]], scores: Scores) -> List[Dict[str, Any]]:
+    """Righe di output di predict_dataframe (input, predicted_label, confidence, topk)."""
+    labels = scores.labels.tolist()
+    if scores.confidence is None:
+        return [{"input": rec, "predicted_label": str(labels[i])} for i, rec in enumerate(records)]
+
+    confidence = scores.confidence.tolist()
+    topk_labels = scores.topk_labels.tolist()
+    topk_probs = scores.topk_probs.tolist()
+    return [
+        {
+            "input": rec,
+            "predicted_label": str(labels[i]),
+            "confidence": confidence[i],
+            "topk": [{"label": str(lab), "prob": p} for lab, p in zip(topk_labels[i], topk_probs[i])],
+        }
+        for i, rec in enumerate(records)
+    ]
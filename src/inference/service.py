@@ -2,13 +2,22 @@ from __future__ import annotations
 
 import io
 import json
+import logging
 import os
 from typing import Any, Dict, List, Optional
 
 import pandas as pd
 
-from src.common.config import S3_INFERENCE_OUTPUT_PREFIX
-from src.inference.model_store import resolve_model_key, load_model_cached, get_classes
+from src.common.keys import inference_output_keys
+from src.common.s3_io import MultipartUploader
+from src.inference.model_store import ServingModel, get_model, get_classes, cache_stats
+from src.inference.scoring import prediction_rows, score
+
+logger = logging.getLogger(__name__)
+
+# Batch S3: "batch" legge tutto il file, "stream" procede a chunk di righe con output in multipart upload
+INFERENCE_BATCH_ENGINE = os.environ.get("INFERENCE_BATCH_ENGINE", "stream").lower()
+INFERENCE_BATCH_CHUNK_ROWS = int(os.environ.get("INFERENCE_BATCH_CHUNK_ROWS", "20000"))
 
 
 def _safe_float(x):
@@ -58,73 +67,71 @@ def _build_csv_rows_from_result(result: Dict[str, Any]) -> List[Dict[str, Any]]:
     return rows
 
 
-def predict_dataframe(s3, df: pd.DataFrame, bucket: str, top_k: int, event_context: Dict[str, Any]) -> Dict[str, Any]:
-    model_key, source, default_ptr = resolve_model_key(s3, bucket, event_context)
-
-    default_run_id = default_ptr.get("run_id") if default_ptr else None
-    default_timestamp_utc = default_ptr.get("timestamp_utc") if default_ptr else None
+def _serving_fields(serving: ServingModel) -> Dict[str, Any]:
+    # con hot swap può rispondere il modello precedente: model_key/default_run_id sono di chi risponde
+    default_ptr = serving.default_pointer
+    return {
+        "ok": True,
+        "model_key": serving.model_key,
+        "source": serving.source,
+        "default_run_id": default_ptr.get("run_id") if default_ptr else None,
+        "default_timestamp_utc": default_ptr.get("timestamp_utc") if default_ptr else None,
+        "model_swap_pending": serving.swap_pending,
+    }
 
-    model = load_model_cached(s3, bucket, model_key)
 
+def _predict_rows(model: Any, df: pd.DataFrame, top_k: int) -> List[Dict[str, Any]]:
     if "Merchant ID" not in df.columns:
         df["Merchant ID"] = "0"
 
     X = df[["Product Title", "Merchant ID"]]
-    preds = model.predict(X)
 
-    proba = model.predict_proba(X) if hasattr(model, "predict_proba") else None
-    classes = get_classes(model) if proba is not None else None
+    # una sola passata: etichetta, confidence e top-k dalla stessa matrice di probabilità
+    scores = score(model, X, top_k, get_classes(model))
 
-    predictions_out = []
     records = df.to_dict("records")
+    return prediction_rows(records, scores)
 
-    for i, rec in enumerate(records):
-        row = {"input": rec, "predicted_label": str(preds[i])}
-        if proba is not None and classes:
-            probs_i = proba[i]
-            idx_sorted = sorted(range(len(probs_i)), key=lambda j: probs_i[j], reverse=True)[:top_k]
-            row["confidence"] = float(probs_i[idx_sorted[0]])
-            row["topk"] = [{"label": str(classes[j]), "prob": float(probs_i[j])} for j in idx_sorted]
-        predictions_out.append(row)
 
-    return {
-        "ok": True,
-        "model_key": model_key,
-        "source": source,
-        "default_run_id": default_run_id,
-        "default_timestamp_utc": default_timestamp_utc,
-        "n_records": len(records),
-        "predictions": predictions_out,
-    }
+def _log_cache_stats() -> None:
+    # stato interno del container (hit/miss, TTL, modelli in memoria): nei log, non nelle risposte
+    logger.info("model_cache %s", json.dumps(cache_stats(), default=str))
 
 
-def process_batch_s3_object(s3, bucket: str, input_key: str) -> None:
-    obj = s3.get_object(Bucket=bucket, Key=input_key)
-    df = pd.read_csv(io.BytesIO(obj["Body"].read()), dtype=str)
+def predict_dataframe(s3, df: pd.DataFrame, bucket: str, top_k: int, event_context: Dict[str, Any]) -> Dict[str, Any]:
+    serving = get_model(s3, bucket, event_context)
+    predictions_out = _predict_rows(serving.model, df, top_k)
+    _log_cache_stats()
 
-    result = predict_dataframe(s3, df, bucket, top_k=3, event_context={})
-    result["source_file"] = input_key
+    result = _serving_fields(serving)
+    result.update({
+        "n_records": len(predictions_out),
+        "predictions": predictions_out,
+    })
+    return result
 
-    filename = os.path.basename(input_key)
-    output_key_json = f"{S3_INFERENCE_OUTPUT_PREFIX}/{filename}_result.json"
-    output_key_csv = f"{S3_INFERENCE_OUTPUT_PREFIX}/{filename}_result.csv"
-    output_key_summary = f"{S3_INFERENCE_OUTPUT_PREFIX}/{filename}_summary.json"
 
-    preds = result.get("predictions", [])
+class _BatchSummary:
+    """Aggregati del summary (distribuzione etichette, bassa confidenza, media) riga per riga."""
 
-    labels_dist: Dict[str, int] = {}
-    conf_values: List[float] = []
-    low_conf_count = 0
+    def __init__(self):
+        self.labels_dist: Dict[str, int] = {}
+        self.conf_values_sum = 0.0
+        self.conf_values_count = 0
+        self.low_conf_count = 0
+        self.n_records = 0
 
-    for p in preds:
+    def add(self, p: Dict[str, Any]) -> None:
+        self.n_records += 1
         lab = str(p.get("predicted_label", ""))
-        labels_dist[lab] = labels_dist.get(lab, 0) + 1
+        self.labels_dist[lab] = self.labels_dist.get(lab, 0) + 1
 
         conf = _safe_float(p.get("confidence"))
         gap = _compute_gap_1_2(p)
 
         if conf is not None:
-            conf_values.append(conf)
+            self.conf_values_sum += conf
+            self.conf_values_count += 1
 
         is_low = False
         if conf is not None and conf < 0.45:
@@ -132,27 +139,89 @@ def process_batch_s3_object(s3, bucket: str, input_key: str) -> None:
         if gap is not None and gap < 0.05:
             is_low = True
         if is_low:
-            low_conf_count += 1
+            self.low_conf_count += 1
 
-    avg_conf = (sum(conf_values) / len(conf_values)) if conf_values else None
+    def avg_confidence(self) -> Optional[float]:
+        return (self.conf_values_sum / self.conf_values_count) if self.conf_values_count else None
 
+
+def _write_summary(s3, bucket: str, input_key: str, result: Dict[str, Any], agg: _BatchSummary, output_keys: Dict[str, str]) -> None:
     summary = {
         "ok": True,
         "source_file": input_key,
-        "n_records": result.get("n_records", len(preds)),
+        "n_records": agg.n_records,
         "model_key": result.get("model_key"),
         "source": result.get("source"),
         "default_run_id": result.get("default_run_id"),
         "default_timestamp_utc": result.get("default_timestamp_utc"),
-        "labels_distribution": labels_dist,
-        "low_confidence_count": low_conf_count,
-        "avg_confidence": avg_conf,
-        "output_keys": {"json": output_key_json, "csv": output_key_csv, "summary": output_key_summary},
+        "labels_distribution": agg.labels_dist,
+        "low_confidence_count": agg.low_conf_count,
+        "avg_confidence": agg.avg_confidence(),
+        "output_keys": output_keys,
     }
+    s3.put_object(Bucket=bucket, Key=output_keys["summary"], Body=json.dumps(summary, ensure_ascii=False), ContentType="application/json")
+
+
+def process_batch_s3_object(s3, bucket: str, input_key: str) -> None:
+    output_keys = inference_output_keys(os.path.basename(input_key))
+    if INFERENCE_BATCH_ENGINE == "stream":
+        _process_batch_streaming(s3, bucket, input_key, output_keys)
+        return
+
+    obj = s3.get_object(Bucket=bucket, Key=input_key)
+    df = pd.read_csv(io.BytesIO(obj["Body"].read()), dtype=str)
+
+    result = predict_dataframe(s3, df, bucket, top_k=3, event_context={})
+    result["source_file"] = input_key
+
+    agg = _BatchSummary()
+    for p in result.get("predictions", []):
+        agg.add(p)
 
     rows = _build_csv_rows_from_result(result)
     out_df = pd.DataFrame(rows)
 
-    s3.put_object(Bucket=bucket, Key=output_key_json, Body=json.dumps(result, ensure_ascii=False), ContentType="application/json")
-    s3.put_object(Bucket=bucket, Key=output_key_summary, Body=json.dumps(summary, ensure_ascii=False), ContentType="application/json")
-    s3.put_object(Bucket=bucket, Key=output_key_csv, Body=out_df.to_csv(index=False).encode("utf-8"), ContentType="text/csv")
+    s3.put_object(Bucket=bucket, Key=output_keys["json"], Body=json.dumps(result, ensure_ascii=False), ContentType="application/json")
+    _write_summary(s3, bucket, input_key, result, agg, output_keys)
+    s3.put_object(Bucket=bucket, Key=output_keys["csv"], Body=out_df.to_csv(index=False).encode("utf-8"), ContentType="text/csv")
+
+
+def _process_batch_streaming(s3, bucket: str, input_key: str, output_keys: Dict[str, str]) -> None:
+    """
+    Stesso output del percorso batch (_result.json, _result.csv, _summary.json) con memoria limitata
+    a un chunk: input letto in streaming a INFERENCE_BATCH_CHUNK_ROWS righe, predizioni scritte
+    man mano con multipart upload, aggregati del summary accumulati durante la scrittura.
+    Un solo modello per tutto il file (risolto una volta all'inizio).
+    """
+    serving = get_model(s3, bucket, {})
+    _log_cache_stats()
+    result = _serving_fields(serving)
+    agg = _BatchSummary()
+
+    body = s3.get_object(Bucket=bucket, Key=input_key)["Body"]
+    with MultipartUploader(s3, bucket, output_keys["json"], "application/json") as json_out, \
+            MultipartUploader(s3, bucket, output_keys["csv"], "text/csv") as csv_out:
+        # documento JSON con la stessa forma del percorso batch, scritto a pezzi
+        json_out.write((json.dumps(result, ensure_ascii=False)[:-1] + ', "predictions": [').encode("utf-8"))
+        csv_header = True
+        for chunk in pd.read_csv(body, dtype=str, chunksize=INFERENCE_BATCH_CHUNK_ROWS):
+            predictions = _predict_rows(serving.model, chunk, top_k=3)
+            if predictions:
+                sep = ", " if agg.n_records else ""
+                json_out.write((sep + ", ".join(json.dumps(p, ensure_ascii=False) for p in predictions)).encode("utf-8"))
+            for p in predictions:
+                agg.add(p)
+
+            out_df = pd.DataFrame(_build_csv_rows_from_result({"predictions": predictions}))
+            if csv_header and out_df.empty:
+                continue
+            csv_out.write(out_df.to_csv(index=False, header=csv_header).encode("utf-8"))
+            csv_header = False
+        if csv_header:
+            csv_out.write(pd.DataFrame(_build_csv_rows_from_result({"predictions": []})).to_csv(index=False).encode("utf-8"))
+
+        tail = {"n_records": agg.n_records, "source_file": input_key}
+        json_out.write(("], " + json.dumps(tail, ensure_ascii=False)[1:]).encode("utf-8"))
+
+    result["source_file"] = input_key
+    _write_summary(s3, bucket, input_key, result, agg, output_keys)
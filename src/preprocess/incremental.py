@@ -0,0 +1,137 @@
+"""
+Engine incrementale: solo le righe raw nuove o modificate vengono normalizzate.
+
+Costo per versione: il raw viene comunque scaricato e hashato per intero (l'hash per riga è
+ciò che individua il delta), mentre normalizzazione e scrittura di processed.csv sono
+proporzionali al delta solo nel caso append-only (copia server-side + righe nuove).
+processed.parquet non è concatenabile: in append-only viene riscritto per intero, oppure
+rimosso con PREPROCESS_INCREMENTAL_PARQUET=0 (il training legge allora processed.csv).
+I dettagli di ogni esecuzione sono in stats.json["incremental"].
+"""
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.common.config import FEATURE_COLUMNS, TARGET_COLUMN
+
+# Versione del formato dell'indice: se cambia, l'indice precedente viene ignorato
+ROW_INDEX_VERSION = 1
+
+# Posizioni speciali nel piano: riga da normalizzare / riga riusata ma scartata (target mancante)
+DELTA = -2
+DROPPED = -1
+
+
+@dataclass(frozen=True)
+class RowIndex:
+    """
+    Indice compatto di una versione del raw dataset: un hash uint64 per riga raw
+    (colonne feature + target) e se la riga è finita in processed.csv.
+    La riga processed k corrisponde alla k-esima riga raw con kept=True.
+    """
+    hashes: np.ndarray
+    kept: np.ndarray
+    processed_etag: str
+    text_normalizer: str
+    pandas_version: str
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez_compressed(
+            buf,
+            version=np.array(ROW_INDEX_VERSION),
+            hashes=self.hashes.astype(np.uint64),
+            kept=self.kept.astype(bool),
+            processed_etag=np.array(self.processed_etag),
+            text_normalizer=np.array(self.text_normalizer),
+            pandas_version=np.array(self.pandas_version),
+        )
+        return buf.getvalue()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> Optional["RowIndex"]:
+        with np.load(io.BytesIO(data), allow_pickle=False) as z:
+            if int(z["version"]) != ROW_INDEX_VERSION:
+                return None
+            return RowIndex(
+                hashes=z["hashes"],
+                kept=z["kept"],
+                processed_etag=str(z["processed_etag"]),
+                text_normalizer=str(z["text_normalizer"]),
+                pandas_version=str(z["pandas_version"]),
+            )
+
+
+@dataclass(frozen=True)
+class DeltaPlan:
+    """
+    sources[i] per ogni riga raw nuova: posizione della riga nel processed precedente,
+    DROPPED se già scartata nella versione precedente, DELTA se va normalizzata.
+    """
+    sources: np.ndarray
+    append_only: bool
+
+    @property
+    def delta_mask(self) -> np.ndarray:
+        return self.sources == DELTA
+
+    @property
+    def n_delta(self) -> int:
+        return int(self.delta_mask.sum())
+
+    @property
+    def n_retained(self) -> int:
+        return int(len(self.sources) - self.n_delta)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    # df con nomi colonna già ripuliti (strip_column_names)
+    cols = FEATURE_COLUMNS + [TARGET_COLUMN]
+    return pd.util.hash_pandas_object(df[cols].astype(object), index=False).to_numpy(dtype=np.uint64)
+
+
+def plan_delta(previous: RowIndex, new_hashes: np.ndarray) -> DeltaPlan:
+    n_old = len(previous.hashes)
+    old_pos = np.where(previous.kept, np.cumsum(previous.kept) - 1, DROPPED)
+
+    # caso tipico del feed producer: la versione precedente è un prefisso della nuova
+    if len(new_hashes) >= n_old and np.array_equal(new_hashes[:n_old], previous.hashes):
+        sources = np.full(len(new_hashes), DELTA, dtype=np.int64)
+        sources[:n_old] = old_pos
+        return DeltaPlan(sources=sources, append_only=True)
+
+    # caso generale: match per hash (le righe duplicate puntano alla prima occorrenza)
+    old_index = pd.Index(previous.hashes)
+    first = ~old_index.duplicated()
+    positions = pd.Index(previous.hashes[first]).get_indexer(new_hashes)
+    sources = np.where(positions >= 0, old_pos[first][positions], DELTA).astype(np.int64)
+    return DeltaPlan(sources=sources, append_only=False)
+
+
+def assemble_processed(
+    plan: DeltaPlan,
+    previous_processed: pd.DataFrame,
+    delta_processed: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Ricostruisce il processed dataset nell'ordine delle righe raw nuove.
+    delta_processed: output di normalize_rows sulle sole righe DELTA, con l'indice
+    (posizionale) delle righe raw nuove.
+    """
+    reuse = np.flatnonzero(plan.sources >= 0)
+    retained = previous_processed.iloc[plan.sources[reuse]]
+    retained.index = reuse
+
+    out = pd.concat([retained, delta_processed[list(previous_processed.columns)]])
+    return out.sort_index(kind="stable").reset_index(drop=True)
+
+
+def kept_mask(plan: DeltaPlan, delta_processed: pd.DataFrame) -> np.ndarray:
+    kept = plan.sources >= 0
+    kept[np.asarray(delta_processed.index, dtype=np.int64)] = True
+    return kept
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from src.common.config import TARGET_COLUMN
+from src.common.io_utils import strip_column_names
+from src.common.serialize import df_to_csv_bytes
+from src.preprocess.preprocess_core import normalize_rows
+
+# Sotto questa dimensione per shard il costo di fork/merge supera il guadagno
+MIN_SHARD_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ShardResult:
+    csv_bytes: bytes
+    processed_df: Optional[pd.DataFrame]
+    classes: List[str]
+    n_rows_raw: int
+    n_rows_processed: int
+    dropped_no_target: int
+
+
+def next_row_start(data: bytes, pos: int, quotes: int) -> Tuple[int, int]:
+    """
+    Primo inizio riga CSV da pos in poi: dopo un newline preceduto da un numero pari di
+    virgolette (quotes = virgolette già contate prima di pos, da un confine di riga).
+    Ritorna (offset, virgolette contate); offset -1 se data finisce dentro la riga,
+    così il conteggio può proseguire sul blocco successivo.
+    """
+    while True:
+        nl = data.find(b"\n", pos)
+        if nl == -1:
+            return -1, quotes + data.count(b'"', pos)
+        quotes += data.count(b'"', pos, nl)
+        if quotes % 2 == 0:
+            return nl + 1, quotes
+        pos = nl + 1
+
+
+def header_end(data: bytes) -> int:
+    """Offset del primo byte dopo la riga di header (newline fuori da campi quotati)."""
+    end, _ = next_row_start(data, 0, 0)
+    return len(data) if end == -1 else end
+
+
+def split_row_aligned(data: bytes, start: int, n_shards: int) -> List[Tuple[int, int]]:
+    """
+    Divide data[start:] in al più n_shards intervalli [a, b) che iniziano e finiscono
+    a confine di riga CSV: un newline conta come fine riga solo se il numero di
+    virgolette dall'inizio dello shard è pari (newline dentro un campo quotato).
+    """
+    size = len(data) - start
+    if size <= 0:
+        return []
+
+    bounds = [start]
+    step = size / max(1, n_shards)
+    for k in range(1, n_shards):
+        nominal = start + int(k * step)
+        last = bounds[-1]
+        if nominal <= last:
+            continue
+
+        bound, _ = next_row_start(data, nominal, data.count(b'"', last, nominal))
+        if bound == -1:
+            break
+        bounds.append(bound)
+        if bound >= len(data):
+            break
+
+    if bounds[-1] < len(data):
+        bounds.append(len(data))
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def preprocess_shard(data: bytes, columns: List[str], keep_df: bool, bounds: Tuple[int, int]) -> ShardResult:
+    # stessa normalizzazione riga per riga del path seriale
+    start, end = bounds
+    df_raw = pd.read_csv(io.BytesIO(data[start:end]), dtype=str, header=None, names=columns)
+    df = strip_column_names(df_raw)
+    out, dropped_no_target = normalize_rows(df)
+    return ShardResult(
+        csv_bytes=df_to_csv_bytes(out, header=False),
+        processed_df=out if keep_df else None,
+        classes=out[TARGET_COLUMN].unique().tolist(),
+        n_rows_raw=int(len(df_raw)),
+        n_rows_processed=int(len(out)),
+        dropped_no_target=dropped_no_target,
+    )
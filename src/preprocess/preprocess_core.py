@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Set, Tuple
 
 import pandas as pd
 
@@ -13,6 +14,9 @@ from src.common.config import (
 )
 from src.common.io_utils import strip_column_names
 
+# Normalizzatore di Product Title: "fast" (single-pass) | "pandas" (implementazione di riferimento)
+TEXT_NORMALIZER = os.environ.get("PREPROCESS_TEXT_NORMALIZER", "fast").lower()
+
 
 @dataclass(frozen=True)
 class PreprocessResult:
@@ -22,7 +26,7 @@ class PreprocessResult:
     stats: Dict
 
 
-def _normalize_text(s: pd.Series) -> pd.Series:
+def _normalize_text_pandas(s: pd.Series) -> pd.Series:
     # Lowercase + trim + collapse spazi
     s = s.fillna("")
     s = s.astype(str).str.strip().str.lower()
@@ -30,6 +34,33 @@ def _normalize_text(s: pd.Series) -> pd.Series:
     return s
 
 
+def _normalize_title_value(v: Any) -> str:
+    # str.split() senza argomenti = strip + split su \s+ (stessa definizione di spazio di re)
+    if isinstance(v, str):
+        return " ".join(v.lower().split())
+    if v is None or pd.isna(v):
+        return ""
+    return " ".join(str(v).lower().split())
+
+
+def _normalize_text_fast(s: pd.Series) -> pd.Series:
+    # Stesso output di _normalize_text_pandas con un solo passaggio sui valori
+    return pd.Series([_normalize_title_value(v) for v in s.tolist()], index=s.index, name=s.name)
+
+
+TEXT_NORMALIZERS: Dict[str, Callable[[pd.Series], pd.Series]] = {
+    "pandas": _normalize_text_pandas,
+    "fast": _normalize_text_fast,
+}
+
+
+def _normalize_text(s: pd.Series) -> pd.Series:
+    normalizer = TEXT_NORMALIZERS.get(TEXT_NORMALIZER)
+    if normalizer is None:
+        raise ValueError(f"Unsupported text normalizer '{TEXT_NORMALIZER}'. Allowed: {sorted(TEXT_NORMALIZERS)}")
+    return normalizer(s)
+
+
 def _normalize_merchant_id(s: pd.Series) -> pd.Series:
     # Forziamo a stringa per trattarla come categorica (oneHotEncoder)
     s = s.fillna("unknown")
@@ -38,23 +69,21 @@ def _normalize_merchant_id(s: pd.Series) -> pd.Series:
     return s
 
 
-def preprocess_dataframe(df_raw: pd.DataFrame) -> PreprocessResult:
-    """
-    Trasforma il dataset raw in un dataset processed con:
-      - nomi colonna ripuliti
-      - selezione feature + target
-      - normalizzazione minima (testo + merchant id)
-      - metadata (schema, classi, stats)
-    """
-    df = strip_column_names(df_raw)
-
-    present_cols = set(df.columns)
-
+def check_required_columns(columns) -> None:
+    present_cols = set(columns)
     required = set(FEATURE_COLUMNS + [TARGET_COLUMN])
     missing = sorted(list(required - present_cols))
     if missing:
         raise ValueError(f"Missing required columns in input CSV: {missing}. Found: {sorted(list(present_cols))}")
 
+
+def normalize_rows(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """
+    Selezione feature + target, normalizzazione e drop delle righe senza target.
+    Lavora riga per riga: applicata a chunk successivi produce lo stesso output
+    dell'applicazione sull'intero dataset.
+    Ritorna: (processed_df, righe scartate per target mancante)
+    """
     out = df[FEATURE_COLUMNS + [TARGET_COLUMN]].copy()
 
     # Normalizzazioni
@@ -68,32 +97,90 @@ def preprocess_dataframe(df_raw: pd.DataFrame) -> PreprocessResult:
     dropped_no_target = before - len(out)
 
     # Riordino colonne
-    out = out[PROCESSED_COLUMNS]
+    return out[PROCESSED_COLUMNS], int(dropped_no_target)
 
-    # Classi target
-    classes: List[str] = sorted(out[TARGET_COLUMN].unique().tolist())
 
-    # Metadata
-    schema = {
+def build_schema(raw_columns_found: List[str]) -> Dict:
+    return {
         "features": FEATURE_COLUMNS,
         "target": TARGET_COLUMN,
         "raw_columns_expected": RAW_EXPECTED_COLUMNS,
-        "raw_columns_found": sorted(list(df.columns)),
+        "raw_columns_found": sorted(list(raw_columns_found)),
         "processed_columns": PROCESSED_COLUMNS,
     }
 
-    stats = {
-        "n_rows_raw": int(len(df_raw)),
-        "n_rows_processed": int(len(out)),
+
+def build_stats(n_rows_raw: int, n_rows_processed: int, dropped_no_target: int, n_classes: int) -> Dict:
+    return {
+        "n_rows_raw": int(n_rows_raw),
+        "n_rows_processed": int(n_rows_processed),
         "dropped_rows_missing_target": int(dropped_no_target),
-        "n_classes": int(len(classes)),
+        "n_classes": int(n_classes),
     }
 
-    classes_payload = {"classes": classes, "n_classes": int(len(classes))}
+
+def build_classes(classes: List[str]) -> Dict:
+    return {"classes": classes, "n_classes": int(len(classes))}
+
+
+def preprocess_dataframe(df_raw: pd.DataFrame) -> PreprocessResult:
+    """
+    Trasforma il dataset raw in un dataset processed con:
+      - nomi colonna ripuliti
+      - selezione feature + target
+      - normalizzazione minima (testo + merchant id)
+      - metadata (schema, classi, stats)
+    """
+    df = strip_column_names(df_raw)
+    check_required_columns(df.columns)
+
+    out, dropped_no_target = normalize_rows(df)
+
+    # Classi target
+    classes: List[str] = sorted(out[TARGET_COLUMN].unique().tolist())
 
     return PreprocessResult(
         processed_df=out,
-        schema=schema,
-        classes=classes_payload,
-        stats=stats,
+        schema=build_schema(list(df.columns)),
+        classes=build_classes(classes),
+        stats=build_stats(len(df_raw), len(out), dropped_no_target, len(classes)),
     )
+
+
+class ChunkedPreprocessor:
+    """
+    Variante a chunk di preprocess_dataframe: ogni chunk raw viene normalizzato
+    in modo indipendente, mentre classi e stats vengono accumulate.
+    La memoria occupata non dipende dalla dimensione del file.
+    """
+
+    def __init__(self) -> None:
+        self._classes: Set[str] = set()
+        self._raw_columns_found: List[str] | None = None
+        self._n_rows_raw = 0
+        self._n_rows_processed = 0
+        self._dropped_no_target = 0
+
+    def process_chunk(self, df_raw: pd.DataFrame) -> pd.DataFrame:
+        df = strip_column_names(df_raw)
+        if self._raw_columns_found is None:
+            check_required_columns(df.columns)
+            self._raw_columns_found = list(df.columns)
+
+        out, dropped_no_target = normalize_rows(df)
+
+        self._classes.update(out[TARGET_COLUMN].unique().tolist())
+        self._n_rows_raw += int(len(df_raw))
+        self._n_rows_processed += int(len(out))
+        self._dropped_no_target += dropped_no_target
+        return out
+
+    def finalize(self) -> Tuple[Dict, Dict, Dict]:
+        """Ritorna (schema, classes, stats) equivalenti a quelli di preprocess_dataframe."""
+        if self._raw_columns_found is None:
+            raise ValueError("No chunk processed: empty input CSV.")
+
+        classes = sorted(self._classes)
+        schema = build_schema(self._raw_columns_found)
+        stats = build_stats(self._n_rows_raw, self._n_rows_processed, self._dropped_no_target, len(classes))
+        return schema, build_classes(classes), stats
@@ -1,23 +1,498 @@
 from __future__ import annotations
 
+import functools
+import hashlib
 import io
+import os
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from botocore.exceptions import ClientError
 
+from src.common.columnar import (
+    ParquetChunkWriter,
+    columnar_available,
+    df_to_parquet_bytes,
+    read_parquet_bytes,
+)
+from src.common.config import PROCESSED_COLUMNS, TARGET_COLUMN
+from src.common.io_utils import strip_column_names
 from src.common.job_status import write_job_status
-from src.common.keys import preprocess_outputs_for_input_key
+from src.common.keys import (
+    preprocess_marker_key_for_job,
+    preprocess_marker_key_for_producer,
+    preprocess_outputs_for_input_key,
+)
+from src.common.parallel import default_workers, map_in_processes
+from src.common.processed_io import PROCESSED_GENERATION_METADATA, PROCESSED_SHA256_METADATA, matching_parquet_head
+from src.common.s3_io import (
+    DEFAULT_PART_SIZE,
+    MultipartUploader,
+    SpooledUpload,
+    exists,
+    head_or_none,
+    read_bytes,
+    read_json,
+    safe_etag,
+)
 from src.common.serialize import df_to_csv_bytes, json_bytes
-from src.preprocess.preprocess_core import preprocess_dataframe
+from src.preprocess.incremental import (
+    RowIndex,
+    assemble_processed,
+    kept_mask,
+    plan_delta,
+    row_hashes,
+)
+from src.preprocess.parallel import MIN_SHARD_BYTES, header_end, preprocess_shard, split_row_aligned
+from src.preprocess.preprocess_core import (
+    TEXT_NORMALIZER,
+    ChunkedPreprocessor,
+    build_classes,
+    build_schema,
+    build_stats,
+    check_required_columns,
+    normalize_rows,
+    preprocess_dataframe,
+)
 
+# "batch": tutto in memoria | "streaming": lettura a chunk + multipart upload
+# "incremental": normalizza solo le righe nuove/modificate rispetto alla versione precedente
+# "parallel": shard del CSV raw a confine di riga normalizzati in processi separati
+PREPROCESS_ENGINE = os.environ.get("PREPROCESS_ENGINE", "batch").lower()
+PREPROCESS_CHUNK_ROWS = int(os.environ.get("PREPROCESS_CHUNK_ROWS", "50000"))
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", "0")) or default_workers()
+# Artefatto colonnare accanto a processed.csv (richiede pyarrow)
+PREPROCESS_WRITE_PARQUET = os.environ.get("PREPROCESS_WRITE_PARQUET", "1") == "1"
+# Skip del preprocessing se lo stesso oggetto raw (ETag + size) è già stato processato
+PREPROCESS_IDEMPOTENCY = os.environ.get("PREPROCESS_IDEMPOTENCY", "1") == "1"
+# Incrementale append-only: riscrive processed.parquet per intero (1) o lo rimuove (0, solo processed.csv)
+PREPROCESS_INCREMENTAL_PARQUET = os.environ.get("PREPROCESS_INCREMENTAL_PARQUET", "1") == "1"
+# Byte letti con la GET ranged iniziale (ETag, size e header CSV in un solo round trip)
+PREPROCESS_HEADER_PROBE_BYTES = int(os.environ.get("PREPROCESS_HEADER_PROBE_BYTES", "65536"))
 
-def run_preprocess_for_s3_object(s3, bucket: str, key: str) -> Dict[str, Any]:
+
+@dataclass(frozen=True)
+class InputProbe:
+    etag: str
+    size: int
+    # ETag così come restituito da S3: IfMatch sul download completo
+    raw_etag: str
+    # None se l'header non è contenuto nei byte letti (validazione rimandata al parsing completo)
+    header_columns: Optional[List[str]]
+
+
+@dataclass(frozen=True)
+class PreprocessOutputs:
+    schema: Dict
+    classes: Dict
+    stats: Dict
+    processed_etag: str
+    processed_sha256: str
+    parquet_written: bool
+
+
+def _write_parquet_enabled() -> bool:
+    return PREPROCESS_WRITE_PARQUET and columnar_available()
+
+
+def _get_input(s3, bucket: str, key: str, if_match: Optional[str]) -> Dict[str, Any]:
+    # il marker registra l'ETag del probe: se l'oggetto è stato riscritto nel frattempo
+    # la GET fallisce (412) invece di processare un contenuto diverso
+    if if_match:
+        return s3.get_object(Bucket=bucket, Key=key, IfMatch=if_match)
+    return s3.get_object(Bucket=bucket, Key=key)
+
+
+def _read_raw(s3, bucket: str, key: str, if_match: Optional[str]) -> pd.DataFrame:
+    raw_bytes = _get_input(s3, bucket, key, if_match)["Body"].read()
+    return pd.read_csv(io.BytesIO(raw_bytes), dtype=str)
+
+
+def _generation_metadata(generation: str) -> Dict[str, str]:
+    # stessa generazione su processed.csv e processed.parquet: il training usa il parquet solo se coincide
+    return {PROCESSED_GENERATION_METADATA: generation}
+
+
+def _processed_metadata(generation: str, sha256: str) -> Dict[str, str]:
+    # processed.csv: generazione + sha256 del contenuto (chiave delle cache del training)
+    return {**_generation_metadata(generation), PROCESSED_SHA256_METADATA: sha256}
+
+
+def _write_processed(
+    s3, bucket: str, output: Dict[str, Any], processed_df: pd.DataFrame, generation: str
+) -> Tuple[str, str, bool]:
+    """Ritorna (ETag, sha256 di processed.csv, parquet scritto)."""
+    # il parquet va scritto prima del csv: l'evento su processed.csv avvia il training
+    write_parquet = _write_parquet_enabled()
+    if write_parquet:
+        s3.put_object(
+            Bucket=bucket,
+            Key=output["processed_parquet"],
+            Body=df_to_parquet_bytes(processed_df),
+            ContentType="application/vnd.apache.parquet",
+            Metadata=_generation_metadata(generation),
+        )
+    csv_bytes = df_to_csv_bytes(processed_df)
+    sha256 = hashlib.sha256(csv_bytes).hexdigest()
+    resp = s3.put_object(
+        Bucket=bucket,
+        Key=output["processed"],
+        Body=csv_bytes,
+        ContentType="text/csv",
+        Metadata=_processed_metadata(generation, sha256),
+    )
+    return safe_etag(resp.get("ETag", "")), sha256, write_parquet
+
+
+def _preprocess_batch(
+    s3, bucket: str, key: str, if_match: Optional[str], output: Dict[str, Any], generation: str
+) -> PreprocessOutputs:
+    df_raw = _read_raw(s3, bucket, key, if_match)
+    result = preprocess_dataframe(df_raw)
+
+    processed_etag, sha256, parquet_written = _write_processed(s3, bucket, output, result.processed_df, generation)
+    return PreprocessOutputs(result.schema, result.classes, dict(result.stats), processed_etag, sha256, parquet_written)
+
+
+def _preprocess_streaming(
+    s3, bucket: str, key: str, if_match: Optional[str], output: Dict[str, Any], generation: str, chunk_rows: int
+) -> PreprocessOutputs:
+    # il body S3 viene consumato a chunk: in memoria c'è al più un chunk raw, processed.csv va su
+    # file temporaneo (come il parquet) perché lo sha256 serve alla creazione dell'oggetto
+    body = _get_input(s3, bucket, key, if_match)["Body"]
+    pre = ChunkedPreprocessor()
+    csv = SpooledUpload()
+    parquet = ParquetChunkWriter() if _write_parquet_enabled() else None
+
+    try:
+        header = True
+        for chunk in pd.read_csv(body, dtype=str, chunksize=chunk_rows):
+            out = pre.process_chunk(chunk)
+            csv.write(df_to_csv_bytes(out, header=header))
+            if parquet is not None:
+                parquet.write_chunk(out)
+            header = False
+
+        # parquet completato prima del csv (vedi _preprocess_batch)
+        if parquet is not None:
+            parquet.upload(s3, bucket, output["processed_parquet"], metadata=_generation_metadata(generation))
+        etag = csv.upload(s3, bucket, output["processed"], "text/csv", metadata=_processed_metadata(generation, csv.sha256))
+    finally:
+        csv.discard()
+        if parquet is not None:
+            parquet.discard()
+
+    schema, classes, stats = pre.finalize()
+    return PreprocessOutputs(schema, classes, stats, safe_etag(etag or ""), csv.sha256, parquet is not None)
+
+
+def _preprocess_parallel(
+    s3, bucket: str, key: str, if_match: Optional[str], output: Dict[str, Any], generation: str, workers: int
+) -> PreprocessOutputs:
+    data = _get_input(s3, bucket, key, if_match)["Body"].read()
+
+    body_start = header_end(data)
+    columns = list(pd.read_csv(io.BytesIO(data[:body_start]), dtype=str, nrows=0).columns)
+    raw_columns_found = [str(c).strip() for c in columns]
+    check_required_columns(raw_columns_found)
+
+    n_shards = max(1, min(workers, (len(data) - body_start) // MIN_SHARD_BYTES))
+    ranges = split_row_aligned(data, body_start, n_shards)
+
+    write_parquet = _write_parquet_enabled()
+    shards = map_in_processes(functools.partial(preprocess_shard, data, columns, write_parquet), ranges, workers)
+    del data
+
+    # merge nell'ordine degli shard: stesso output del path seriale
+    parquet = ParquetChunkWriter() if write_parquet else None
+    try:
+        if parquet is not None:
+            for shard in shards:
+                parquet.write_chunk(shard.processed_df)
+            parquet.upload(s3, bucket, output["processed_parquet"], metadata=_generation_metadata(generation))
+
+        parts = [df_to_csv_bytes(pd.DataFrame(columns=PROCESSED_COLUMNS))] + [shard.csv_bytes for shard in shards]
+        sha = hashlib.sha256()
+        for part in parts:
+            sha.update(part)
+        with MultipartUploader(
+            s3, bucket, output["processed"], "text/csv", metadata=_processed_metadata(generation, sha.hexdigest())
+        ) as uploader:
+            for part in parts:
+                uploader.write(part)
+    finally:
+        if parquet is not None:
+            parquet.discard()
+
+    classes = sorted(set().union(*[shard.classes for shard in shards]))
+    stats = build_stats(
+        sum(shard.n_rows_raw for shard in shards),
+        sum(shard.n_rows_processed for shard in shards),
+        sum(shard.dropped_no_target for shard in shards),
+        len(classes),
+    )
+    stats["parallel"] = {"workers": int(workers), "n_shards": len(ranges)}
+    return PreprocessOutputs(
+        build_schema(raw_columns_found),
+        build_classes(classes),
+        stats,
+        safe_etag(uploader.etag or ""),
+        sha.hexdigest(),
+        write_parquet,
+    )
+
+
+def _load_previous_index(s3, bucket: str, output: Dict[str, Any]) -> Tuple[Optional[RowIndex], str, Dict[str, Any]]:
+    """Ritorna (indice, motivo, head di processed.csv); indice None se non riusabile."""
+    if not exists(s3, bucket, output["row_index"]):
+        return None, "no_previous_index", {}
+    previous = RowIndex.from_bytes(read_bytes(s3, bucket, output["row_index"]))
+    if previous is None:
+        return None, "index_version_changed", {}
+
+    head = head_or_none(s3, bucket, output["processed"])
+    if head is None:
+        return None, "no_previous_processed", {}
+
+    if safe_etag(head.get("ETag", "")) != previous.processed_etag:
+        return None, "processed_changed_since_index", head
+    if previous.text_normalizer != TEXT_NORMALIZER:
+        return None, "text_normalizer_changed", head
+    if previous.pandas_version != pd.__version__:
+        # hash_pandas_object non è garantito stabile tra versioni di pandas
+        return None, "pandas_version_changed", head
+    return previous, "ok", head
+
+
+def _read_previous_processed(s3, bucket: str, output: Dict[str, Any], head: Dict[str, Any]) -> pd.DataFrame:
+    # head: processed.csv a cui si riferisce l'indice; il parquet vale solo se della stessa generazione
+    parquet_head = matching_parquet_head(s3, bucket, output["processed"], head)
+    if parquet_head is not None:
+        obj = s3.get_object(Bucket=bucket, Key=output["processed_parquet"], IfMatch=parquet_head["ETag"])
+        return read_parquet_bytes(obj["Body"].read())
+    # keep_default_na=False: le righe riusate devono riscriversi byte per byte
+    obj = s3.get_object(Bucket=bucket, Key=output["processed"], IfMatch=head["ETag"])
+    return pd.read_csv(io.BytesIO(obj["Body"].read()), dtype=str, keep_default_na=False)
+
+
+def _previous_sha256(s3, bucket: str, output: Dict[str, Any], head: Dict[str, Any]) -> Any:
+    """
+    sha256 in corso sul processed.csv precedente (head), da completare con le righe accodate.
+    Lo sha256 non si compone: la copia resta server-side, ma il contenuto precedente va riletto.
+    """
+    sha = hashlib.sha256()
+    body = s3.get_object(Bucket=bucket, Key=output["processed"], IfMatch=head["ETag"])["Body"]
+    for block in iter(lambda: body.read(DEFAULT_PART_SIZE), b""):
+        sha.update(block)
+    return sha
+
+
+def _write_row_index(s3, bucket: str, output: Dict[str, Any], hashes: np.ndarray, kept: np.ndarray, processed_etag: str) -> None:
+    index = RowIndex(
+        hashes=hashes,
+        kept=kept,
+        processed_etag=processed_etag,
+        text_normalizer=TEXT_NORMALIZER,
+        pandas_version=pd.__version__,
+    )
+    s3.put_object(Bucket=bucket, Key=output["row_index"], Body=index.to_bytes(), ContentType="application/octet-stream")
+
+
+def _preprocess_incremental(
+    s3, bucket: str, key: str, if_match: Optional[str], output: Dict[str, Any], generation: str
+) -> PreprocessOutputs:
+    df_raw = _read_raw(s3, bucket, key, if_match)
+    df = strip_column_names(df_raw)
+    check_required_columns(df.columns)
+
+    new_hashes = row_hashes(df)
+    previous, reason, head = _load_previous_index(s3, bucket, output)
+
+    if previous is None:
+        # prima versione (o indice non riusabile): passata completa + indice per la prossima
+        result = preprocess_dataframe(df_raw)
+        processed_etag, sha256, parquet_written = _write_processed(s3, bucket, output, result.processed_df, generation)
+
+        kept = np.zeros(len(df), dtype=bool)
+        kept[np.asarray(result.processed_df.index, dtype=np.int64)] = True
+        _write_row_index(s3, bucket, output, new_hashes, kept, processed_etag)
+
+        stats = dict(result.stats)
+        stats["incremental"] = {"applied": False, "reason": reason, "raw_rows_hashed": len(df)}
+        return PreprocessOutputs(result.schema, result.classes, stats, processed_etag, sha256, parquet_written)
+
+    plan = plan_delta(previous, new_hashes)
+    delta_processed, _ = normalize_rows(df.iloc[np.flatnonzero(plan.delta_mask)])
+    kept = kept_mask(plan, delta_processed)
+
+    if plan.append_only:
+        # processed.csv = versione precedente (copia server-side) + righe nuove
+        previous_classes = read_json(s3, bucket, output["classes"]).get("classes", [])
+        classes = sorted(set(previous_classes) | set(delta_processed[TARGET_COLUMN].unique().tolist()))
+
+        previous_parquet = matching_parquet_head(s3, bucket, output["processed"], head)
+        parquet_written = PREPROCESS_INCREMENTAL_PARQUET and _write_parquet_enabled() and previous_parquet is not None
+        if parquet_written:
+            # il parquet non si concatena: lettura e riscrittura complete
+            previous_obj = s3.get_object(Bucket=bucket, Key=output["processed_parquet"], IfMatch=previous_parquet["ETag"])
+            previous_processed = read_parquet_bytes(previous_obj["Body"].read())
+            full = pd.concat([previous_processed.astype(object), delta_processed.astype(object)], ignore_index=True)
+            s3.put_object(
+                Bucket=bucket,
+                Key=output["processed_parquet"],
+                Body=df_to_parquet_bytes(full),
+                ContentType="application/vnd.apache.parquet",
+                Metadata=_generation_metadata(generation),
+            )
+        else:
+            s3.delete_object(Bucket=bucket, Key=output["processed_parquet"])
+
+        delta_bytes = df_to_csv_bytes(delta_processed, header=False)
+        sha = _previous_sha256(s3, bucket, output, head)
+        sha.update(delta_bytes)
+        sha256 = sha.hexdigest()
+        with MultipartUploader(
+            s3, bucket, output["processed"], "text/csv", metadata=_processed_metadata(generation, sha256)
+        ) as uploader:
+            uploader.copy_from(output["processed"], int(head.get("ContentLength", 0)), head.get("ETag"))
+            uploader.write(delta_bytes)
+        processed_etag = safe_etag(uploader.etag or "")
+    else:
+        full = assemble_processed(plan, _read_previous_processed(s3, bucket, output, head), delta_processed)
+        classes = sorted(full[TARGET_COLUMN].unique().tolist())
+        processed_etag, sha256, parquet_written = _write_processed(s3, bucket, output, full, generation)
+
+    _write_row_index(s3, bucket, output, new_hashes, kept, processed_etag)
+
+    n_processed = int(kept.sum())
+    stats = build_stats(len(df_raw), n_processed, len(df_raw) - n_processed, len(classes))
+    # cosa è stato proporzionale al delta e cosa no (il raw è sempre scaricato e hashato per intero)
+    stats["incremental"] = {
+        "applied": True,
+        "append_only": plan.append_only,
+        "n_rows_retained": plan.n_retained,
+        "n_rows_delta": plan.n_delta,
+        "raw_rows_hashed": len(df),
+        "processed_csv_write": "server_side_copy_plus_delta" if plan.append_only else "full",
+        "parquet_write": "full" if parquet_written else "removed",
+    }
+    return PreprocessOutputs(
+        build_schema(list(df.columns)),
+        build_classes(classes),
+        stats,
+        processed_etag,
+        sha256,
+        parquet_written,
+    )
+
+
+def _probe_input(s3, bucket: str, key: str, probe_bytes: int) -> InputProbe:
+    try:
+        resp = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{probe_bytes - 1}")
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code not in ("InvalidRange", "416"):
+            raise
+        # oggetto vuoto: nessun header
+        head = s3.head_object(Bucket=bucket, Key=key)
+        return InputProbe(safe_etag(head.get("ETag", "")), int(head.get("ContentLength", 0)), head.get("ETag", ""), [])
+
+    data = resp["Body"].read()
+    content_range = resp.get("ContentRange") or ""
+    size = int(content_range.rsplit("/", 1)[-1]) if "/" in content_range else len(data)
+
+    end = header_end(data)
+    if end == len(data) and size > len(data) and not data.endswith(b"\n"):
+        return InputProbe(safe_etag(resp.get("ETag", "")), size, resp.get("ETag", ""), None)
+
+    columns: List[str] = []
+    if data[:end].strip():
+        columns = [str(c).strip() for c in pd.read_csv(io.BytesIO(data[:end]), dtype=str, nrows=0).columns]
+    return InputProbe(safe_etag(resp.get("ETag", "")), size, resp.get("ETag", ""), columns)
+
+
+def _load_valid_marker(s3, bucket: str, marker_key: str, key: str, output: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not exists(s3, bucket, marker_key):
+        return None
+    marker = read_json(s3, bucket, marker_key)
+    if marker.get("input_key") != key:
+        return None
+
+    # il marker vale solo se processed.csv è ancora quello scritto per questo input
+    # (producer: A -> B -> A deve riprocessare A)
+    head = head_or_none(s3, bucket, output["processed"])
+    if head is None or safe_etag(head.get("ETag", "")) != marker.get("processed_etag"):
+        return None
+    return marker
+
+
+def run_preprocess_for_s3_object(
+    s3,
+    bucket: str,
+    key: str,
+    engine: Optional[str] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
     output = preprocess_outputs_for_input_key(key)
+    engine = (engine or PREPROCESS_ENGINE).lower()
 
     job_id = output.get("job_id")
     mode = output["mode"]
 
+    probe = _probe_input(s3, bucket, key, PREPROCESS_HEADER_PROBE_BYTES)
+    input_etag = probe.etag
+    input_size = probe.size
+
+    if mode == "job" and job_id:
+        marker_key = preprocess_marker_key_for_job(job_id, input_etag, input_size)
+    else:
+        marker_key = preprocess_marker_key_for_producer(input_etag, input_size)
+
+    # idempotenza: eventi duplicati / retry / re-upload identici non riscrivono processed.csv
+    # (e quindi non riattivano il training). Lo status del job non viene toccato.
+    if PREPROCESS_IDEMPOTENCY and input_etag and not force:
+        marker = _load_valid_marker(s3, bucket, marker_key, key, output)
+        if marker is not None:
+            return {
+                "ok": True,
+                "skipped": True,
+                "reason": "already_preprocessed_for_input_etag",
+                "processed_key": output["processed"],
+                "processed_parquet_key": marker.get("processed_parquet_key"),
+                "schema_key": output["schema"],
+                "classes_key": output["classes"],
+                "stats_key": output["stats"],
+                "mode": mode,
+                "job_id": job_id,
+                "n_rows_processed": marker.get("n_rows_processed"),
+                "timestamp_utc": marker.get("timestamp_utc"),
+                "input_etag": input_etag,
+                "processed_etag": marker.get("processed_etag"),
+                "processed_sha256": marker.get("processed_sha256"),
+            }
+
+    # fail-fast: header validato sui primi KB, prima di scaricare e parsare tutto l'oggetto
+    if probe.header_columns is not None:
+        try:
+            check_required_columns(probe.header_columns)
+        except ValueError as e:
+            if mode == "job" and job_id:
+                write_job_status(
+                    s3=s3,
+                    bucket=bucket,
+                    job_id=job_id,
+                    stage="PREPROCESS",
+                    state="FAILED",
+                    message="PREPROCESS failed",
+                    artifacts={"input_key": key},
+                    error={"type": type(e).__name__, "detail": str(e)},
+                )
+            raise
+
     if mode == "job" and job_id:
         write_job_status(
             s3=s3,
@@ -29,24 +504,51 @@ def run_preprocess_for_s3_object(s3, bucket: str, key: str) -> Dict[str, Any]:
             artifacts={"input_key": key},
         )
 
-    # read csv
-    raw_bytes = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
-    df_raw = pd.read_csv(io.BytesIO(raw_bytes), dtype=str)
+    if not _write_parquet_enabled():
+        # evita che il training legga il parquet di una versione precedente
+        s3.delete_object(Bucket=bucket, Key=output["processed_parquet"])
 
-    result = preprocess_dataframe(df_raw)
+    if_match = probe.raw_etag or None
+    generation = uuid.uuid4().hex
+    if engine == "streaming":
+        outputs = _preprocess_streaming(s3, bucket, key, if_match, output, generation, PREPROCESS_CHUNK_ROWS)
+    elif engine == "batch":
+        outputs = _preprocess_batch(s3, bucket, key, if_match, output, generation)
+    elif engine == "incremental":
+        outputs = _preprocess_incremental(s3, bucket, key, if_match, output, generation)
+    elif engine == "parallel":
+        outputs = _preprocess_parallel(s3, bucket, key, if_match, output, generation, PREPROCESS_WORKERS)
+    else:
+        raise ValueError(f"Unsupported preprocess engine '{engine}'. Allowed: batch, streaming, incremental, parallel")
+    write_parquet = outputs.parquet_written
 
     now = datetime.now(timezone.utc).isoformat()
-    stats = dict(result.stats)
+    stats = dict(outputs.stats)
     stats["timestamp_utc"] = now
     stats["input_bucket"] = bucket
     stats["input_key"] = key
+    stats["input_etag"] = input_etag
 
     # write outputs
-    s3.put_object(Bucket=bucket, Key=output["processed"], Body=df_to_csv_bytes(result.processed_df), ContentType="text/csv")
-    s3.put_object(Bucket=bucket, Key=output["schema"], Body=json_bytes(result.schema), ContentType="application/json")
-    s3.put_object(Bucket=bucket, Key=output["classes"], Body=json_bytes(result.classes), ContentType="application/json")
+    s3.put_object(Bucket=bucket, Key=output["schema"], Body=json_bytes(outputs.schema), ContentType="application/json")
+    s3.put_object(Bucket=bucket, Key=output["classes"], Body=json_bytes(outputs.classes), ContentType="application/json")
     s3.put_object(Bucket=bucket, Key=output["stats"], Body=json_bytes(stats), ContentType="application/json")
 
+    if input_etag:
+        marker = {
+            "timestamp_utc": now,
+            "input_key": key,
+            "input_etag": input_etag,
+            "input_size": input_size,
+            "processed_key": output["processed"],
+            "processed_etag": outputs.processed_etag,
+            "processed_sha256": outputs.processed_sha256,
+            "processed_parquet_key": output["processed_parquet"] if write_parquet else None,
+            "n_rows_processed": int(stats["n_rows_processed"]),
+            "engine": engine,
+        }
+        s3.put_object(Bucket=bucket, Key=marker_key, Body=json_bytes(marker), ContentType="application/json")
+
     if mode == "job" and job_id:
         write_job_status(
             s3=s3,
@@ -58,6 +560,7 @@ def run_preprocess_for_s3_object(s3, bucket: str, key: str) -> Dict[str, Any]:
             artifacts={
                 "input_key": key,
                 "processed_key": output["processed"],
+                "processed_parquet_key": output["processed_parquet"] if write_parquet else None,
                 "schema_key": output["schema"],
                 "classes_key": output["classes"],
                 "stats_key": output["stats"],
@@ -66,12 +569,17 @@ def run_preprocess_for_s3_object(s3, bucket: str, key: str) -> Dict[str, Any]:
 
     return {
         "ok": True,
+        "skipped": False,
         "processed_key": output["processed"],
+        "processed_parquet_key": output["processed_parquet"] if write_parquet else None,
         "schema_key": output["schema"],
         "classes_key": output["classes"],
         "stats_key": output["stats"],
         "mode": mode,
         "job_id": job_id,
-        "n_rows_processed": int(len(result.processed_df)),
+        "n_rows_processed": int(stats["n_rows_processed"]),
         "timestamp_utc": now,
+        "input_etag": input_etag,
+        "processed_etag": outputs.processed_etag,
+        "processed_sha256": outputs.processed_sha256,
     }
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, RidgeClassifier, SGDClassifier
+from sklearn.naive_bayes import ComplementNB
+from sklearn.svm import LinearSVC
+
+
+@dataclass(frozen=True)
+class Algorithm:
+    """Voce del registry: builder(params, random_state) -> classificatore non fittato."""
+    name: str
+    model_type: str
+    build: Callable[[Dict[str, Any], int], Any]
+    aliases: Tuple[str, ...] = ()
+    # coef_/intercept_ riutilizzabili per il warm start
+    warm_start: bool = False
+
+
+ALGORITHMS: Dict[str, Algorithm] = {}
+_ALIASES: Dict[str, str] = {}
+
+
+def register(algorithm: Algorithm) -> Algorithm:
+    for name in (algorithm.name,) + algorithm.aliases:
+        if name in _ALIASES:
+            raise ValueError(f"Algorithm name '{name}' already registered")
+        _ALIASES[name] = algorithm.name
+    ALGORITHMS[algorithm.name] = algorithm
+    return algorithm
+
+
+def canonical_name(algo: str) -> Optional[str]:
+    return _ALIASES.get((algo or "").lower())
+
+
+def get_algorithm(algo: str) -> Algorithm:
+    name = canonical_name(algo)
+    if name is None:
+        raise ValueError(f"Unsupported algo '{algo}'. Allowed: {', '.join(ALGORITHMS)}")
+    return ALGORITHMS[name]
+
+
+def _max_depth(params: Dict[str, Any]) -> Any:
+    value = params.get("max_depth", None)
+    return int(value) if value is not None else None
+
+
+register(Algorithm(
+    name="logreg",
+    model_type="LogisticRegression",
+    build=lambda params, random_state: LogisticRegression(
+        solver=params.get("solver", "saga"),
+        max_iter=int(params.get("max_iter", 2000)),
+        C=float(params.get("C", 1.0)),
+        # n_jobs non passato: senza effetto (FutureWarning) da sklearn 1.8
+        # saga mescola i campioni: seed fisso per fit riproducibili (anche a segmenti)
+        random_state=random_state,
+    ),
+    aliases=("logistic_regression", "logistic"),
+    warm_start=True,
+))
+
+register(Algorithm(
+    name="random_forest",
+    model_type="RandomForestClassifier",
+    build=lambda params, random_state: RandomForestClassifier(
+        n_estimators=int(params.get("n_estimators", 200)),
+        max_depth=_max_depth(params),
+        n_jobs=int(params.get("n_jobs", -1)),
+        random_state=random_state,
+    ),
+    aliases=("rf", "forest"),
+))
+
+# Learner lineari veloci su matrici sparse TF-IDF
+
+register(Algorithm(
+    name="sgd",
+    model_type="SGDClassifier",
+    build=lambda params, random_state: SGDClassifier(
+        # log_loss: predict_proba disponibile per il top-k in inferenza
+        loss=params.get("loss", "log_loss"),
+        alpha=float(params.get("alpha", 1e-5)),
+        max_iter=int(params.get("max_iter", 50)),
+        tol=float(params.get("tol", 1e-4)),
+        n_jobs=int(params.get("n_jobs", -1)),
+        random_state=random_state,
+    ),
+    aliases=("sgd_classifier",),
+    warm_start=True,
+))
+
+register(Algorithm(
+    name="linear_svc",
+    model_type="CalibratedClassifierCV(LinearSVC)",
+    # LinearSVC non ha predict_proba: calibrazione sigmoid in CV
+    build=lambda params, random_state: CalibratedClassifierCV(
+        LinearSVC(C=float(params.get("C", 1.0)), max_iter=int(params.get("max_iter", 2000)), random_state=random_state),
+        method=params.get("calibration", "sigmoid"),
+        cv=int(params.get("cv", 3)),
+        n_jobs=int(params.get("n_jobs", -1)),
+    ),
+    aliases=("svm", "linearsvc"),
+))
+
+register(Algorithm(
+    name="complement_nb",
+    model_type="ComplementNB",
+    build=lambda params, random_state: ComplementNB(alpha=float(params.get("alpha", 0.3))),
+    aliases=("cnb", "naive_bayes"),
+))
+
+register(Algorithm(
+    name="ridge",
+    model_type="RidgeClassifier",
+    # nessun predict_proba: in inferenza solo predicted_label
+    build=lambda params, random_state: RidgeClassifier(
+        alpha=float(params.get("alpha", 1.0)),
+        solver=params.get("solver", "sparse_cg"),
+    ),
+    aliases=("ridge_classifier",),
+))
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import io
+from typing import Any, Dict, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+# Versione del formato di inference_bundle.npz (letto da src/inference/linear_runtime.py)
+BUNDLE_FORMAT_VERSION = 1
+
+
+def _probability_kind(clf: Any) -> Optional[str]:
+    # stesse formule di predict_proba di sklearn: softmax (LogisticRegression multiclasse)
+    # oppure sigmoid + normalizzazione OvR (binario e SGD log_loss)
+    if isinstance(clf, LogisticRegression):
+        return "softmax" if len(clf.classes_) > 2 else "ovr"
+    if isinstance(clf, SGDClassifier) and clf.loss == "log_loss":
+        return "ovr"
+    return None
+
+
+def _supported_vectorizer(vec: Any) -> bool:
+    return (
+        isinstance(vec, TfidfVectorizer)
+        and vec.analyzer == "word"
+        and vec.input == "content"
+        and vec.preprocessor is None
+        and vec.tokenizer is None
+        and vec.strip_accents is None
+        and vec.stop_words is None
+        and not vec.binary
+        and vec.norm in ("l1", "l2", None)
+    )
+
+
+def _supported_encoder(ohe: Any) -> bool:
+    return (
+        isinstance(ohe, OneHotEncoder)
+        and ohe.handle_unknown == "ignore"
+        and ohe.drop_idx_ is None
+        and not getattr(ohe, "_infrequent_enabled", False)
+        and len(ohe.categories_) == 1
+        and all(isinstance(c, str) for c in ohe.categories_[0])
+    )
+
+
+def _layout(preprocess: Any) -> Optional[Dict[str, Any]]:
+    """Il preprocessor di build_preprocessor: TF-IDF sul titolo, poi one-hot del merchant."""
+    if not isinstance(preprocess, ColumnTransformer):
+        return None
+    fitted = [(name, t, cols) for name, t, cols in preprocess.transformers_ if not (isinstance(t, str) and t == "drop")]
+    if len(fitted) != 2:
+        return None
+    (_, vec, vec_col), (_, ohe, ohe_cols) = fitted
+    if vec_col != "Product Title" or list(ohe_cols) != ["Merchant ID"]:
+        return None
+    if not (_supported_vectorizer(vec) and _supported_encoder(ohe)):
+        return None
+    return {"vectorizer": vec, "encoder": ohe}
+
+
+def export_inference_bundle(pipeline: Pipeline, model_etag: str) -> Optional[bytes]:
+    """
+    Bundle NumPy (npz, senza pickle) equivalente a pipeline.joblib per i modelli lineari
+    con probabilità; None se la pipeline non è rappresentabile.
+    model_etag lega il bundle al pipeline.joblib da cui è stato esportato.
+    """
+    clf = pipeline.named_steps.get("clf")
+    kind = _probability_kind(clf)
+    layout = _layout(pipeline.named_steps.get("preprocess"))
+    if kind is None or layout is None:
+        return None
+
+    vec, ohe = layout["vectorizer"], layout["encoder"]
+    vocab = np.empty(len(vec.vocabulary_), dtype=object)
+    for term, j in vec.vocabulary_.items():
+        vocab[j] = term
+
+    arrays: Dict[str, Any] = {
+        "format_version": np.array(BUNDLE_FORMAT_VERSION),
+        "model_etag": np.array(model_etag),
+        "probability": np.array(kind),
+        "vocabulary": vocab.astype(str),
+        "ngram_range": np.array(vec.ngram_range, dtype=np.int64),
+        "token_pattern": np.array(vec.token_pattern),
+        "lowercase": np.array(bool(vec.lowercase)),
+        "sublinear_tf": np.array(bool(vec.sublinear_tf)),
+        "norm": np.array(vec.norm or ""),
+        "idf": np.asarray(vec.idf_) if vec.use_idf else np.ones(len(vocab)),
+        "merchant_categories": np.asarray(ohe.categories_[0]).astype(str),
+        "intercept": np.atleast_1d(np.asarray(clf.intercept_)),
+        "classes": np.asarray(clf.classes_).astype(str),
+    }
+    if sparse.issparse(clf.coef_):
+        coef = sparse.csr_matrix(clf.coef_)
+        arrays.update({
+            "coef_data": coef.data,
+            "coef_indices": coef.indices,
+            "coef_indptr": coef.indptr,
+            "coef_shape": np.array(coef.shape, dtype=np.int64),
+        })
+    else:
+        arrays["coef"] = np.asarray(clf.coef_)
+
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
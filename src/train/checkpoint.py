@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+import warnings
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+from botocore.exceptions import ClientError
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+from src.common.keys import checkpoint_prefix
+from src.common.s3_io import exists, read_bytes, read_json
+from src.common.serialize import json_bytes
+from src.train.algorithms import canonical_name
+from src.train.core import FeatureSet, _evaluate, _FittedClassifier, build_classifier
+
+# Budget esplicito (secondi); 0 = solo il tempo residuo del context Lambda
+TRAIN_TIME_BUDGET_SECONDS = float(os.environ.get("TRAIN_TIME_BUDGET_SECONDS", "0"))
+# Tempo riservato a checkpoint + re-enqueue (o scrittura artifact finali)
+TRAIN_DEADLINE_MARGIN_SECONDS = float(os.environ.get("TRAIN_DEADLINE_MARGIN_SECONDS", "60"))
+# Granularità dei segmenti: alberi per segmento (random_forest), iterazioni per segmento (logreg/sgd)
+TRAIN_SEGMENT_TREES = int(os.environ.get("TRAIN_SEGMENT_TREES", "25"))
+TRAIN_SEGMENT_ITERATIONS = int(os.environ.get("TRAIN_SEGMENT_ITERATIONS", "25"))
+
+
+@dataclass(frozen=True)
+class TrainingDeadline:
+    expires_at: float  # time.monotonic()
+    margin_seconds: float
+
+    @classmethod
+    def from_context(cls, context: Any = None) -> Optional["TrainingDeadline"]:
+        budgets = []
+        if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+            budgets.append(context.get_remaining_time_in_millis() / 1000.0)
+        if TRAIN_TIME_BUDGET_SECONDS > 0:
+            budgets.append(TRAIN_TIME_BUDGET_SECONDS)
+        if not budgets:
+            return None
+        return cls(expires_at=time.monotonic() + min(budgets), margin_seconds=TRAIN_DEADLINE_MARGIN_SECONDS)
+
+    def remaining_seconds(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def allows(self, seconds: float) -> bool:
+        return self.remaining_seconds() - self.margin_seconds >= seconds
+
+
+@dataclass
+class FitState:
+    """Stato di un fit a segmenti: è ciò che finisce nel checkpoint (clf con coef_/intercept_ o alberi già fittati)."""
+    clf: Any
+    model_type: str
+    total: int  # max_iter / n_estimators richiesti (0 = fit in un solo segmento)
+    progress: int = 0  # alberi o iterazioni (n_iter_ cumulato) già eseguiti
+    last_weights: Optional[np.ndarray] = None  # coef_ + intercept_ a fine blocco (convergenza tra blocchi)
+    segment: int = 0
+    fit_seconds: float = 0.0
+    last_segment_seconds: float = 0.0
+    done: bool = False
+
+
+def _segmenting(clf: Any) -> Optional[Tuple[str, int]]:
+    """
+    (parametro con il totale, passo) dei classificatori che si fittano a segmenti con warm_start,
+    None = un solo segmento, non interrompibile.
+    - foresta: ogni segmento aggiunge alberi con gli stessi seed del fit in un colpo solo (modello identico)
+    - logreg (non liblinear) e sgd: max_iter a blocchi, ognuno riparte da coef_/intercept_ del precedente.
+      Un blocco azzera memoria SAG e schedule del learning rate: il modello è quello dello schedule
+      a blocchi (lo stesso con o senza interruzioni), non quello del fit in un colpo solo.
+    """
+    if isinstance(clf, RandomForestClassifier):
+        return "n_estimators", TRAIN_SEGMENT_TREES
+    if isinstance(clf, SGDClassifier) or (isinstance(clf, LogisticRegression) and clf.solver != "liblinear"):
+        return "max_iter", TRAIN_SEGMENT_ITERATIONS
+    return None
+
+
+def fit_schedule(algo: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Schedule con cui fit_segmented produce il modello (entra nella chiave della model cache)."""
+    # streaming/distribuito: fuori dal registry, non passano da fit_segmented
+    segmenting = _segmenting(build_classifier(algo, params, 0)[0]) if canonical_name(algo) else None
+    if segmenting is None:
+        return {"segments": "single"}
+    return {"segments": "warm_start", "param": segmenting[0], "step": segmenting[1]}
+
+
+def _new_state(algo: str, params: Dict[str, Any], random_state: int) -> FitState:
+    clf, model_type = build_classifier(algo, params, random_state)
+    segmenting = _segmenting(clf)
+    total = int(clf.get_params()[segmenting[0]]) if segmenting else 0
+    return FitState(clf=clf, model_type=model_type, total=total)
+
+
+def _run_iterations(state: FitState, X: Any, y: Any, fit_kwargs: Dict[str, Any], step: int) -> None:
+    # coef_/intercept_ del blocco precedente (anche ricaricati dal checkpoint) come punto di partenza
+    clf = state.clf
+    block = min(step, state.total - state.progress)
+    clf.set_params(warm_start=True, max_iter=block)
+    with warnings.catch_warnings():
+        # un blocco che esaurisce le sue iterazioni non è un mancato convergere del fit
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        clf.fit(X, y, **fit_kwargs)
+    n_iter = int(np.max(clf.n_iter_))
+    state.progress += n_iter
+
+    # convergenza: il fit si ferma dentro il blocco, oppure i pesi cambiano meno di tol sull'intero blocco
+    # (dopo un warm start saga riparte con la memoria dei gradienti azzerata: il criterio interno scatta tardi)
+    weights = np.hstack([clf.coef_, np.reshape(clf.intercept_, (-1, 1))])
+    converged = n_iter < block
+    if not converged and state.last_weights is not None and clf.tol is not None:
+        change = np.max(np.abs(weights - state.last_weights)) / max(float(np.max(np.abs(weights))), 1e-12)
+        converged = change < clf.tol
+    state.last_weights = weights
+    state.done = converged or state.progress >= state.total
+    if not state.done:
+        return
+
+    clf.set_params(warm_start=False, max_iter=state.total)
+    # n_iter_ complessivo, come dopo un fit in un colpo solo
+    clf.n_iter_ = np.full_like(clf.n_iter_, state.progress) if isinstance(clf.n_iter_, np.ndarray) else state.progress
+    if not converged:
+        warnings.warn(
+            f"{type(clf).__name__} did not converge in {state.total} iterations ({state.segment + 1} segments).",
+            ConvergenceWarning,
+        )
+
+
+def _run_segment(state: FitState, features: FeatureSet) -> None:
+    clf = state.clf
+    X, y, fit_kwargs = features.fit_arguments(clf)
+    segmenting = _segmenting(clf)
+    if segmenting is None:
+        clf.fit(X, y, **fit_kwargs)
+        state.done = True
+        return
+
+    param, step = segmenting
+    if param == "max_iter":
+        _run_iterations(state, X, y, fit_kwargs, step)
+        return
+
+    # warm_start su una foresta aggiunge alberi: stesso risultato del fit in un colpo solo
+    state.progress = min(state.progress + step, state.total)
+    clf.set_params(warm_start=True, **{param: state.progress})
+    clf.fit(X, y, **fit_kwargs)
+    state.done = state.progress >= state.total
+    if state.done:
+        clf.set_params(warm_start=False, **{param: state.total})
+
+
+def fit_segmented(
+    features: FeatureSet,
+    algo: str,
+    params: Dict[str, Any],
+    deadline: Optional[TrainingDeadline],
+    state: Optional[FitState] = None,
+    random_state: int = 42,
+    on_checkpoint: Optional[Callable[[FitState], None]] = None,
+) -> Optional[_FittedClassifier]:
+    """
+    Fit a segmenti con lo stesso schedule sia che venga interrotto sia che no (anche senza
+    deadline): il modello finale non dipende da dove cadono i checkpoint. Ritorna None se il
+    tempo residuo non basta per il prossimo segmento (dopo aver chiamato on_checkpoint con lo
+    stato corrente). Almeno un segmento per invocazione viene sempre eseguito.
+    """
+    state = state or _new_state(algo, params, random_state)
+    ran = 0
+    while not state.done:
+        if ran and deadline is not None and not deadline.allows(state.last_segment_seconds):
+            if on_checkpoint is not None:
+                on_checkpoint(state)
+            return None
+        t0 = time.perf_counter()
+        _run_segment(state, features)
+        state.last_segment_seconds = time.perf_counter() - t0
+        state.fit_seconds += state.last_segment_seconds
+        state.segment += 1
+        ran += 1
+    return _evaluate(features, state.clf, state.model_type, state.fit_seconds)
+
+
+def save_checkpoint(s3, bucket: str, version_prefix: str, state: FitState, meta: Dict[str, Any]) -> str:
+    prefix = checkpoint_prefix(version_prefix)
+    buf = io.BytesIO()
+    joblib.dump(state, buf)
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/state.joblib", Body=buf.getvalue(), ContentType="application/octet-stream")
+
+    # state.json scritto per ultimo: la sua presenza garantisce un checkpoint completo
+    info = dict(meta)
+    info.update({"segment": state.segment, "progress": state.progress, "total": state.total, "fit_seconds": state.fit_seconds})
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/state.json", Body=json_bytes(info), ContentType="application/json")
+    return f"{prefix}/state.json"
+
+
+def load_checkpoint(s3, bucket: str, version_prefix: str) -> Optional[Tuple[FitState, Dict[str, Any]]]:
+    prefix = checkpoint_prefix(version_prefix)
+    if not exists(s3, bucket, f"{prefix}/state.json"):
+        return None
+    meta = read_json(s3, bucket, f"{prefix}/state.json")
+    state = joblib.load(io.BytesIO(read_bytes(s3, bucket, f"{prefix}/state.joblib")))
+    return state, meta
+
+
+def delete_checkpoint(s3, bucket: str, version_prefix: str) -> None:
+    prefix = checkpoint_prefix(version_prefix)
+    for name in ("state.json", "state.joblib"):
+        try:
+            s3.delete_object(Bucket=bucket, Key=f"{prefix}/{name}")
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code not in ("404", "NoSuchKey", "NotFound"):
+                raise
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Tuple
+
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+
+# Compattazione dell'artifact prima dell'upload (0 = dump joblib "raw" come in origine)
+TRAIN_COMPACT_MODEL = os.environ.get("TRAIN_COMPACT_MODEL", "1") == "1"
+# Livello zlib per joblib.dump (0-9)
+TRAIN_MODEL_COMPRESS = int(os.environ.get("TRAIN_MODEL_COMPRESS", "3"))
+# Sotto questa densità i coef_ vengono salvati sparsi: 12 byte per non-zero (float64 + indice int32)
+# contro 4 byte per peso dei coef_ densi float32
+SPARSIFY_MAX_DENSITY = 0.3
+
+
+def _dump(obj: Any, compress: int = 0) -> bytes:
+    buf = io.BytesIO()
+    joblib.dump(obj, buf, compress=("zlib", compress) if compress else 0)
+    return buf.getvalue()
+
+
+def _timed_load(data: bytes) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    obj = joblib.load(io.BytesIO(data))
+    return obj, time.perf_counter() - t0
+
+
+def _vectorizers(pipeline: Pipeline) -> Iterator[TfidfVectorizer]:
+    preprocess = pipeline.named_steps.get("preprocess")
+    for _, transformer, _ in getattr(preprocess, "transformers_", []):
+        if isinstance(transformer, TfidfVectorizer):
+            yield transformer
+
+
+def _linear_models(clf: Any) -> Iterator[Any]:
+    yield clf
+    # CalibratedClassifierCV: un classificatore lineare per fold
+    for calibrated in getattr(clf, "calibrated_classifiers_", []):
+        yield calibrated.estimator
+
+
+def compact_pipeline(pipeline: Pipeline) -> Pipeline:
+    """
+    Rimuove lo stato usato solo in training e riduce la precisione dei pesi (in place, idempotente):
+      - TfidfVectorizer.stop_words_ (tutti gli n-gram scartati da max_features)
+      - idf_, coef_ densi, intercept_ (e feature_log_prob_ di NB) in float32
+      - coef_ sparsi (float64) se la densità è sotto SPARSIFY_MAX_DENSITY
+    """
+    for vectorizer in _vectorizers(pipeline):
+        vectorizer.stop_words_ = None
+        if getattr(vectorizer, "use_idf", False) and hasattr(vectorizer, "idf_"):
+            vectorizer.idf_ = np.asarray(vectorizer.idf_, dtype=np.float32)
+
+    for model in _linear_models(pipeline.named_steps["clf"]):
+        coef = getattr(model, "coef_", None)
+        if isinstance(coef, np.ndarray):
+            if hasattr(model, "sparsify") and np.count_nonzero(coef) < SPARSIFY_MAX_DENSITY * coef.size:
+                # sklearn richiede lo stesso dtype tra X sparsa (float64) e coef_ sparsi: niente float32
+                model.sparsify()
+            else:
+                model.coef_ = coef.astype(np.float32)
+            model.intercept_ = np.asarray(model.intercept_, dtype=np.float32)
+        if isinstance(getattr(model, "feature_log_prob_", None), np.ndarray):
+            model.feature_log_prob_ = model.feature_log_prob_.astype(np.float32)
+    return pipeline
+
+
+def dense_coef(model: Any) -> np.ndarray:
+    """coef_ float64 denso (es. warm start da un artifact compattato)."""
+    coef = model.coef_
+    if sparse.issparse(coef):
+        coef = coef.toarray()
+    return np.array(coef, dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class Artifact:
+    data: bytes  # contenuto di pipeline.joblib
+    pipeline: Pipeline  # la pipeline serializzata in data (compattata)
+    stats: Dict[str, Any]
+
+
+def build_artifact(pipeline: Pipeline) -> Artifact:
+    """
+    Bytes di pipeline.joblib + stats (dimensione e tempo di load prima/dopo la compattazione).
+    La compattazione lavora sulla copia ricaricata dal dump raw: la pipeline passata non cambia.
+    """
+    raw = _dump(pipeline)
+    copy, raw_load_seconds = _timed_load(raw)
+    stats: Dict[str, Any] = {
+        "compacted": TRAIN_COMPACT_MODEL,
+        "raw_bytes": len(raw),
+        "raw_load_seconds": raw_load_seconds,
+    }
+    if not TRAIN_COMPACT_MODEL:
+        stats.update({"bytes": len(raw), "load_seconds": raw_load_seconds})
+        return Artifact(data=raw, pipeline=copy, stats=stats)
+
+    compacted = compact_pipeline(copy)
+    data = _dump(compacted, compress=TRAIN_MODEL_COMPRESS)
+    stats.update({"bytes": len(data), "load_seconds": _timed_load(data)[1], "compress": f"zlib:{TRAIN_MODEL_COMPRESS}"})
+    return Artifact(data=data, pipeline=compacted, stats=stats)
@@ -1,19 +1,33 @@
 from __future__ import annotations
 
+import contextlib
+import functools
+import time
 from dataclasses import dataclass
-from typing import Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from sklearn.compose import ColumnTransformer
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, f1_score
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.utils.validation import has_fit_parameter
+from threadpoolctl import threadpool_limits
 
 from src.common.config import FEATURE_COLUMNS, TARGET_COLUMN
+from src.common.parallel import default_workers, map_in_processes
+from src.train.algorithms import canonical_name, get_algorithm
+
+# Configurazione di vettorizzazione + split (sovrascrivibile da manifest "features")
+DEFAULT_FEATURE_CONFIG: Dict[str, Any] = {
+    "tfidf_max_features": 20000,
+    "tfidf_ngram_range": [1, 2],
+    "test_size": 0.2,
+    "dedup": False,  # righe di training identiche collassate in una con sample_weight
+}
 
 
 @dataclass(frozen=True)
@@ -23,72 +37,293 @@ class TrainResult:
     model_info: Dict
 
 
-def train_model(df: pd.DataFrame, random_state: int = 42, manifest: Dict | None = None) -> TrainResult:
-    manifest = manifest or {}
-    algo = (manifest.get("algo") or "logreg").lower()
-    params = manifest.get("params") or {}
+@dataclass(frozen=True)
+class FeatureSet:
+    """Preprocessor fittato sul train split + matrici train/test già trasformate."""
+    preprocessor: ColumnTransformer
+    X_train: Any
+    X_test: Any
+    y_train: np.ndarray
+    y_test: np.ndarray
+    n_classes: int
+    config: Dict
+    # dedup: X_train/y_train hanno solo righe uniche, sample_weight = conteggio per riga e
+    # train_inverse = riga unica di ogni riga originale (per i classificatori senza pesi)
+    sample_weight: Optional[np.ndarray] = None
+    train_inverse: Optional[np.ndarray] = None
 
-    for col in FEATURE_COLUMNS + [TARGET_COLUMN]:
-        if col not in df.columns:
-            raise ValueError(f"Missing column '{col}' in processed dataset.")
+    @property
+    def n_train_rows(self) -> int:
+        return int(self.X_train.shape[0] if self.train_inverse is None else len(self.train_inverse))
 
-    X = df[FEATURE_COLUMNS].copy()
-    y = df[TARGET_COLUMN].astype(str).copy()
+    def weighted_fit(self, clf: Any) -> bool:
+        return self.sample_weight is not None and uses_sample_weight(clf)
+
+    def fit_arguments(self, clf: Any) -> Tuple[Any, np.ndarray, Dict[str, Any]]:
+        """(X, y, fit kwargs) per clf.fit: righe uniche + sample_weight se clf li accetta."""
+        if self.sample_weight is None:
+            return self.X_train, self.y_train, {}
+        if self.weighted_fit(clf):
+            return self.X_train, self.y_train, {"sample_weight": self.sample_weight}
+        return self.X_train[self.train_inverse], self.y_train[self.train_inverse], {}
+
+    def dedup_stats(self) -> Optional[Dict[str, Any]]:
+        if self.sample_weight is None:
+            return None
+        unique_rows = int(self.X_train.shape[0])
+        return {
+            "rows": self.n_train_rows,
+            "unique_rows": unique_rows,
+            "compression_ratio": self.n_train_rows / max(unique_rows, 1),
+        }
+
+
+def uses_sample_weight(clf: Any) -> bool:
+    # sag/saga: il passo si riduce col peso massimo e la convergenza degrada, meglio le righe originali
+    return has_fit_parameter(clf, "sample_weight") and getattr(clf, "solver", None) not in ("sag", "saga")
+
+
+def _dedup_useful(manifest: Dict) -> bool:
+    """
+    Dedup solo se almeno un classificatore del manifest (algo + candidati dello sweep) fitta con
+    sample_weight: per gli altri le righe andrebbero riespanse e il dedup sarebbe solo costo.
+    """
+    candidates = [{"algo": manifest.get("algo"), "params": manifest.get("params")}]
+    candidates += (manifest.get("sweep") or {}).get("candidates") or []
+    if all(c.get("algo") is None for c in candidates):
+        return True  # nessun algoritmo noto (es. feature set costruito a parte): vale la richiesta
+    for c in candidates:
+        if c.get("algo") is not None and canonical_name(c["algo"]) is not None:
+            clf, _ = build_classifier(c["algo"], c.get("params") or {})
+            if uses_sample_weight(clf):
+                return True
+    return False
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=random_state, stratify=y
-    )
 
-    preprocessor = ColumnTransformer(
+def dedup_skipped(manifest: Dict | None) -> bool:
+    """Dedup richiesto dal manifest ma disattivato da feature_config (nessun fit pesato)."""
+    overrides = (manifest or {}).get("features") or {}
+    return bool(overrides.get("dedup")) and not feature_config(manifest)["dedup"]
+
+
+def feature_config(manifest: Dict | None = None, random_state: int = 42) -> Dict[str, Any]:
+    overrides = (manifest or {}).get("features") or {}
+    config = dict(DEFAULT_FEATURE_CONFIG)
+    config.update({k: v for k, v in overrides.items() if k in DEFAULT_FEATURE_CONFIG})
+    config["tfidf_max_features"] = int(config["tfidf_max_features"])
+    config["tfidf_ngram_range"] = [int(n) for n in config["tfidf_ngram_range"]]
+    config["test_size"] = float(config["test_size"])
+    config["dedup"] = bool(config["dedup"]) and _dedup_useful(manifest or {})
+    config["random_state"] = int(random_state)
+    return config
+
+
+def build_preprocessor(config: Dict[str, Any]) -> ColumnTransformer:
+    return ColumnTransformer(
         transformers=[
-            ("title_tfidf", TfidfVectorizer(max_features=20000, ngram_range=(1, 2)), "Product Title"),
+            (
+                "title_tfidf",
+                TfidfVectorizer(
+                    max_features=config["tfidf_max_features"],
+                    ngram_range=tuple(config["tfidf_ngram_range"]),
+                ),
+                "Product Title",
+            ),
             ("merchant_ohe", OneHotEncoder(handle_unknown="ignore"), ["Merchant ID"]),
         ],
         remainder="drop",
         sparse_threshold=0.3,
     )
 
-    if algo in ("logreg", "logistic_regression", "logistic"):
-        clf = LogisticRegression(
-            solver=params.get("solver", "saga"),
-            max_iter=int(params.get("max_iter", 2000)),
-            C=float(params.get("C", 1.0)),
-            n_jobs=int(params.get("n_jobs", -1)),
-        )
-        model_type = "LogisticRegression"
-    elif algo in ("random_forest", "rf", "forest"):
-        clf = RandomForestClassifier(
-            n_estimators=int(params.get("n_estimators", 200)),
-            max_depth=params.get("max_depth", None),
-            n_jobs=int(params.get("n_jobs", -1)),
-            random_state=random_state,
-        )
-        model_type = "RandomForestClassifier"
+
+def features_and_target(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    for col in FEATURE_COLUMNS + [TARGET_COLUMN]:
+        if col not in df.columns:
+            raise ValueError(f"Missing column '{col}' in processed dataset.")
+    return df[FEATURE_COLUMNS].copy(), df[TARGET_COLUMN].astype(str).copy()
+
+
+def dedup_rows(X: pd.DataFrame, y: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(posizioni delle righe uniche di (X, y), conteggi, riga unica di ogni riga originale)."""
+    keys = X.assign(**{TARGET_COLUMN: y.to_numpy()})
+    inverse = keys.groupby(list(keys.columns), sort=False, dropna=False).ngroup().to_numpy()
+    _, first = np.unique(inverse, return_index=True)
+    counts = np.bincount(inverse)
+    return first, counts.astype(np.float64), inverse
+
+
+def featurize_split(
+    X_train: pd.DataFrame,
+    X_test: pd.DataFrame,
+    y_train: pd.Series,
+    y_test: pd.Series,
+    config: Dict[str, Any],
+    preprocessor: ColumnTransformer | None = None,
+) -> FeatureSet:
+    sample_weight, inverse = None, None
+    n_classes = int(pd.concat([y_train, y_test]).nunique())
+
+    if config.get("dedup"):
+        # il preprocessor vede tutte le righe (idf invariato), il classificatore solo quelle uniche
+        if preprocessor is None:
+            preprocessor = build_preprocessor(config).fit(X_train, y_train)
+        first, sample_weight, inverse = dedup_rows(X_train, y_train)
+        X_train, y_train = X_train.iloc[first], y_train.iloc[first]
+        Xt_train = preprocessor.transform(X_train)
+    elif preprocessor is None:
+        preprocessor = build_preprocessor(config)
+        Xt_train = preprocessor.fit_transform(X_train, y_train)
     else:
-        raise ValueError(f"Unsupported algo '{algo}'. Allowed: logreg, random_forest")
+        Xt_train = preprocessor.transform(X_train)
+    Xt_test = preprocessor.transform(X_test)
 
-    pipeline = Pipeline(steps=[
-        ("preprocess", preprocessor),
-        ("clf", clf),
-    ])
+    return FeatureSet(
+        preprocessor=preprocessor,
+        X_train=Xt_train,
+        X_test=Xt_test,
+        y_train=y_train.to_numpy(dtype=object),
+        y_test=y_test.to_numpy(dtype=object),
+        n_classes=n_classes,
+        config=config,
+        sample_weight=sample_weight,
+        train_inverse=inverse,
+    )
 
-    pipeline.fit(X_train, y_train)
-    y_pred = pipeline.predict(X_test)
+
+def featurize(df: pd.DataFrame, config: Dict[str, Any], preprocessor: ColumnTransformer | None = None) -> FeatureSet:
+    """Con un preprocessor già fittato (warm start) il vocabolario è riusato: solo transform."""
+    X, y = features_and_target(df)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=config["test_size"], random_state=config["random_state"], stratify=y
+    )
+    return featurize_split(X_train, X_test, y_train, y_test, config, preprocessor)
+
+
+def build_classifier(algo: str, params: Dict[str, Any], random_state: int = 42) -> Tuple[Any, str]:
+    algorithm = get_algorithm(algo)
+    return algorithm.build(params, random_state), algorithm.model_type
+
+
+@contextlib.contextmanager
+def single_threaded(clf: Any, params: Dict[str, Any]) -> Iterator[None]:
+    """
+    Fit dentro un processo worker: BLAS/OpenMP a un thread e n_jobs (anche annidati) a 1,
+    salvo n_jobs esplicito nei params. n_jobs originali ripristinati dopo il fit:
+    params registrati e modello serializzato restano quelli del fit seriale.
+    """
+    overrides: Dict[str, Any] = {}
+    if "n_jobs" not in params:
+        overrides = {
+            name: value
+            for name, value in clf.get_params(deep=True).items()
+            if name.rsplit("__", 1)[-1] == "n_jobs" and value not in (None, 1)
+        }
+    clf.set_params(**{name: 1 for name in overrides})
+    try:
+        with threadpool_limits(limits=1):
+            yield
+    finally:
+        clf.set_params(**overrides)
+
+
+@dataclass(frozen=True)
+class _FittedClassifier:
+    clf: Any
+    model_type: str
+    metrics: Dict
+    fit_seconds: float
+
+
+def _fit_classifier(
+    features: FeatureSet,
+    algo: str,
+    params: Dict[str, Any],
+    random_state: int,
+    init: Optional[Callable[[Any], None]] = None,
+    in_worker: bool = False,
+) -> _FittedClassifier:
+    clf, model_type = build_classifier(algo, params, random_state)
+    if init is not None:
+        # es. warm start: coefficienti iniziali dal modello precedente
+        init(clf)
+    X, y, fit_kwargs = features.fit_arguments(clf)
+    with single_threaded(clf, params) if in_worker else contextlib.nullcontext():
+        t0 = time.perf_counter()
+        clf.fit(X, y, **fit_kwargs)
+        return _evaluate(features, clf, model_type, time.perf_counter() - t0)
+
+
+def _evaluate(features: FeatureSet, clf: Any, model_type: str, fit_seconds: float) -> _FittedClassifier:
+    y_pred = clf.predict(features.X_test)
 
     metrics = {
-        "accuracy": float(accuracy_score(y_test, y_pred)),
-        "f1_macro": float(f1_score(y_test, y_pred, average="macro")),
-        "n_train": int(len(X_train)),
-        "n_test": int(len(X_test)),
-        "n_classes": int(pd.Series(y).nunique()),
+        "accuracy": float(accuracy_score(features.y_test, y_pred)),
+        "f1_macro": float(f1_score(features.y_test, y_pred, average="macro")),
+        "n_train": features.n_train_rows,
+        "n_test": int(features.X_test.shape[0]),
+        "n_classes": int(features.n_classes),
     }
+    if features.sample_weight is not None:
+        metrics["dedup"] = dict(features.dedup_stats(), weighted_fit=features.weighted_fit(clf))
+    return _FittedClassifier(clf=clf, model_type=model_type, metrics=metrics, fit_seconds=fit_seconds)
+
+
+def _to_result(features: FeatureSet, fitted: _FittedClassifier, algo: str, params: Dict[str, Any]) -> TrainResult:
+    # il preprocessor è già fittato sul train split: stesso modello di Pipeline.fit
+    pipeline = Pipeline(steps=[
+        ("preprocess", features.preprocessor),
+        ("clf", fitted.clf),
+    ])
 
     model_info = {
         "features": FEATURE_COLUMNS,
         "target": TARGET_COLUMN,
-        "model_type": f"sklearn Pipeline (TFIDF + OneHot + {model_type})",
+        "model_type": f"sklearn Pipeline (TFIDF + OneHot + {fitted.model_type})",
         "algo": algo,
         "params": params,
+        "feature_config": features.config,
     }
+    return TrainResult(pipeline=pipeline, metrics=dict(fitted.metrics), model_info=model_info)
+
+
+def train_on_features(features: FeatureSet, manifest: Dict | None = None, random_state: int = 42) -> TrainResult:
+    manifest = manifest or {}
+    algo = (manifest.get("algo") or "logreg").lower()
+    params = manifest.get("params") or {}
+
+    fitted = _fit_classifier(features, algo, params, random_state)
+    return _to_result(features, fitted, algo, params)
 
-    return TrainResult(pipeline=pipeline, metrics=metrics, model_info=model_info)
+
+def _fit_candidate(features: FeatureSet, random_state: int, in_worker: bool, candidate: Dict[str, Any]) -> _FittedClassifier:
+    return _fit_classifier(features, candidate["algo"], candidate["params"], random_state, in_worker=in_worker)
+
+
+def train_candidates(
+    features: FeatureSet,
+    candidates: List[Dict[str, Any]],
+    workers: int | None = None,
+    random_state: int = 42,
+) -> List[TrainResult]:
+    """
+    Fit di più classificatori sulle stesse matrici (vettorizzazione una sola volta).
+    I candidati girano in processi separati: con fork le matrici sparse sono condivise
+    in sola lettura (copy-on-write) e torna al padre solo il classificatore fittato.
+    """
+    workers = min(len(candidates), workers or default_workers())
+    # con più processi ogni fit usa un solo thread (niente oversubscription)
+    fitted = map_in_processes(
+        functools.partial(_fit_candidate, features, random_state, workers > 1), candidates, workers
+    )
+
+    results = []
+    for candidate, f in zip(candidates, fitted):
+        result = _to_result(features, f, candidate["algo"], candidate["params"])
+        result.metrics["fit_seconds"] = f.fit_seconds
+        results.append(result)
+    return results
+
+
+def train_model(df: pd.DataFrame, random_state: int = 42, manifest: Dict | None = None) -> TrainResult:
+    features = featurize(df, feature_config(manifest, random_state))
+    return train_on_features(features, manifest=manifest, random_state=random_state)
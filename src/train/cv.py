@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+from src.common.parallel import default_workers, map_in_processes
+from src.train.core import build_classifier, features_and_target, featurize_split, single_threaded
+
+
+@dataclass(frozen=True)
+class FoldResult:
+    fold: int
+    featurize_seconds: float
+    wall_seconds: float
+    scores: List[Dict[str, float]]  # uno per candidato, stesso ordine
+
+
+def _run_fold(
+    X: pd.DataFrame,
+    y: pd.Series,
+    config: Dict[str, Any],
+    candidates: List[Dict[str, Any]],
+    random_state: int,
+    in_worker: bool,
+    split: Tuple[int, Tuple[np.ndarray, np.ndarray]],
+) -> FoldResult:
+    fold, (train_idx, test_idx) = split
+    t_start = time.perf_counter()
+
+    # un solo preprocessor fittato per fold, riusato da tutti i candidati
+    features = featurize_split(X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx], config)
+    featurize_seconds = time.perf_counter() - t_start
+
+    scores = []
+    for candidate in candidates:
+        clf, _ = build_classifier(candidate["algo"], candidate["params"], random_state)
+        X_fit, y_fit, fit_kwargs = features.fit_arguments(clf)
+        with single_threaded(clf, candidate["params"]) if in_worker else contextlib.nullcontext():
+            t0 = time.perf_counter()
+            clf.fit(X_fit, y_fit, **fit_kwargs)
+            fit_seconds = time.perf_counter() - t0
+            y_pred = clf.predict(features.X_test)
+        scores.append({
+            "accuracy": float(accuracy_score(features.y_test, y_pred)),
+            "f1_macro": float(f1_score(features.y_test, y_pred, average="macro")),
+            "fit_seconds": fit_seconds,
+        })
+    return FoldResult(
+        fold=fold,
+        featurize_seconds=featurize_seconds,
+        wall_seconds=time.perf_counter() - t_start,
+        scores=scores,
+    )
+
+
+def cross_validate(
+    df: pd.DataFrame,
+    config: Dict[str, Any],
+    candidates: List[Dict[str, Any]],
+    folds: int,
+    workers: int | None = None,
+    random_state: int = 42,
+) -> Dict[str, Any]:
+    """
+    K-fold stratificato: un processo per fold (al più workers alla volta). Ogni fold vettorizza
+    una volta e fitta tutti i candidati sulle stesse matrici; al padre tornano solo gli score.
+    Ritorna il riepilogo per fold + media/std per candidato (stesso ordine di candidates).
+    """
+    X, y = features_and_target(df)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    splits = list(enumerate(splitter.split(X, y)))
+
+    workers = min(len(splits), workers or default_workers())
+
+    t0 = time.perf_counter()
+    fold_results = map_in_processes(
+        functools.partial(_run_fold, X, y, config, candidates, random_state, workers > 1), splits, workers
+    )
+    wall_seconds = time.perf_counter() - t0
+
+    summaries = []
+    for i, candidate in enumerate(candidates):
+        per_fold = [dict(r.scores[i], fold=r.fold) for r in fold_results]
+        summary: Dict[str, Any] = {"algo": candidate["algo"], "params": candidate["params"]}
+        for metric in ("accuracy", "f1_macro"):
+            values = np.array([s[metric] for s in per_fold])
+            summary[f"{metric}_mean"] = float(values.mean())
+            summary[f"{metric}_std"] = float(values.std())
+        summary["per_fold"] = per_fold
+        summaries.append(summary)
+
+    return {
+        "folds": folds,
+        "workers": workers,
+        "wall_seconds": wall_seconds,
+        "fold_wall_seconds": [r.wall_seconds for r in fold_results],
+        "fold_featurize_seconds": [r.featurize_seconds for r in fold_results],
+        "candidates": summaries,
+    }
+
+
+def candidate_cv(cv_result: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Riepilogo CV di un candidato + tempi per fold, nel formato di metrics.json["cv"]."""
+    out = {k: v for k, v in cv_result.items() if k != "candidates"}
+    out.update({k: v for k, v in cv_result["candidates"][index].items() if k not in ("algo", "params")})
+    return out
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import functools
+import io
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.pipeline import Pipeline
+
+from src.common.config import FEATURE_COLUMNS, TARGET_COLUMN
+from src.common.parallel import default_workers, map_in_processes
+from src.common.s3_io import s3_client_default
+from src.preprocess.parallel import next_row_start
+from src.train.core import TrainResult
+from src.train.streaming import (
+    DEFAULT_STREAMING_PARAMS,
+    StratifiedHoldout,
+    build_hashing_preprocessor,
+    clean_chunk,
+)
+
+DISTRIBUTED_ALGOS = ("sgd_distributed", "distributed_sgd")
+
+DEFAULT_DISTRIBUTED_PARAMS: Dict[str, Any] = {
+    **{k: v for k, v in DEFAULT_STREAMING_PARAMS.items() if k != "chunk_rows"},
+    "epochs": 5,
+    "shards": 0,  # 0 = uno shard per worker
+    "workers": 0,  # 0 = default_workers()
+}
+
+# Blocco della lettura sequenziale con cui il padre cerca i confini di riga
+_SCAN_BLOCK = 8 * 1024 * 1024
+
+
+def is_distributed_algo(algo: str) -> bool:
+    return (algo or "").lower() in DISTRIBUTED_ALGOS
+
+
+def distributed_params(params: Dict[str, Any] | None) -> Dict[str, Any]:
+    out = dict(DEFAULT_DISTRIBUTED_PARAMS)
+    out.update({k: v for k, v in (params or {}).items() if k in DEFAULT_DISTRIBUTED_PARAMS})
+    return out
+
+
+@dataclass(frozen=True)
+class ShardTask:
+    index: int
+    start: int  # [start, end): righe CSV complete, start ed end a confine di riga
+    end: int
+
+
+@dataclass(frozen=True)
+class ShardModel:
+    index: int
+    coef: sparse.csr_matrix  # hashing: la maggior parte dei bucket resta a zero
+    intercept: np.ndarray
+    n_train: int
+    n_holdout: int
+    X_eval: Any
+    y_eval: np.ndarray
+    read_seconds: float
+    fit_seconds: float
+
+
+def _get_range(s3, bucket: str, key: str, etag: str, first: int, last: int) -> bytes:
+    # ogni GET è legata all'ETag della head_object: se processed.csv viene riscritto durante
+    # il training gli shard falliscono (412) invece di mescolare righe di due versioni
+    return s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={first}-{last}", IfMatch=etag)["Body"].read()
+
+
+def plan_shards(s3, bucket: str, key: str, etag: str, size: int, n_shards: int) -> Tuple[bytes, List[ShardTask]]:
+    """
+    Header e shard di processed.csv a confine di riga CSV. Merchant ID e Category Label
+    possono contenere newline quotati, quindi un "\\n" non basta a riconoscere un inizio riga:
+    il padre legge il file una volta in sequenza (a blocchi, senza parsing) contando le
+    virgolette come split_row_aligned, e ogni shard legge poi esattamente il proprio range.
+    """
+    header = b""
+    data_start: Optional[int] = None
+    targets = [0]  # offset da cui cercare il prossimo inizio riga (il primo chiude l'header)
+    bounds: List[int] = []
+    offset = 0
+    quotes = 0  # virgolette da inizio file fino a offset: a confine di riga sono pari
+
+    body = s3.get_object(Bucket=bucket, Key=key, IfMatch=etag)["Body"]
+    while targets and offset < size:
+        block = body.read(_SCAN_BLOCK)
+        if not block:
+            break
+        in_header = data_start is None
+        while targets and targets[0] - offset < len(block):
+            pos = targets[0] - offset
+            found, _ = next_row_start(block, pos, quotes + block.count(b'"', 0, pos))
+            if found == -1:
+                # la riga prosegue nel blocco successivo
+                targets[0] = offset + len(block)
+                break
+            bound = offset + found
+            if data_start is None:
+                data_start = bound
+                step = (size - data_start) / max(1, n_shards)
+                targets = [data_start + int(k * step) for k in range(1, n_shards)]
+            else:
+                bounds.append(bound)
+            targets = [t for t in targets if t >= bound]
+        if in_header:
+            header += block if data_start is None else block[: data_start - offset]
+        quotes += block.count(b'"')
+        offset += len(block)
+    body.close()
+
+    if data_start is None or data_start >= size:
+        raise ValueError(f"Processed dataset without data rows: {key}")
+    edges = [data_start] + [b for b in bounds if data_start < b < size] + [size]
+    tasks = [ShardTask(index=i, start=a, end=b) for i, (a, b) in enumerate(zip(edges[:-1], edges[1:]))]
+    return header, tasks
+
+
+def read_shard_rows(s3, bucket: str, key: str, etag: str, task: ShardTask) -> bytes:
+    """Righe CSV dello shard: plan_shards ha già allineato il range, una sola GET ranged."""
+    return _get_range(s3, bucket, key, etag, task.start, task.end - 1)
+
+
+def _train_shard(
+    client_factory: Callable[[], Any],
+    bucket: str,
+    key: str,
+    etag: str,
+    header: bytes,
+    classes: List[str],
+    params: Dict[str, Any],
+    n_shards: int,
+    random_state: int,
+    task: ShardTask,
+) -> ShardModel:
+    t0 = time.perf_counter()
+    # client creato nel worker: un client boto3 non va condiviso tra processi forkati
+    s3 = client_factory()
+    rows = read_shard_rows(s3, bucket, key, etag, task)
+    df = clean_chunk(pd.read_csv(io.BytesIO(header + rows), dtype=str))
+    read_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    y = df[TARGET_COLUMN].to_numpy()
+    holdout = StratifiedHoldout(
+        classes, float(params["eval_fraction"]), int(params["max_eval_rows"]) // n_shards, random_state + task.index
+    )
+    is_eval = holdout.split(y)
+    holdout.offer(df[is_eval])
+
+    preprocessor = build_hashing_preprocessor(params)
+    preprocessor.fit(pd.DataFrame({"Product Title": [""], "Merchant ID": [""]}))
+    X = preprocessor.transform(df[FEATURE_COLUMNS])
+
+    # tutte le classi note a ogni shard: coef_ con la stessa forma, mediabili
+    clf = SGDClassifier(loss=params["loss"], alpha=float(params["alpha"]), random_state=random_state)
+    rng = np.random.default_rng(random_state + task.index)
+    train_idx = np.flatnonzero(~is_eval)
+    for _ in range(int(params["epochs"])):
+        if len(train_idx) == 0:
+            break
+        order = rng.permutation(train_idx)
+        clf.partial_fit(X[order], y[order], classes=np.asarray(classes, dtype=object))
+
+    if len(train_idx):
+        coef, intercept = sparse.csr_matrix(clf.coef_), np.asarray(clf.intercept_)
+    else:
+        coef, intercept = sparse.csr_matrix((len(classes), X.shape[1])), np.zeros(len(classes))
+
+    X_eval_df, y_eval = holdout.sample()
+    return ShardModel(
+        index=task.index,
+        coef=coef,
+        intercept=intercept,
+        n_train=int(len(train_idx)),
+        n_holdout=int(is_eval.sum()),
+        X_eval=preprocessor.transform(X_eval_df),
+        y_eval=y_eval,
+        read_seconds=read_seconds,
+        fit_seconds=time.perf_counter() - t0,
+    )
+
+
+def _average(shards: List[ShardModel]) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Parameter averaging pesato sul numero di righe di training di ogni shard."""
+    n_train = sum(s.n_train for s in shards)
+    if n_train == 0:
+        raise ValueError("Distributed training received no training rows.")
+    coef = sparse.csr_matrix(shards[0].coef.shape)
+    intercept = np.zeros_like(shards[0].intercept, dtype=np.float64)
+    for s in shards:
+        weight = s.n_train / n_train
+        coef = coef + s.coef * weight
+        intercept += s.intercept * weight
+    return coef.toarray(), intercept, n_train
+
+
+def train_distributed(
+    s3,
+    bucket: str,
+    processed_key: str,
+    classes: Optional[List[str]],
+    manifest: Dict | None = None,
+    random_state: int = 42,
+    client_factory: Optional[Callable[[], Any]] = None,
+) -> TrainResult:
+    """
+    Training data-parallel: processed.csv diviso in shard per byte range, un SGDClassifier
+    (feature hashing, stesso spazio per tutti) per shard in processi separati, poi reduce
+    con media dei parametri pesata per righe. Su Lambda ogni shard sarebbe un'invocazione:
+    qui map_in_processes fa da stand-in locale del fan-out. s3 serve solo al processo padre:
+    ogni shard legge con un proprio client (client_factory, default s3_client_default).
+    """
+    manifest = manifest or {}
+    algo = (manifest.get("algo") or DISTRIBUTED_ALGOS[0]).lower()
+    params = distributed_params(manifest.get("params"))
+    workers = int(params["workers"]) or default_workers()
+    n_shards = int(params["shards"]) or workers
+
+    head = s3.head_object(Bucket=bucket, Key=processed_key)
+    size, etag = int(head["ContentLength"]), head["ETag"]
+    if not classes:
+        raise ValueError("Distributed training requires classes.json next to the processed dataset.")
+    classes = sorted(classes)
+
+    header, tasks = plan_shards(s3, bucket, processed_key, etag, size, n_shards)
+    train_shard = functools.partial(
+        _train_shard,
+        client_factory or s3_client_default,
+        bucket,
+        processed_key,
+        etag,
+        header,
+        classes,
+        params,
+        len(tasks),
+        random_state,
+    )
+    shards = map_in_processes(train_shard, tasks, workers)
+
+    t0 = time.perf_counter()
+    coef, intercept, n_train = _average(shards)
+
+    preprocessor = build_hashing_preprocessor(params)
+    preprocessor.fit(pd.DataFrame({"Product Title": [""], "Merchant ID": [""]}))
+    clf = SGDClassifier(loss=params["loss"], alpha=float(params["alpha"]), random_state=random_state)
+    clf.classes_ = np.asarray(classes, dtype=object)
+    clf.coef_ = coef
+    clf.intercept_ = intercept
+    clf.n_features_in_ = coef.shape[1]
+    reduce_seconds = time.perf_counter() - t0
+
+    metrics: Dict[str, Any] = {
+        "accuracy": None,
+        "f1_macro": None,
+        "n_train": int(n_train),
+        "n_test": 0,
+        "n_classes": int(len(classes)),
+        "distributed": {
+            "shards": len(tasks),
+            "workers": workers,
+            "epochs": int(params["epochs"]),
+            "reduce": "weighted_parameter_average",
+            "n_features": int(coef.shape[1]),
+            "shard_rows": [s.n_train + s.n_holdout for s in shards],
+            "n_holdout": sum(s.n_holdout for s in shards),
+            "shard_read_seconds": [s.read_seconds for s in shards],
+            "shard_fit_seconds": [s.fit_seconds for s in shards],
+            "reduce_seconds": reduce_seconds,
+        },
+    }
+    eval_parts = [s for s in shards if len(s.y_eval)]
+    if eval_parts:
+        X_eval = sparse.vstack([s.X_eval for s in eval_parts]).tocsr()
+        y_eval = np.concatenate([s.y_eval for s in eval_parts])
+        y_pred = clf.predict(X_eval)
+        metrics["accuracy"] = float(accuracy_score(y_eval, y_pred))
+        metrics["f1_macro"] = float(f1_score(y_eval, y_pred, average="macro"))
+        metrics["n_test"] = int(len(y_eval))
+
+    pipeline = Pipeline(steps=[
+        ("preprocess", preprocessor),
+        ("clf", clf),
+    ])
+
+    model_info = {
+        "features": FEATURE_COLUMNS,
+        "target": TARGET_COLUMN,
+        "model_type": "sklearn Pipeline (Hashing + SGDClassifier, sharded training + parameter averaging)",
+        "algo": algo,
+        "params": params,
+    }
+    return TrainResult(pipeline=pipeline, metrics=metrics, model_info=model_info)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+import sklearn
+from scipy import sparse
+
+from src.common.keys import feature_cache_prefix
+from src.common.s3_io import exists, read_bytes, read_json
+from src.common.serialize import json_bytes
+from src.train.core import FeatureSet
+
+
+def feature_config_id(config: Dict[str, Any]) -> str:
+    # la versione di sklearn fa parte della chiave: il preprocessor pickled non è portabile tra versioni
+    payload = json.dumps({"config": config, "sklearn": sklearn.__version__}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _matrix_bytes(X: Any) -> bytes:
+    buf = io.BytesIO()
+    if sparse.issparse(X):
+        sparse.save_npz(buf, X.tocsr(), compressed=False)
+    else:
+        np.savez(buf, dense=np.asarray(X))
+    return buf.getvalue()
+
+
+def _matrix_from_bytes(data: bytes) -> Any:
+    with np.load(io.BytesIO(data), allow_pickle=False) as z:
+        if "dense" in z.files:
+            return z["dense"]
+    return sparse.load_npz(io.BytesIO(data))
+
+
+def _labels_bytes(features: FeatureSet) -> bytes:
+    arrays = {"y_train": np.asarray(features.y_train, dtype=str), "y_test": np.asarray(features.y_test, dtype=str)}
+    if features.sample_weight is not None:
+        arrays.update(sample_weight=features.sample_weight, train_inverse=features.train_inverse)
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def load_features(s3, bucket: str, content_id: str, config: Dict[str, Any]) -> Optional[FeatureSet]:
+    # content_id: sha256 di processed.csv (processed_content_id), stesso dataset = stessa entry
+    prefix = feature_cache_prefix(content_id, feature_config_id(config))
+    # manifest.json è scritto per ultimo: la sua presenza garantisce un'entry completa
+    if not exists(s3, bucket, f"{prefix}/manifest.json"):
+        return None
+
+    entry = read_json(s3, bucket, f"{prefix}/manifest.json")
+    preprocessor = joblib.load(io.BytesIO(read_bytes(s3, bucket, f"{prefix}/preprocessor.joblib")))
+    with np.load(io.BytesIO(read_bytes(s3, bucket, f"{prefix}/labels.npz")), allow_pickle=False) as z:
+        y_train = z["y_train"].astype(object)
+        y_test = z["y_test"].astype(object)
+        sample_weight = z["sample_weight"] if "sample_weight" in z.files else None
+        train_inverse = z["train_inverse"] if "train_inverse" in z.files else None
+
+    return FeatureSet(
+        preprocessor=preprocessor,
+        X_train=_matrix_from_bytes(read_bytes(s3, bucket, f"{prefix}/X_train.npz")),
+        X_test=_matrix_from_bytes(read_bytes(s3, bucket, f"{prefix}/X_test.npz")),
+        y_train=y_train,
+        y_test=y_test,
+        n_classes=int(entry["n_classes"]),
+        config=entry["config"],
+        sample_weight=sample_weight,
+        train_inverse=train_inverse,
+    )
+
+
+def save_features(s3, bucket: str, content_id: str, features: FeatureSet) -> str:
+    prefix = feature_cache_prefix(content_id, feature_config_id(features.config))
+
+    buf = io.BytesIO()
+    joblib.dump(features.preprocessor, buf)
+
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/preprocessor.joblib", Body=buf.getvalue(), ContentType="application/octet-stream")
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/X_train.npz", Body=_matrix_bytes(features.X_train), ContentType="application/octet-stream")
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/X_test.npz", Body=_matrix_bytes(features.X_test), ContentType="application/octet-stream")
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/labels.npz",
+        Body=_labels_bytes(features),
+        ContentType="application/octet-stream",
+    )
+
+    entry = {
+        "processed_content_id": content_id,
+        "config": features.config,
+        "sklearn_version": sklearn.__version__,
+        "n_classes": int(features.n_classes),
+        "n_train": features.n_train_rows,
+        "dedup": features.dedup_stats(),
+        "n_test": int(features.X_test.shape[0]),
+        "n_features": int(features.X_train.shape[1]),
+    }
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/manifest.json", Body=json_bytes(entry), ContentType="application/json")
+    return prefix
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import itertools
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from botocore.exceptions import ClientError
 
 from src.common.keys import job_manifest_key
 
+SWEEP_METRICS = ("f1_macro", "accuracy")
+
 
 def load_manifest_for_job(s3, bucket: str, job_id: str) -> Dict[str, Any]:
     key = job_manifest_key(job_id)
@@ -20,6 +23,67 @@ def load_manifest_for_job(s3, bucket: str, job_id: str) -> Dict[str, Any]:
         raise
 
 
+def _expand_grid(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # {"algorithm": "logreg", "params": {"C": [0.5, 1], "max_iter": 500}} -> 2 candidati
+    algo = (entry.get("algorithm") or entry.get("algo") or "logreg").lower()
+    params = entry.get("params") or {}
+    names = sorted(params)
+    values = [v if isinstance(v, list) else [v] for v in (params[n] for n in names)]
+    return [{"algo": algo, "params": dict(zip(names, combo))} for combo in itertools.product(*values)]
+
+
+def normalize_sweep(raw: Dict[str, Any] | None) -> Optional[Dict[str, Any]]:
+    """
+    Sweep di iperparametri:
+      {"candidates": [{"algorithm": ..., "params": {...}}, ...],
+       "grid": [{"algorithm": ..., "params": {"C": [0.5, 1, 2]}}],
+       "metric": "f1_macro", "workers": 4}
+    """
+    if not raw:
+        return None
+
+    candidates = []
+    for c in raw.get("candidates") or []:
+        candidates.append({"algo": (c.get("algorithm") or c.get("algo") or "logreg").lower(), "params": c.get("params") or {}})
+    for entry in raw.get("grid") or []:
+        candidates.extend(_expand_grid(entry))
+    if not candidates:
+        raise ValueError("Sweep manifest without candidates: provide 'candidates' and/or 'grid'.")
+
+    metric = (raw.get("metric") or "f1_macro").lower()
+    if metric not in SWEEP_METRICS:
+        raise ValueError(f"Unsupported sweep metric '{metric}'. Allowed: {', '.join(SWEEP_METRICS)}")
+
+    workers = raw.get("workers")
+    return {
+        "candidates": candidates,
+        "metric": metric,
+        "workers": int(workers) if workers is not None else None,
+    }
+
+
+def normalize_cv(raw: Any) -> Optional[Dict[str, Any]]:
+    """
+    Cross-validation k-fold: 5 oppure {"folds": 5, "workers": 4}.
+    """
+    if not raw:
+        return None
+    if isinstance(raw, bool):
+        raw = {}
+    elif not isinstance(raw, dict):
+        raw = {"folds": raw}
+
+    folds = int(raw.get("folds", 5))
+    if folds < 2:
+        raise ValueError(f"Cross-validation requires at least 2 folds, got {folds}.")
+
+    workers = raw.get("workers")
+    return {
+        "folds": folds,
+        "workers": int(workers) if workers is not None else None,
+    }
+
+
 def normalize_manifest(raw: Dict[str, Any] | None) -> Dict[str, Any]:
     raw = raw or {}
 
@@ -32,16 +96,24 @@ def normalize_manifest(raw: Dict[str, Any] | None) -> Dict[str, Any]:
             "schema_version": 1,
             "algo": algo,
             "params": params,
+            "features": train.get("features") or {},
+            "sweep": normalize_sweep(train.get("sweep")),
+            "cv": normalize_cv(train.get("cv")),
+            "warm_start": bool(train.get("warm_start", False)),
             "job": job,
             "raw": raw,
         }
 
-    algo = (raw.get("algo") or "logreg").lower()
+    algo = (raw.get("algo") or raw.get("algorithm") or "logreg").lower()
     params = raw.get("params") or {}
     return {
         "schema_version": 0,
         "algo": algo,
         "params": params,
+        "features": raw.get("features") or {},
+        "sweep": normalize_sweep(raw.get("sweep")),
+        "cv": normalize_cv(raw.get("cv")),
+        "warm_start": bool(raw.get("warm_start", False)),
         "job": {},
         "raw": raw,
     }
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import sklearn
+
+from src.common.keys import inference_bundle_key_for_model_key, model_cache_prefix
+from src.common.s3_io import exists, read_json
+from src.common.serialize import json_bytes
+from src.train.algorithms import canonical_name
+from src.train.checkpoint import fit_schedule
+from src.train.core import feature_config
+
+# File copiati tra version prefix e cache (entry.json è scritto per ultimo)
+_CACHED_FILES = ("pipeline.joblib", "metrics.json", "model_info.json")
+
+
+def _source_version() -> str:
+    # hash dei sorgenti che determinano il modello: cambia a ogni deploy che tocca il training
+    root = Path(__file__).resolve().parents[1]
+    h = hashlib.sha256()
+    for path in sorted(list(root.glob("train/*.py")) + list(root.glob("common/*.py"))):
+        h.update(path.relative_to(root).as_posix().encode("utf-8"))
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+# Versione del codice di training nella chiave (default: hash dei sorgenti di src/train e src/common)
+TRAIN_CODE_VERSION = os.environ.get("TRAIN_CODE_VERSION") or _source_version()
+
+
+@dataclass(frozen=True)
+class CachedModel:
+    cache_key: str
+    prefix: str
+    entry: Dict[str, Any]
+
+
+def model_cache_key(content_id: str, manifest: Dict[str, Any]) -> str:
+    """Hash di dataset processato + algoritmo + parametri + schedule del fit + feature config + versione del codice."""
+    algo = (manifest.get("algo") or "logreg").lower()
+    payload = json.dumps(
+        {
+            "processed_content_id": content_id,
+            "algo": canonical_name(algo) or algo,
+            "params": manifest.get("params") or {},
+            "fit_schedule": fit_schedule(algo, manifest.get("params") or {}),
+            "features": feature_config(manifest),
+            "cv": manifest.get("cv"),
+            "code_version": TRAIN_CODE_VERSION,
+            "sklearn": sklearn.__version__,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def load_cached_model(s3, bucket: str, cache_key: str) -> Optional[CachedModel]:
+    prefix = model_cache_prefix(cache_key)
+    if not exists(s3, bucket, f"{prefix}/entry.json"):
+        return None
+    return CachedModel(cache_key=cache_key, prefix=prefix, entry=read_json(s3, bucket, f"{prefix}/entry.json"))
+
+
+def _copy(s3, bucket: str, src: str, dst: str) -> str:
+    resp = s3.copy_object(Bucket=bucket, Key=dst, CopySource={"Bucket": bucket, "Key": src})
+    return resp.get("CopyObjectResult", {}).get("ETag", "")
+
+
+def save_cached_model(
+    s3,
+    bucket: str,
+    cache_key: str,
+    v_prefix: str,
+    model_etag: str,
+    bundle_key: Optional[str],
+    run_id: str,
+) -> str:
+    """Copia server-side degli artifact appena scritti in v_prefix; entry.json per ultimo."""
+    prefix = model_cache_prefix(cache_key)
+    for name in _CACHED_FILES:
+        _copy(s3, bucket, f"{v_prefix}/{name}", f"{prefix}/{name}")
+    if bundle_key:
+        _copy(s3, bucket, bundle_key, inference_bundle_key_for_model_key(f"{prefix}/pipeline.joblib"))
+
+    entry = {
+        "cache_key": cache_key,
+        "source_run_id": run_id,
+        "source_version_prefix": v_prefix,
+        "model_etag": model_etag,
+        "has_inference_bundle": bool(bundle_key),
+        "code_version": TRAIN_CODE_VERSION,
+        "sklearn_version": sklearn.__version__,
+    }
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/entry.json", Body=json_bytes(entry), ContentType="application/json")
+    return prefix
+
+
+def restore_cached_model(s3, bucket: str, cached: CachedModel, v_prefix: str) -> Dict[str, Any]:
+    """
+    Copia server-side pipeline.joblib (+ bundle) nel version prefix; ritorna metrics/model_info
+    della run originale e la chiave del bundle. Il bundle è copiato solo se pipeline.joblib
+    conserva l'ETag a cui è legato, altrimenti l'inferenza userà pipeline.joblib.
+    """
+    v_model_key = f"{v_prefix}/pipeline.joblib"
+    model_etag = _copy(s3, bucket, f"{cached.prefix}/pipeline.joblib", v_model_key)
+
+    v_bundle_key: Optional[str] = inference_bundle_key_for_model_key(v_model_key)
+    if cached.entry.get("has_inference_bundle") and model_etag == cached.entry.get("model_etag"):
+        _copy(s3, bucket, inference_bundle_key_for_model_key(f"{cached.prefix}/pipeline.joblib"), v_bundle_key)
+    else:
+        s3.delete_object(Bucket=bucket, Key=v_bundle_key)
+        v_bundle_key = None
+
+    return {
+        "metrics": read_json(s3, bucket, f"{cached.prefix}/metrics.json"),
+        "model_info": read_json(s3, bucket, f"{cached.prefix}/model_info.json"),
+        "bundle_key": v_bundle_key,
+    }
@@ -1,175 +1,626 @@
 from __future__ import annotations
 
-import io
+import os
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import joblib
 import pandas as pd
 
+from src.common.config import TARGET_COLUMN
 from src.common.job_status import write_job_status
 from src.common.keys import (
     default_pointer_key,
+    inference_bundle_key_for_model_key,
     marker_key_for_job,
     marker_key_for_producer,
     parse_context_from_processed_key,
+    sweep_candidate_prefix,
     version_prefix_for_job,
     version_prefix_for_producer,
 )
+from src.common.processed_io import (
+    iter_processed_chunks,
+    load_processed_classes,
+    load_processed_dataframe,
+    processed_content_id,
+)
 from src.common.s3_io import exists, safe_etag
 from src.common.serialize import json_bytes
-from src.train.core import train_model
+from src.train.bundle import export_inference_bundle
+from src.train.compact import build_artifact
+from src.train.checkpoint import (
+    TrainingDeadline,
+    delete_checkpoint,
+    fit_segmented,
+    load_checkpoint,
+    save_checkpoint,
+)
+from src.train.core import (
+    FeatureSet,
+    TrainResult,
+    _to_result,
+    dedup_skipped,
+    feature_config,
+    featurize,
+    train_candidates,
+)
+from src.train.cv import candidate_cv, cross_validate
+from src.train.distributed import is_distributed_algo, train_distributed
+from src.train.feature_cache import feature_config_id, load_features, save_features
 from src.train.manifest import load_manifest_for_job, normalize_manifest
+from src.train.model_cache import CachedModel, load_cached_model, model_cache_key, restore_cached_model, save_cached_model
+from src.train.streaming import is_streaming_algo, streaming_params, train_streaming
+from src.train.warm_start import (
+    classes_changed,
+    drift_exceeded,
+    incompatibility,
+    load_warm_start_base,
+    measure_drift,
+    train_warm,
+)
 
+# Cache di preprocessor fittato + matrici train/test, keyed su processed ETag + config di vettorizzazione
+TRAIN_FEATURE_CACHE = os.environ.get("TRAIN_FEATURE_CACHE", "1") == "1"
 
-def run_training(s3, bucket: str, processed_key: str) -> Dict[str, Any]:
-    ctx = parse_context_from_processed_key(processed_key)
-    mode = ctx["mode"]
-    job_id = ctx["job_id"]
+# Producer: riparte dal modello di default.json invece che da zero (job: manifest "warm_start")
+TRAIN_WARM_START = os.environ.get("TRAIN_WARM_START", "0") == "1"
 
-    if mode == "job" and job_id:
-        write_job_status(
-            s3=s3,
-            bucket=bucket,
-            job_id=job_id,
-            stage="TRAINING",
-            state="RUNNING",
-            message="Training started",
-            artifacts={"processed_key": processed_key},
+# Cache dei modelli tra job: stesso dataset processato + manifest + codice -> artifact copiati, niente fit
+TRAIN_MODEL_CACHE = os.environ.get("TRAIN_MODEL_CACHE", "1") == "1"
+
+
+def _write_candidates(
+    s3,
+    bucket: str,
+    v_prefix: str,
+    results: List[TrainResult],
+    common: Dict[str, Any],
+    metric: str,
+) -> List[Dict[str, Any]]:
+    """Un artifact set per candidato + leaderboard ordinata per metric (desc)."""
+    leaderboard = []
+    for i, result in enumerate(results):
+        candidate_id = f"{i:02d}-{result.model_info['algo']}"
+        c_prefix = sweep_candidate_prefix(v_prefix, candidate_id)
+
+        c_metrics = dict(result.metrics)
+        c_metrics.update(common)
+        c_metrics["candidate_id"] = candidate_id
+        c_info = dict(result.model_info)
+        c_info["candidate_id"] = candidate_id
+
+        c_artifact = build_artifact(result.pipeline)
+        c_metrics["artifact"] = c_artifact.stats
+        s3.put_object(Bucket=bucket, Key=f"{c_prefix}/pipeline.joblib", Body=c_artifact.data, ContentType="application/octet-stream")
+        s3.put_object(Bucket=bucket, Key=f"{c_prefix}/metrics.json", Body=json_bytes(c_metrics), ContentType="application/json")
+        s3.put_object(Bucket=bucket, Key=f"{c_prefix}/model_info.json", Body=json_bytes(c_info), ContentType="application/json")
+
+        leaderboard.append(
+            {
+                "candidate_id": candidate_id,
+                "algo": result.model_info["algo"],
+                "params": result.model_info["params"],
+                "accuracy": result.metrics["accuracy"],
+                "f1_macro": result.metrics["f1_macro"],
+                "fit_seconds": result.metrics.get("fit_seconds"),
+                "model_key": f"{c_prefix}/pipeline.joblib",
+            }
         )
+        if "cv" in result.metrics:
+            leaderboard[-1]["cv_accuracy_mean"] = result.metrics["cv"]["accuracy_mean"]
+            leaderboard[-1]["cv_f1_macro_mean"] = result.metrics["cv"]["f1_macro_mean"]
 
-    head = s3.head_object(Bucket=bucket, Key=processed_key)
-    processed_etag = safe_etag(head.get("ETag", "")) or "no-etag"
+    # con la CV l'ordinamento usa la media sui fold
+    rank_key = f"cv_{metric}_mean" if leaderboard and f"cv_{metric}_mean" in leaderboard[0] else metric
+    leaderboard.sort(key=lambda row: row[rank_key], reverse=True)
+    for rank, row in enumerate(leaderboard, start=1):
+        row["rank"] = rank
+    return leaderboard
 
-    if mode == "job" and job_id:
-        marker_key = marker_key_for_job(job_id, processed_etag)
-    else:
-        marker_key = marker_key_for_producer(processed_etag)
 
-    # idempotenza
-    if exists(s3, bucket, marker_key):
+def _load_features(
+    s3,
+    bucket: str,
+    processed_key: str,
+    content_id: str,
+    manifest: Dict[str, Any],
+    loaded: Optional[Tuple[pd.DataFrame, str]] = None,
+) -> Tuple[FeatureSet, str, Dict[str, Any]]:
+    """Ritorna (features, formato sorgente, info feature cache)."""
+    config = feature_config(manifest)
+    features = load_features(s3, bucket, content_id, config) if TRAIN_FEATURE_CACHE else None
+    cache_info = {"enabled": TRAIN_FEATURE_CACHE, "hit": features is not None, "config_id": feature_config_id(config)}
+    if features is not None:
+        return features, "feature_cache", cache_info
+
+    # read processed dataset (parquet se disponibile, altrimenti processed.csv)
+    df, processed_format = loaded or load_processed_dataframe(s3, bucket, processed_key)
+    features = featurize(df, config)
+    del df
+    if TRAIN_FEATURE_CACHE:
+        save_features(s3, bucket, content_id, features)
+    return features, processed_format, cache_info
+
+
+def _try_warm_start(
+    s3,
+    bucket: str,
+    processed_key: str,
+    manifest: Dict[str, Any],
+) -> Tuple[Optional[TrainResult], Dict[str, Any], Optional[Tuple[pd.DataFrame, str]]]:
+    """
+    Warm start dal modello di default.json. Ritorna (result | None, info, dataset già letto):
+    con result None si procede con un cold start, riusando il dataset se è già stato letto.
+    """
+    base = load_warm_start_base(s3, bucket)
+    if base is None:
+        return None, {"used": False, "reason": "no_default_model"}, None
+
+    info: Dict[str, Any] = {"base_model_key": base.model_key, "base_run_id": base.run_id}
+    config = feature_config(manifest)
+    reason = incompatibility(base, manifest["algo"], config)
+    if reason:
+        return None, {"used": False, "reason": reason, **info}, None
+
+    loaded = load_processed_dataframe(s3, bucket, processed_key)
+    if classes_changed(base, loaded[0][TARGET_COLUMN]):
+        return None, {"used": False, "reason": "classes_changed", **info}, loaded
+
+    info["drift"] = measure_drift(base, loaded[0])
+    reason = drift_exceeded(info["drift"])
+    if reason:
+        return None, {"used": False, "reason": reason, **info}, loaded
+
+    features = featurize(loaded[0], config, preprocessor=base.pipeline.named_steps["preprocess"])
+    result, warm_info = train_warm(base, features, manifest)
+    return result, {"used": True, "processed_format": loaded[1], "drift": info["drift"], **warm_info}, None
+
+
+@dataclass(frozen=True)
+class _Run:
+    """Identità di una run di training (run_id, version prefix, marker di idempotenza)."""
+    mode: str
+    job_id: Optional[str]
+    run_id: str
+    timestamp_utc: str
+    processed_key: str
+    processed_etag: str
+    # sha256 del contenuto (ETag per i dataset senza metadata): chiave di feature cache e model cache
+    content_id: str
+    version_prefix: str
+    marker_key: str
+
+    @property
+    def is_job(self) -> bool:
+        return self.mode == "job" and bool(self.job_id)
+
+    def fields(self) -> Dict[str, Any]:
+        return {
+            "timestamp_utc": self.timestamp_utc,
+            "processed_key": self.processed_key,
+            "processed_etag": self.processed_etag,
+            "processed_content_id": self.content_id,
+            "run_id": self.run_id,
+            "version_prefix": self.version_prefix,
+            "mode": self.mode,
+            "job_id": self.job_id,
+        }
+
+
+@dataclass(frozen=True)
+class _Trained:
+    """Esito del training prima della scrittura degli artifact (result None = checkpoint scritto)."""
+    result: Optional[TrainResult]
+    processed_format: Optional[str] = None
+    feature_cache: Optional[Dict[str, Any]] = None
+    warm_start: Optional[Dict[str, Any]] = None
+    cv: Optional[Dict[str, Any]] = None
+    sweep: Optional[Dict[str, Any]] = None
+    candidates: Optional[List[TrainResult]] = None
+
+
+def _new_run(
+    mode: str,
+    job_id: Optional[str],
+    processed_key: str,
+    processed_etag: str,
+    content_id: str,
+    marker_key: str,
+    continuation: Optional[Dict[str, Any]],
+) -> _Run:
+    if continuation:
+        # continuazione dopo un checkpoint: stessa identità di run (run_id, version prefix, timestamp)
+        run_id = continuation["run_id"]
+        now_iso = continuation["timestamp_utc"]
+    else:
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
         if mode == "job" and job_id:
-            v_prefix = version_prefix_for_job(job_id)
-            v_model_key = f"{v_prefix}/pipeline.joblib"
-            v_metrics_key = f"{v_prefix}/metrics.json"
-            v_info_key = f"{v_prefix}/model_info.json"
+            run_id = f"{now.strftime('%Y%m%dT%H%M%SZ')}-{processed_etag[:12]}"
+        else:
+            run_id = f"{now.strftime('%Y%m%d-%H%M')}-pricerunner-producer-{processed_etag[:6]}"
+    v_prefix = version_prefix_for_job(job_id) if (mode == "job" and job_id) else version_prefix_for_producer(run_id)
+    return _Run(mode, job_id, run_id, now_iso, processed_key, processed_etag, content_id, v_prefix, marker_key)
 
-            write_job_status(
-                s3=s3,
-                bucket=bucket,
-                job_id=job_id,
-                stage="DONE",
-                state="SUCCEEDED",
-                message="Training skipped (already trained for this dataset)",
-                artifacts={
-                    "processed_key": processed_key,
-                    "model_key": v_model_key,
-                    "metrics_key": v_metrics_key,
-                    "model_info_key": v_info_key,
-                    "skipped": True,
-                    "processed_etag": processed_etag,
-                    "reason": "already_trained_for_processed_etag",
-                },
-            )
 
-            return {
-                "ok": True,
-                "skipped": True,
-                "reason": "already_trained_for_processed_etag",
-                "mode": mode,
-                "job_id": job_id,
+def _already_trained(
+    s3,
+    bucket: str,
+    mode: str,
+    job_id: Optional[str],
+    processed_key: str,
+    processed_etag: str,
+) -> Dict[str, Any]:
+    if mode == "job" and job_id:
+        v_prefix = version_prefix_for_job(job_id)
+        v_model_key = f"{v_prefix}/pipeline.joblib"
+        v_metrics_key = f"{v_prefix}/metrics.json"
+        v_info_key = f"{v_prefix}/model_info.json"
+
+        write_job_status(
+            s3=s3,
+            bucket=bucket,
+            job_id=job_id,
+            stage="DONE",
+            state="SUCCEEDED",
+            message="Training skipped (already trained for this dataset)",
+            artifacts={
                 "processed_key": processed_key,
+                "model_key": v_model_key,
+                "metrics_key": v_metrics_key,
+                "model_info_key": v_info_key,
+                "skipped": True,
                 "processed_etag": processed_etag,
-                "version_prefix": v_prefix,
-                "versioned_model_key": v_model_key,
-            }
+                "reason": "already_trained_for_processed_etag",
+            },
+        )
 
         return {
             "ok": True,
             "skipped": True,
             "reason": "already_trained_for_processed_etag",
             "mode": mode,
-            "job_id": None,
+            "job_id": job_id,
             "processed_key": processed_key,
             "processed_etag": processed_etag,
-            "default_pointer_key": default_pointer_key(),
+            "version_prefix": v_prefix,
+            "versioned_model_key": v_model_key,
         }
 
-    # read processed.csv
-    processed_bytes = s3.get_object(Bucket=bucket, Key=processed_key)["Body"].read()
-    df = pd.read_csv(io.BytesIO(processed_bytes), dtype=str)
+    return {
+        "ok": True,
+        "skipped": True,
+        "reason": "already_trained_for_processed_etag",
+        "mode": mode,
+        "job_id": None,
+        "processed_key": processed_key,
+        "processed_etag": processed_etag,
+        "default_pointer_key": default_pointer_key(),
+    }
+
 
-    manifest_raw = load_manifest_for_job(s3, bucket, job_id) if (mode == "job" and job_id) else {}
-    manifest = normalize_manifest(manifest_raw)
+def _train_segmented(
+    s3,
+    bucket: str,
+    features: FeatureSet,
+    manifest: Dict[str, Any],
+    deadline: Optional[TrainingDeadline],
+    run: _Run,
+    resume: bool,
+) -> Optional[TrainResult]:
+    """
+    Fit a segmenti, con o senza deadline (stesso schedule: run locali e su Lambda producono lo
+    stesso modello). None = checkpoint scritto, il training va continuato in una nuova invocazione.
+    """
+    algo = manifest["algo"]
+    params = manifest.get("params") or {}
+    run_meta = {
+        "run_id": run.run_id,
+        "timestamp_utc": run.timestamp_utc,
+        "processed_key": run.processed_key,
+        "processed_etag": run.processed_etag,
+    }
 
-    result = train_model(df, manifest=manifest)
+    state = None
+    if resume:
+        loaded = load_checkpoint(s3, bucket, run.version_prefix)
+        # checkpoint di un altro run o di un altro dataset: si riparte da zero
+        if loaded and all(loaded[1].get(k) == run_meta[k] for k in ("run_id", "processed_etag")):
+            state = loaded[0]
 
-    now = datetime.now(timezone.utc)
-    now_iso = now.isoformat()
+    def on_checkpoint(fit_state) -> None:
+        checkpoint_key = save_checkpoint(s3, bucket, run.version_prefix, fit_state, run_meta)
+        if run.mode == "job" and run.job_id:
+            write_job_status(
+                s3=s3,
+                bucket=bucket,
+                job_id=run.job_id,
+                stage="TRAINING",
+                state="RUNNING",
+                message=f"Training checkpointed after segment {fit_state.segment}, continuing",
+                artifacts={"processed_key": run.processed_key, "checkpoint_key": checkpoint_key},
+            )
 
-    if mode == "job" and job_id:
-        run_id = f"{now.strftime('%Y%m%dT%H%M%SZ')}-{processed_etag[:12]}"
-        v_prefix = version_prefix_for_job(job_id)
+    fitted = fit_segmented(features, algo, params, deadline, state=state, on_checkpoint=on_checkpoint)
+    if fitted is None:
+        return None
+    return _to_result(features, fitted, algo, params)
+
+
+def _train_sweep(
+    features: FeatureSet, sweep: Dict[str, Any], cv_result: Optional[Dict[str, Any]]
+) -> Tuple[TrainResult, List[TrainResult]]:
+    """Una sola vettorizzazione, N candidati fittati in parallelo. Ritorna (migliore, candidati in ordine)."""
+    results = train_candidates(features, sweep["candidates"], workers=sweep["workers"])
+    if cv_result:
+        # con la CV vince la media sui fold, non il solo split di holdout
+        for i, r in enumerate(results):
+            r.metrics["cv"] = candidate_cv(cv_result, i)
+        best = max(results, key=lambda r: r.metrics["cv"][f"{sweep['metric']}_mean"])
     else:
-        run_id = f"{now.strftime('%Y%m%d-%H%M')}-pricerunner-producer-{processed_etag[:6]}"
-        v_prefix = version_prefix_for_producer(run_id)
+        best = max(results, key=lambda r: r.metrics[sweep["metric"]])
+    return best, results
+
+
+def _cross_validate(
+    s3,
+    bucket: str,
+    run: _Run,
+    manifest: Dict[str, Any],
+    sweep: Optional[Dict[str, Any]],
+    continuation: Optional[Dict[str, Any]],
+    loaded: Optional[Tuple[pd.DataFrame, str]],
+) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[pd.DataFrame, str]]]:
+    """Ritorna (risultato CV | None, dataset letto se è servito)."""
+    cv = manifest.get("cv")
+    if not cv:
+        return None, loaded
+    if continuation:
+        # già calcolata alla prima invocazione, viaggia con la continuazione
+        return continuation.get("cv"), loaded
+
+    # k-fold solo per la valutazione: il modello finale resta quello dello split train/test
+    loaded = loaded or load_processed_dataframe(s3, bucket, run.processed_key)
+    cv_candidates = sweep["candidates"] if sweep else [{"algo": manifest["algo"], "params": manifest["params"]}]
+    cv_result = cross_validate(loaded[0], feature_config(manifest), cv_candidates, cv["folds"], workers=cv["workers"])
+    return cv_result, loaded
+
+
+def _train_streaming(s3, bucket: str, run: _Run, manifest: Dict[str, Any], warm_requested: bool) -> _Trained:
+    # out-of-core: il dataset non viene mai caricato per intero
+    chunk_rows = int(streaming_params(manifest.get("params"))["chunk_rows"])
+    result = train_streaming(
+        lambda: iter_processed_chunks(s3, bucket, run.processed_key, chunk_rows),
+        load_processed_classes(s3, bucket, run.processed_key),
+        manifest=manifest,
+    )
+    warm_start_info = {"used": False, "reason": "streaming"} if warm_requested else None
+    return _Trained(result=result, processed_format="stream", warm_start=warm_start_info)
+
+
+def _train_distributed(
+    s3,
+    bucket: str,
+    run: _Run,
+    manifest: Dict[str, Any],
+    warm_requested: bool,
+    client_factory: Optional[Callable[[], Any]],
+) -> _Trained:
+    # shard per byte range di processed.csv, un worker per shard, reduce per media dei parametri
+    result = train_distributed(
+        s3,
+        bucket,
+        run.processed_key,
+        load_processed_classes(s3, bucket, run.processed_key),
+        manifest=manifest,
+        client_factory=client_factory,
+    )
+    warm_start_info = {"used": False, "reason": "distributed"} if warm_requested else None
+    return _Trained(result=result, processed_format="csv_ranges", warm_start=warm_start_info)
+
+
+def _train_in_memory(
+    s3,
+    bucket: str,
+    run: _Run,
+    manifest: Dict[str, Any],
+    warm_requested: bool,
+    deadline: Optional[TrainingDeadline],
+    continuation: Optional[Dict[str, Any]],
+) -> _Trained:
+    """Warm start, sweep (solo job) o modello singolo a segmenti, con CV opzionale."""
+    sweep = manifest.get("sweep") if run.is_job else None
 
+    loaded, warm_start_info = None, None
+    if warm_requested and sweep:
+        warm_start_info = {"used": False, "reason": "sweep"}
+    elif warm_requested:
+        result, warm_start_info, loaded = _try_warm_start(s3, bucket, run.processed_key, manifest)
+        if result is not None:
+            # vocabolario del modello base: le matrici non sono quelle della feature cache
+            return _Trained(result=result, processed_format=warm_start_info.pop("processed_format"), warm_start=warm_start_info)
+
+    cv_result, loaded = _cross_validate(s3, bucket, run, manifest, sweep, continuation, loaded)
+    features, processed_format, feature_cache_info = _load_features(
+        s3, bucket, run.processed_key, run.content_id, manifest, loaded
+    )
+    del loaded
+
+    if sweep:
+        best, results = _train_sweep(features, sweep, cv_result)
+        return _Trained(
+            result=best,
+            processed_format=processed_format,
+            feature_cache=feature_cache_info,
+            warm_start=warm_start_info,
+            cv=cv_result,
+            sweep=sweep,
+            candidates=results,
+        )
+
+    result = _train_segmented(s3, bucket, features, manifest, deadline, run, resume=bool(continuation))
+    return _Trained(
+        result=result,
+        processed_format=processed_format,
+        feature_cache=feature_cache_info,
+        warm_start=warm_start_info,
+        cv=cv_result,
+    )
+
+
+def _cache_bypass_reason(manifest: Dict[str, Any], mode: str, warm_requested: bool) -> Optional[str]:
+    # il modello non dipende solo da dataset + manifest: sweep (N artifact), warm start (default.json),
+    # distribuito (shard/worker dipendono dalle CPU)
+    if mode == "job" and manifest.get("sweep"):
+        return "sweep"
+    if warm_requested:
+        return "warm_start"
+    if is_distributed_algo(manifest.get("algo")):
+        return "distributed"
+    return None
+
+
+def _publish_cached(s3, bucket: str, cached: CachedModel, manifest: Dict[str, Any], run: _Run) -> None:
+    """Cache hit: artifact della run originale nel version prefix, metrics/model_info con l'identità di questa run."""
+    restored = restore_cached_model(s3, bucket, cached, run.version_prefix)
+    cache_info = {"hit": True, "cache_key": cached.cache_key, "source_run_id": cached.entry.get("source_run_id")}
+
+    metrics = restored["metrics"]
+    metrics.update(run.fields())
+    metrics.update({"input_bucket": bucket, "input_key": run.processed_key, "model_cache": cache_info})
+    metrics.pop("processed_key", None)
+    for key in ("feature_cache", "continuations"):
+        metrics.pop(key, None)
+
+    model_info = restored["model_info"]
+    model_info.update(run.fields())
+    model_info["model_cache"] = cache_info
+    model_info["inference_bundle_key"] = restored["bundle_key"]
+    if run.is_job:
+        model_info["manifest_schema_version"] = manifest.get("schema_version", 0)
+        model_info["manifest_raw"] = manifest.get("raw", {})
+
+    s3.put_object(Bucket=bucket, Key=f"{run.version_prefix}/metrics.json", Body=json_bytes(metrics), ContentType="application/json")
+    s3.put_object(Bucket=bucket, Key=f"{run.version_prefix}/model_info.json", Body=json_bytes(model_info), ContentType="application/json")
+
+
+def _write_artifacts(
+    s3,
+    bucket: str,
+    run: _Run,
+    manifest: Dict[str, Any],
+    trained: _Trained,
+    continuation: Optional[Dict[str, Any]],
+    model_cache_info: Optional[Dict[str, Any]],
+) -> Tuple[str, Optional[str]]:
+    """pipeline.joblib (+ bundle), metrics.json, model_info.json e candidati dello sweep. Ritorna (ETag modello, chiave bundle)."""
+    result = trained.result
+    v_prefix = run.version_prefix
     v_model_key = f"{v_prefix}/pipeline.joblib"
-    v_metrics_key = f"{v_prefix}/metrics.json"
-    v_info_key = f"{v_prefix}/model_info.json"
 
     metrics = dict(result.metrics)
     metrics.update(
         {
-            "timestamp_utc": now_iso,
+            "timestamp_utc": run.timestamp_utc,
             "input_bucket": bucket,
-            "input_key": processed_key,
-            "processed_etag": processed_etag,
-            "run_id": run_id,
+            "input_key": run.processed_key,
+            "processed_etag": run.processed_etag,
+            "processed_content_id": run.content_id,
+            "processed_format": trained.processed_format,
+            "feature_cache": trained.feature_cache,
+            "warm_start": trained.warm_start,
+            "run_id": run.run_id,
             "version_prefix": v_prefix,
-            "mode": mode,
-            "job_id": job_id,
+            "mode": run.mode,
+            "job_id": run.job_id,
         }
     )
 
     model_info = dict(result.model_info)
-    model_info.update(
-        {
-            "timestamp_utc": now_iso,
-            "processed_key": processed_key,
-            "processed_etag": processed_etag,
-            "run_id": run_id,
-            "version_prefix": v_prefix,
-            "mode": mode,
-            "job_id": job_id,
-        }
-    )
+    model_info.update(run.fields())
 
-    if mode == "job" and job_id:
+    if run.is_job:
         model_info["manifest_schema_version"] = manifest.get("schema_version", 0)
         model_info["manifest_raw"] = manifest.get("raw", {})
         model_info["train_algo"] = manifest.get("algo")
         model_info["train_params"] = manifest.get("params")
 
-    # serialize model
-    buf = io.BytesIO()
-    joblib.dump(result.pipeline, buf)
-    model_bytes = buf.getvalue()
+    if trained.warm_start is not None:
+        model_info["warm_start"] = trained.warm_start
 
-    s3.put_object(Bucket=bucket, Key=v_model_key, Body=model_bytes, ContentType="application/octet-stream")
-    s3.put_object(Bucket=bucket, Key=v_metrics_key, Body=json_bytes(metrics), ContentType="application/json")
-    s3.put_object(Bucket=bucket, Key=v_info_key, Body=json_bytes(model_info), ContentType="application/json")
+    if continuation:
+        metrics["continuations"] = int(continuation.get("n", 0))
 
-    if mode == "job" and job_id:
+    if dedup_skipped(manifest):
+        metrics["dedup"] = {"used": False, "reason": "unweighted_fit"}
+
+    if model_cache_info is not None:
+        metrics["model_cache"] = model_cache_info
+
+    if trained.cv and not trained.sweep:
+        metrics["cv"] = candidate_cv(trained.cv, 0)
+
+    if trained.sweep:
+        # metrics.json della versione = leaderboard; pipeline.joblib = miglior candidato
+        common = {
+            "timestamp_utc": run.timestamp_utc,
+            "input_bucket": bucket,
+            "input_key": run.processed_key,
+            "processed_etag": run.processed_etag,
+            "run_id": run.run_id,
+            "version_prefix": v_prefix,
+            "mode": run.mode,
+            "job_id": run.job_id,
+        }
+        leaderboard = _write_candidates(s3, bucket, v_prefix, trained.candidates, common, trained.sweep["metric"])
+        metrics["sweep"] = {
+            "metric": trained.sweep["metric"],
+            "n_candidates": len(trained.candidates),
+            "best_candidate_id": leaderboard[0]["candidate_id"],
+            "ranked_by": "cv_mean" if trained.cv else "holdout",
+            "leaderboard": leaderboard,
+        }
+        model_info["sweep_best_candidate_id"] = leaderboard[0]["candidate_id"]
+
+    # serialize model (compattato: niente stato di solo training, float32, zlib)
+    artifact = build_artifact(result.pipeline)
+    metrics["artifact"] = artifact.stats
+
+    put = s3.put_object(Bucket=bucket, Key=v_model_key, Body=artifact.data, ContentType="application/octet-stream")
+
+    # bundle NumPy per l'inferenza senza sklearn (solo modelli lineari con predict_proba);
+    # legato all'ETag di pipeline.joblib, altrimenti si rimuove un eventuale bundle precedente
+    v_bundle_key = inference_bundle_key_for_model_key(v_model_key)
+    bundle = export_inference_bundle(artifact.pipeline, put.get("ETag", ""))
+    if bundle is not None:
+        s3.put_object(Bucket=bucket, Key=v_bundle_key, Body=bundle, ContentType="application/octet-stream")
+    else:
+        s3.delete_object(Bucket=bucket, Key=v_bundle_key)
+        v_bundle_key = None
+    model_info["inference_bundle_key"] = v_bundle_key
+    s3.put_object(Bucket=bucket, Key=f"{v_prefix}/metrics.json", Body=json_bytes(metrics), ContentType="application/json")
+    s3.put_object(Bucket=bucket, Key=f"{v_prefix}/model_info.json", Body=json_bytes(model_info), ContentType="application/json")
+    return put.get("ETag", ""), v_bundle_key
+
+
+def _complete_run(s3, bucket: str, run: _Run, message: str) -> Dict[str, Any]:
+    """Artifact già scritti nel version prefix: job status, puntatore default (producer) e marker di idempotenza."""
+    v_prefix = run.version_prefix
+    v_model_key = f"{v_prefix}/pipeline.joblib"
+    v_metrics_key = f"{v_prefix}/metrics.json"
+    v_info_key = f"{v_prefix}/model_info.json"
+
+    if run.is_job:
         write_job_status(
             s3=s3,
             bucket=bucket,
-            job_id=job_id,
+            job_id=run.job_id,
             stage="DONE",
             state="SUCCEEDED",
-            message="Training completed",
+            message=message,
             artifacts={
-                "processed_key": processed_key,
+                "processed_key": run.processed_key,
                 "model_key": v_model_key,
                 "metrics_key": v_metrics_key,
                 "model_info_key": v_info_key,
@@ -177,13 +628,13 @@ def run_training(s3, bucket: str, processed_key: str) -> Dict[str, Any]:
             },
         )
 
-    if mode == "producer":
+    if run.mode == "producer":
         default_pointer = {
             "schema_version": 1,
-            "run_id": run_id,
-            "timestamp_utc": now_iso,
-            "processed_key": processed_key,
-            "processed_etag": processed_etag,
+            "run_id": run.run_id,
+            "timestamp_utc": run.timestamp_utc,
+            "processed_key": run.processed_key,
+            "processed_etag": run.processed_etag,
             "model_key": v_model_key,
             "metrics_key": v_metrics_key,
             "model_info_key": v_info_key,
@@ -196,30 +647,129 @@ def run_training(s3, bucket: str, processed_key: str) -> Dict[str, Any]:
         )
 
     marker = {
-        "run_id": run_id,
-        "timestamp_utc": now_iso,
-        "processed_key": processed_key,
-        "processed_etag": processed_etag,
+        "run_id": run.run_id,
+        "timestamp_utc": run.timestamp_utc,
+        "processed_key": run.processed_key,
+        "processed_etag": run.processed_etag,
         "version_prefix": v_prefix,
-        "mode": mode,
-        "job_id": job_id,
+        "mode": run.mode,
+        "job_id": run.job_id,
     }
-    s3.put_object(Bucket=bucket, Key=marker_key, Body=json_bytes(marker), ContentType="application/json")
+    s3.put_object(Bucket=bucket, Key=run.marker_key, Body=json_bytes(marker), ContentType="application/json")
 
     return {
         "ok": True,
         "skipped": False,
-        "mode": mode,
-        "job_id": job_id,
-        "run_id": run_id,
-        "processed_key": processed_key,
-        "processed_etag": processed_etag,
+        "mode": run.mode,
+        "job_id": run.job_id,
+        "run_id": run.run_id,
+        "processed_key": run.processed_key,
+        "processed_etag": run.processed_etag,
         "version_prefix": v_prefix,
         "versioned_model_key": v_model_key,
-        "default_pointer_key": default_pointer_key() if mode == "producer" else None,
+        "default_pointer_key": default_pointer_key() if run.mode == "producer" else None,
+    }
+
+
+def _checkpointed(run: _Run, continuation: Optional[Dict[str, Any]], cv_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "ok": True,
+        "skipped": False,
+        "mode": run.mode,
+        "job_id": run.job_id,
+        "run_id": run.run_id,
+        "processed_key": run.processed_key,
+        "processed_etag": run.processed_etag,
+        "version_prefix": run.version_prefix,
+        "continuation": {
+            "run_id": run.run_id,
+            "timestamp_utc": run.timestamp_utc,
+            "n": int((continuation or {}).get("n", 0)) + 1,
+            "cv": cv_result,
+        },
     }
 
 
+def run_training(
+    s3,
+    bucket: str,
+    processed_key: str,
+    deadline: Optional[TrainingDeadline] = None,
+    continuation: Optional[Dict[str, Any]] = None,
+    client_factory: Optional[Callable[[], Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Con deadline (tempo residuo Lambda / TRAIN_TIME_BUDGET_SECONDS) il fit procede a segmenti:
+    se il tempo non basta, scrive un checkpoint e ritorna "continuation", da passare
+    all'invocazione successiva che riprende dallo stesso punto. client_factory crea i client
+    S3 dei worker del training distribuito (default s3_client_default).
+    """
+    ctx = parse_context_from_processed_key(processed_key)
+    mode = ctx["mode"]
+    job_id = ctx["job_id"]
+
+    if mode == "job" and job_id:
+        write_job_status(
+            s3=s3,
+            bucket=bucket,
+            job_id=job_id,
+            stage="TRAINING",
+            state="RUNNING",
+            message="Training started",
+            artifacts={"processed_key": processed_key},
+        )
+
+    head = s3.head_object(Bucket=bucket, Key=processed_key)
+    processed_etag = safe_etag(head.get("ETag", "")) or "no-etag"
+
+    if mode == "job" and job_id:
+        marker_key = marker_key_for_job(job_id, processed_etag)
+    else:
+        marker_key = marker_key_for_producer(processed_etag)
+
+    # idempotenza
+    if exists(s3, bucket, marker_key):
+        return _already_trained(s3, bucket, mode, job_id, processed_key, processed_etag)
+
+    manifest_raw = load_manifest_for_job(s3, bucket, job_id) if (mode == "job" and job_id) else {}
+    manifest = normalize_manifest(manifest_raw)
+
+    run = _new_run(mode, job_id, processed_key, processed_etag, processed_content_id(head), marker_key, continuation)
+    warm_requested = manifest.get("warm_start") if run.is_job else TRAIN_WARM_START
+
+    # cache content-addressed: un altro job (o run) ha già addestrato lo stesso modello
+    cache_key, cache_bypass = None, _cache_bypass_reason(manifest, mode, warm_requested)
+    if TRAIN_MODEL_CACHE and cache_bypass is None:
+        cache_key = model_cache_key(run.content_id, manifest)
+        cached = load_cached_model(s3, bucket, cache_key) if not continuation else None
+        if cached is not None:
+            _publish_cached(s3, bucket, cached, manifest, run)
+            out = _complete_run(s3, bucket, run, message="Training skipped (model cache hit)")
+            out["model_cache_hit"] = True
+            return out
+
+    if is_streaming_algo(manifest.get("algo")):
+        trained = _train_streaming(s3, bucket, run, manifest, warm_requested)
+    elif is_distributed_algo(manifest.get("algo")):
+        trained = _train_distributed(s3, bucket, run, manifest, warm_requested, client_factory)
+    else:
+        trained = _train_in_memory(s3, bucket, run, manifest, warm_requested, deadline, continuation)
+        if trained.result is None:
+            return _checkpointed(run, continuation, trained.cv)
+
+    model_cache_info = {"hit": False, "cache_key": cache_key, "bypass": cache_bypass} if TRAIN_MODEL_CACHE else None
+    model_etag, bundle_key = _write_artifacts(s3, bucket, run, manifest, trained, continuation, model_cache_info)
+    if cache_key:
+        save_cached_model(s3, bucket, cache_key, run.version_prefix, model_etag, bundle_key, run.run_id)
+
+    out = _complete_run(s3, bucket, run, message="Training completed")
+
+    if deadline is not None:
+        delete_checkpoint(s3, bucket, run.version_prefix)
+
+    return out
+
+
 def fail_job(s3, bucket: str, job_id: str, stage: str, exc: Exception) -> None:
     write_job_status(
         s3=s3,
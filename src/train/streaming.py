@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.pipeline import Pipeline
+
+from src.common.config import FEATURE_COLUMNS, TARGET_COLUMN
+from src.train.core import TrainResult
+
+STREAMING_ALGOS = ("sgd_streaming", "streaming_sgd", "sgd_ooc")
+
+DEFAULT_STREAMING_PARAMS: Dict[str, Any] = {
+    "chunk_rows": 50000,
+    "epochs": 1,
+    # coef_ denso: n_classi x n_features float64 (2**18 -> 2 MiB per classe)
+    "title_n_features": 2 ** 18,
+    "merchant_n_features": 2 ** 12,
+    "eval_fraction": 0.2,
+    "max_eval_rows": 100000,
+    "loss": "log_loss",
+    "alpha": 1e-5,
+}
+
+ChunkSource = Callable[[], Iterable[pd.DataFrame]]
+
+
+def is_streaming_algo(algo: str) -> bool:
+    return (algo or "").lower() in STREAMING_ALGOS
+
+
+def streaming_params(params: Dict[str, Any] | None) -> Dict[str, Any]:
+    out = dict(DEFAULT_STREAMING_PARAMS)
+    out.update({k: v for k, v in (params or {}).items() if k in DEFAULT_STREAMING_PARAMS})
+    return out
+
+
+def build_hashing_preprocessor(params: Dict[str, Any]) -> ColumnTransformer:
+    # featurizer stateless: nessun vocabolario da tenere in memoria, transform possibile chunk per chunk
+    return ColumnTransformer(
+        transformers=[
+            (
+                "title_hash",
+                HashingVectorizer(n_features=int(params["title_n_features"]), ngram_range=(1, 2), alternate_sign=False),
+                "Product Title",
+            ),
+            (
+                "merchant_hash",
+                HashingVectorizer(
+                    n_features=int(params["merchant_n_features"]),
+                    token_pattern=r"\S+",
+                    lowercase=False,
+                    alternate_sign=False,
+                    norm=None,
+                ),
+                "Merchant ID",
+            ),
+        ],
+        remainder="drop",
+        sparse_threshold=1.0,
+    )
+
+
+def clean_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    for col in FEATURE_COLUMNS + [TARGET_COLUMN]:
+        if col not in chunk.columns:
+            raise ValueError(f"Missing column '{col}' in processed dataset.")
+    out = chunk[FEATURE_COLUMNS + [TARGET_COLUMN]].astype(object)
+    # processed.csv letto con dtype=str: i titoli vuoti tornano NaN
+    return out.fillna("").astype(str)
+
+
+class StratifiedHoldout:
+    """
+    Holdout stratificato e deterministico su uno stream: per ogni classe una riga ogni
+    eval_every è esclusa dal training (rigiocato sullo stesso stream produce le stesse decisioni,
+    epoche successive comprese). Delle righe escluse si tiene un reservoir per classe, quindi un
+    campione uniforme su tutto lo stream e non solo sui primi chunk; sample() lo riporta alle
+    proporzioni delle classi, al più max_eval_rows righe. In memoria restano solo le feature raw.
+    """
+
+    def __init__(self, classes: List[str], eval_fraction: float, max_eval_rows: int, random_state: int = 42):
+        self.class_index = pd.Index(classes)
+        self.eval_every = max(2, int(round(1.0 / eval_fraction))) if eval_fraction > 0 else 0
+        self.capacity = max(1, int(max_eval_rows) // max(1, len(classes)))
+        self.rng = np.random.default_rng(random_state)
+        self.held_out = np.zeros(len(self.class_index), dtype=np.int64)
+        self.reservoir: List[List[Tuple[str, ...]]] = [[] for _ in range(len(self.class_index))]
+        self.reset()
+
+    def reset(self) -> None:
+        self.seen = np.zeros(len(self.class_index), dtype=np.int64)
+
+    def _codes(self, labels: np.ndarray) -> np.ndarray:
+        codes = self.class_index.get_indexer(labels)
+        if (codes < 0).any():
+            raise ValueError(f"Labels not listed in classes: {sorted(set(labels[codes < 0]))[:5]}")
+        return codes
+
+    def split(self, labels: np.ndarray) -> np.ndarray:
+        if not self.eval_every:
+            return np.zeros(len(labels), dtype=bool)
+
+        codes = self._codes(labels)
+        pos = pd.Series(codes).groupby(codes).cumcount().to_numpy() + self.seen[codes]
+        np.add.at(self.seen, codes, 1)
+        return (pos % self.eval_every) == (self.eval_every - 1)
+
+    def offer(self, df: pd.DataFrame) -> None:
+        """Righe escluse dal training (una sola volta, prima epoca) -> reservoir della loro classe."""
+        codes = self._codes(df[TARGET_COLUMN].to_numpy())
+        for code, row in zip(codes, df[FEATURE_COLUMNS].itertuples(index=False, name=None)):
+            t = int(self.held_out[code])
+            self.held_out[code] += 1
+            if t < self.capacity:
+                self.reservoir[code].append(row)
+            else:
+                j = int(self.rng.integers(t + 1))
+                if j < self.capacity:
+                    self.reservoir[code][j] = row
+
+    def sample(self) -> Tuple[pd.DataFrame, np.ndarray]:
+        # stessa frazione per ogni classe: la più "compressa" dal reservoir fissa la scala
+        ratios = [len(r) / n for r, n in zip(self.reservoir, self.held_out) if n]
+        scale = min(ratios, default=0.0)
+        rows: List[Tuple[str, ...]] = []
+        labels: List[str] = []
+        for label, reservoir, n in zip(self.class_index, self.reservoir, self.held_out):
+            k = min(len(reservoir), int(round(n * scale)))
+            picked = self.rng.choice(len(reservoir), size=k, replace=False) if k < len(reservoir) else range(k)
+            rows.extend(reservoir[i] for i in picked)
+            labels.extend([label] * k)
+        return pd.DataFrame(rows, columns=FEATURE_COLUMNS), np.asarray(labels, dtype=object)
+
+
+def train_streaming(
+    chunks: ChunkSource,
+    classes: Optional[List[str]],
+    manifest: Dict | None = None,
+    random_state: int = 42,
+) -> TrainResult:
+    """
+    Training out-of-core: i chunk del processed dataset vengono featurizzati con hashing
+    (stateless) e passati a SGDClassifier.partial_fit. In memoria restano un chunk e il
+    reservoir di valutazione (al più max_eval_rows righe, featurizzate solo alla fine).
+    chunks: callable che ritorna un nuovo iteratore di DataFrame ad ogni epoca.
+    """
+    manifest = manifest or {}
+    algo = (manifest.get("algo") or STREAMING_ALGOS[0]).lower()
+    params = streaming_params(manifest.get("params"))
+
+    if not classes:
+        # partial_fit richiede tutte le classi al primo chunk: passata leggera sulle sole label
+        classes = sorted({c for chunk in chunks() for c in clean_chunk(chunk)[TARGET_COLUMN].unique()})
+    classes = sorted(classes)
+
+    preprocessor = build_hashing_preprocessor(params)
+    preprocessor.fit(pd.DataFrame({"Product Title": [""], "Merchant ID": [""]}))
+
+    clf = SGDClassifier(loss=params["loss"], alpha=float(params["alpha"]), random_state=random_state)
+    holdout = StratifiedHoldout(classes, float(params["eval_fraction"]), int(params["max_eval_rows"]), random_state)
+    rng = np.random.default_rng(random_state)
+
+    n_train = 0
+    n_chunks = 0
+
+    for epoch in range(int(params["epochs"])):
+        holdout.reset()
+        for chunk in chunks():
+            df = clean_chunk(chunk)
+            if df.empty:
+                continue
+            y = df[TARGET_COLUMN].to_numpy()
+            is_eval = holdout.split(y)
+            X = preprocessor.transform(df[FEATURE_COLUMNS])
+
+            if epoch == 0 and is_eval.any():
+                holdout.offer(df[is_eval])
+
+            train_idx = np.flatnonzero(~is_eval)
+            if len(train_idx) == 0:
+                continue
+            # partial_fit non mescola: shuffle all'interno del chunk
+            train_idx = rng.permutation(train_idx)
+            clf.partial_fit(X[train_idx], y[train_idx], classes=np.asarray(classes, dtype=object))
+            if epoch == 0:
+                n_train += len(train_idx)
+                n_chunks += 1
+
+    if n_train == 0:
+        raise ValueError("Streaming training received no training rows.")
+
+    metrics: Dict[str, Any] = {
+        "accuracy": None,
+        "f1_macro": None,
+        "n_train": int(n_train),
+        "n_test": 0,
+        "n_classes": int(len(classes)),
+        "streaming": {
+            "chunk_rows": int(params["chunk_rows"]),
+            "n_chunks": int(n_chunks),
+            "epochs": int(params["epochs"]),
+            "n_features": int(params["title_n_features"]) + int(params["merchant_n_features"]),
+            "n_holdout": int(holdout.held_out.sum()),
+        },
+    }
+    X_eval_df, y_eval = holdout.sample()
+    if len(y_eval):
+        y_pred = clf.predict(preprocessor.transform(X_eval_df))
+        metrics["accuracy"] = float(accuracy_score(y_eval, y_pred))
+        metrics["f1_macro"] = float(f1_score(y_eval, y_pred, average="macro"))
+        metrics["n_test"] = int(len(y_eval))
+
+    pipeline = Pipeline(steps=[
+        ("preprocess", preprocessor),
+        ("clf", clf),
+    ])
+
+    model_info = {
+        "features": FEATURE_COLUMNS,
+        "target": TARGET_COLUMN,
+        "model_type": "sklearn Pipeline (Hashing + SGDClassifier, out-of-core partial_fit)",
+        "algo": algo,
+        "params": params,
+    }
+    return TrainResult(pipeline=pipeline, metrics=metrics, model_info=model_info)
@@ -1,14 +1,54 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
 
 import boto3
 
 from src.common.config import S3_PROCESSED_KEY
 from src.common.keys import parse_context_from_processed_key
+from src.train.checkpoint import TrainingDeadline
 from src.train.service import run_training, fail_job
 
 s3 = boto3.client("s3")
+_lambda = None
+
+# Funzione da re-invocare dopo un checkpoint (default: questa stessa funzione)
+TRAIN_CONTINUATION_FUNCTION = os.environ.get("TRAIN_CONTINUATION_FUNCTION", "")
+TRAIN_MAX_CONTINUATIONS = int(os.environ.get("TRAIN_MAX_CONTINUATIONS", "20"))
+# Secondi prima del timeout Lambda in cui un job ancora in corso (segmento più lungo del tempo
+# residuo) viene marcato FAILED: il timeout termina il processo senza passare dall'except
+TRAIN_TIMEOUT_GUARD_SECONDS = float(os.environ.get("TRAIN_TIMEOUT_GUARD_SECONDS", "5"))
+
+
+def _enqueue_continuation(context: Any, bucket: str, key: str, continuation: Dict[str, Any]) -> None:
+    global _lambda
+    if continuation["n"] > TRAIN_MAX_CONTINUATIONS:
+        raise RuntimeError(f"Training exceeded {TRAIN_MAX_CONTINUATIONS} continuations")
+    if _lambda is None:
+        _lambda = boto3.client("lambda")
+    _lambda.invoke(
+        FunctionName=TRAIN_CONTINUATION_FUNCTION or context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps({"bucket": bucket, "key": key, "continuation": continuation}).encode("utf-8"),
+    )
+
+
+def _timeout_guard(context: Any, bucket: str, job_id: Optional[str]) -> Optional[threading.Timer]:
+    if not job_id or context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    remaining = context.get_remaining_time_in_millis() / 1000.0
+    exc = TimeoutError(f"Training still running {TRAIN_TIMEOUT_GUARD_SECONDS:g}s before the Lambda timeout")
+    timer = threading.Timer(
+        max(remaining - TRAIN_TIMEOUT_GUARD_SECONDS, 0.0),
+        fail_job,
+        kwargs={"s3": s3, "bucket": bucket, "job_id": job_id, "stage": "TRAINING", "exc": exc},
+    )
+    timer.daemon = True
+    timer.start()
+    return timer
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -24,9 +64,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     mode = ctx["mode"]
     job_id = ctx["job_id"]
 
+    guard = _timeout_guard(context, bucket, job_id if mode == "job" else None)
     try:
-        return run_training(s3, bucket=bucket, processed_key=key)
+        result = run_training(
+            s3,
+            bucket=bucket,
+            processed_key=key,
+            deadline=TrainingDeadline.from_context(context),
+            continuation=event.get("continuation"),
+        )
+        if result.get("continuation"):
+            # checkpoint scritto: il training riprende in una nuova invocazione asincrona
+            _enqueue_continuation(context, bucket, key, result["continuation"])
+        return result
     except Exception as e:
         if mode == "job" and job_id:
             fail_job(s3, bucket=bucket, job_id=job_id, stage="TRAINING", exc=e)
         raise
+    finally:
+        if guard is not None:
+            guard.cancel()
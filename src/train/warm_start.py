@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import io
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from botocore.exceptions import ClientError
+
+from src.common.keys import default_pointer_key
+from src.common.s3_io import read_bytes, read_json
+from src.train.algorithms import canonical_name, get_algorithm
+from src.train.compact import dense_coef
+from src.train.core import FeatureSet, TrainResult, _fit_classifier, _to_result
+
+# chiavi della feature config che definiscono lo spazio delle feature (test_size/random_state no)
+_FEATURE_SPACE_KEYS = ("tfidf_max_features", "tfidf_ngram_range")
+
+# Oltre queste soglie il preprocessor del modello base non rappresenta più il dataset: cold start
+# - vocabolario: quota delle occorrenze dei termini ricorrenti del nuovo dataset fuori dal vocabolario base
+# - categorie: quota di righe con un Merchant ID sconosciuto all'encoder base (feature tutte a zero)
+TRAIN_WARM_START_MAX_VOCABULARY_DRIFT = float(os.environ.get("TRAIN_WARM_START_MAX_VOCABULARY_DRIFT", "0.2"))
+TRAIN_WARM_START_MAX_CATEGORY_DRIFT = float(os.environ.get("TRAIN_WARM_START_MAX_CATEGORY_DRIFT", "0.1"))
+
+
+@dataclass(frozen=True)
+class WarmStartBase:
+    """Modello corrente (default.json) da cui ripartire."""
+    pipeline: Any
+    model_key: str
+    run_id: Optional[str]
+    model_info: Dict[str, Any]
+
+
+def load_warm_start_base(s3, bucket: str) -> Optional[WarmStartBase]:
+    try:
+        pointer = read_json(s3, bucket, default_pointer_key())
+        model_key = pointer["model_key"]
+        pipeline = joblib.load(io.BytesIO(read_bytes(s3, bucket, model_key)))
+        model_info = read_json(s3, bucket, pointer["model_info_key"]) if pointer.get("model_info_key") else {}
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return WarmStartBase(pipeline=pipeline, model_key=model_key, run_id=pointer.get("run_id"), model_info=model_info)
+
+
+def incompatibility(base: WarmStartBase, algo: str, config: Dict[str, Any]) -> Optional[str]:
+    """None se si può ripartire dal modello base, altrimenti il motivo del cold start."""
+    # solo i modelli lineari ripartono dai coefficienti esistenti
+    if not get_algorithm(algo).warm_start:
+        return "unsupported_model_type"
+    if canonical_name(base.model_info.get("algo")) != canonical_name(algo):
+        return "algo_changed"
+    base_config = base.model_info.get("feature_config") or {}
+    if any(base_config.get(k) != config[k] for k in _FEATURE_SPACE_KEYS):
+        return "feature_config_changed"
+    return None
+
+
+def classes_changed(base: WarmStartBase, y: Any) -> bool:
+    new_classes = np.unique(np.asarray(y).astype(str))
+    old_classes = np.asarray(base.pipeline.named_steps["clf"].classes_).astype(str)
+    return not np.array_equal(new_classes, old_classes)
+
+
+def measure_drift(base: WarmStartBase, df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Drift del nuovo dataset rispetto al preprocessor del modello base (che il warm start riusa):
+    vocabulary_drift è la quota di occorrenze, tra i termini che terrebbe un cold start (i più frequenti,
+    fino alla stessa dimensione), di termini assenti dal vocabolario base; category_drift è la quota
+    di righe con un Merchant ID nuovo.
+    """
+    preprocess = base.pipeline.named_steps["preprocess"]
+    tfidf = preprocess.named_transformers_["title_tfidf"]
+    analyzer = tfidf.build_analyzer()
+    counts: Counter = Counter()
+    for title in df["Product Title"].fillna("").astype(str):
+        counts.update(analyzer(title))
+    # i termini visti una sola volta (codici modello, refusi) non pesano: occorrenze dei termini ricorrenti
+    top_terms = [(term, n) for term, n in counts.most_common(len(tfidf.vocabulary_)) if n > 1]
+    total = sum(n for _, n in top_terms)
+    new_terms = [(term, n) for term, n in top_terms if term not in tfidf.vocabulary_]
+
+    known_merchants = set(np.asarray(preprocess.named_transformers_["merchant_ohe"].categories_[0]).astype(str))
+    unknown_merchant = ~df["Merchant ID"].astype(str).isin(known_merchants)
+    return {
+        "vocabulary_drift": sum(n for _, n in new_terms) / total if total else 0.0,
+        "category_drift": float(unknown_merchant.mean()) if len(df) else 0.0,
+        "new_terms": len(new_terms),
+        "new_merchants": int(df.loc[unknown_merchant, "Merchant ID"].nunique()),
+    }
+
+
+def drift_exceeded(drift: Dict[str, Any]) -> Optional[str]:
+    """None se il drift è entro le soglie, altrimenti il motivo del cold start."""
+    if drift["vocabulary_drift"] > TRAIN_WARM_START_MAX_VOCABULARY_DRIFT:
+        return "vocabulary_drift"
+    if drift["category_drift"] > TRAIN_WARM_START_MAX_CATEGORY_DRIFT:
+        return "category_drift"
+    return None
+
+
+def train_warm(
+    base: WarmStartBase,
+    features: FeatureSet,
+    manifest: Dict[str, Any],
+    random_state: int = 42,
+) -> Tuple[TrainResult, Dict[str, Any]]:
+    """
+    Fit sulle nuove matrici (trasformate con il preprocessor del modello base) partendo
+    dai coefficienti esistenti: le iterazioni necessarie dipendono da quanto è cambiato il dataset.
+    """
+    algo = manifest["algo"]
+    params = manifest.get("params") or {}
+    old = base.pipeline.named_steps["clf"]
+
+    def init(clf: Any) -> None:
+        clf.set_params(warm_start=True)
+        # l'artifact è compattato (float32, coef_ eventualmente sparsi): si riparte da float64 densi
+        clf.coef_ = dense_coef(old)
+        clf.intercept_ = np.array(old.intercept_, dtype=np.float64)
+
+    fitted = _fit_classifier(features, algo, params, random_state, init=init)
+    result = _to_result(features, fitted, algo, params)
+    info = {
+        "base_model_key": base.model_key,
+        "base_run_id": base.run_id,
+        "fit_seconds": fitted.fit_seconds,
+        "n_iter": int(np.max(fitted.clf.n_iter_)),
+    }
+    return result, info
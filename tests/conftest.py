@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+from typing import Any, Dict, Tuple
+
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.common.keys import job_manifest_key
+from src.preprocess.service import run_preprocess_for_s3_object
+
+BUCKET = "test-bucket"
+
+
+def _error(code: str, status: int) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "FakeS3")
+
+
+def _etag(data: bytes) -> str:
+    return '"%s"' % hashlib.md5(data).hexdigest()
+
+
+class FakeS3:
+    """
+    Client S3 in memoria con il sottoinsieme di API usato dalla pipeline:
+    get (Range, IfMatch, IfNoneMatch), download_fileobj, head, put, delete, copy e multipart upload,
+    con la user metadata (Metadata) degli oggetti.
+    """
+
+    def __init__(self) -> None:
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+        self.metadata: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._uploads: Dict[str, Dict[int, bytes]] = {}
+        self._upload_metadata: Dict[str, Dict[str, str]] = {}
+        self._upload_seq = 0
+
+    def _get(self, bucket: str, key: str) -> Tuple[bytes, str]:
+        if (bucket, key) not in self.objects:
+            raise _error("NoSuchKey", 404)
+        return self.objects[(bucket, key)]
+
+    def body(self, key: str, bucket: str = BUCKET) -> bytes:
+        return self._get(bucket, key)[0]
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, Metadata: Dict[str, str] = None, **kwargs) -> Dict[str, Any]:
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body.read() if hasattr(Body, "read") else Body)
+        self.objects[(Bucket, Key)] = (data, _etag(data))
+        self.metadata[(Bucket, Key)] = dict(Metadata or {})
+        return {"ETag": self.objects[(Bucket, Key)][1]}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        if (Bucket, Key) not in self.objects:
+            raise _error("404", 404)
+        data, etag = self.objects[(Bucket, Key)]
+        return {"ETag": etag, "ContentLength": len(data), "Metadata": dict(self.metadata.get((Bucket, Key), {}))}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None, IfMatch: str = None, IfNoneMatch: str = None, **kwargs):
+        data, etag = self._get(Bucket, Key)
+        metadata = dict(self.metadata.get((Bucket, Key), {}))
+        if IfMatch is not None and IfMatch.strip('"') != etag.strip('"'):
+            raise _error("PreconditionFailed", 412)
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise _error("304", 304)
+        if Range:
+            first, last = Range.split("=")[1].split("-")
+            first, last = int(first), int(last) if last else len(data) - 1
+            if first >= len(data):
+                raise _error("InvalidRange", 416)
+            content_range = f"bytes {first}-{min(last, len(data) - 1)}/{len(data)}"
+            data = data[first:last + 1]
+            return {
+                "ETag": etag,
+                "ContentLength": len(data),
+                "ContentRange": content_range,
+                "Metadata": metadata,
+                "Body": io.BytesIO(data),
+            }
+        return {"ETag": etag, "ContentLength": len(data), "Metadata": metadata, "Body": io.BytesIO(data)}
+
+    def download_fileobj(self, Bucket: str, Key: str, Fileobj: Any, ExtraArgs: Dict[str, Any] = None, **kwargs) -> None:
+        Fileobj.write(self.get_object(Bucket=Bucket, Key=Key, **(ExtraArgs or {}))["Body"].read())
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        self.objects.pop((Bucket, Key), None)
+        self.metadata.pop((Bucket, Key), None)
+        return {}
+
+    def copy_object(
+        self, Bucket: str, Key: str, CopySource: Dict[str, str], Metadata: Dict[str, str] = None,
+        MetadataDirective: str = "COPY", **kwargs
+    ) -> Dict[str, Any]:
+        source = (CopySource["Bucket"], CopySource["Key"])
+        self.objects[(Bucket, Key)] = self._get(*source)
+        self.metadata[(Bucket, Key)] = dict(Metadata or {}) if MetadataDirective == "REPLACE" else dict(self.metadata.get(source, {}))
+        return {"CopyObjectResult": {"ETag": self.objects[(Bucket, Key)][1]}}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, Metadata: Dict[str, str] = None, **kwargs) -> Dict[str, Any]:
+        self._upload_seq += 1
+        upload_id = str(self._upload_seq)
+        self._uploads[upload_id] = {}
+        self._upload_metadata[upload_id] = dict(Metadata or {})
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any, **kwargs):
+        data = bytes(Body.read() if hasattr(Body, "read") else Body)
+        self._uploads[UploadId][PartNumber] = data
+        return {"ETag": _etag(data)}
+
+    def upload_part_copy(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, CopySource, CopySourceRange=None, **kwargs):
+        data = self._get(CopySource["Bucket"], CopySource["Key"])[0]
+        if CopySourceRange:
+            first, last = CopySourceRange.split("=")[1].split("-")
+            data = data[int(first):int(last) + 1]
+        self._uploads[UploadId][PartNumber] = data
+        return {"CopyPartResult": {"ETag": _etag(data)}}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload, **kwargs):
+        parts = self._uploads.pop(UploadId)
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        data = b"".join(parts[n] for n in numbers)
+        digests = b"".join(hashlib.md5(parts[n]).digest() for n in numbers)
+        etag = '"%s-%d"' % (hashlib.md5(digests).hexdigest(), len(numbers))
+        self.objects[(Bucket, Key)] = (data, etag)
+        self.metadata[(Bucket, Key)] = self._upload_metadata.pop(UploadId)
+        return {"ETag": etag}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> Dict[str, Any]:
+        self._uploads.pop(UploadId, None)
+        self._upload_metadata.pop(UploadId, None)
+        return {}
+
+
+def reupload_multipart(s3: FakeS3, key: str, n_parts: int = 2) -> None:
+    """Stesso contenuto e stessa metadata, ricaricato a parti: cambia solo l'ETag (come un upload con un'altra part size)."""
+    data, metadata = s3.body(key), s3.head_object(Bucket=BUCKET, Key=key)["Metadata"]
+    upload_id = s3.create_multipart_upload(Bucket=BUCKET, Key=key, Metadata=metadata)["UploadId"]
+    step = -(-len(data) // n_parts)
+    parts = []
+    for number, start in enumerate(range(0, len(data), step), start=1):
+        resp = s3.upload_part(Bucket=BUCKET, Key=key, UploadId=upload_id, PartNumber=number, Body=data[start:start + step])
+        parts.append({"ETag": resp["ETag"], "PartNumber": number})
+    s3.complete_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+
+
+def preprocess_job(s3: FakeS3, job_id: str, raw: bytes, manifest: Dict[str, Any] = None) -> str:
+    """Carica manifest + dataset raw di un job e lo preprocessa; ritorna la chiave di processed.csv."""
+    if manifest is not None:
+        s3.put_object(Bucket=BUCKET, Key=job_manifest_key(job_id), Body=json.dumps(manifest))
+    raw_key = f"raw/pricerunner/jobs/{job_id}/dataset.csv"
+    s3.put_object(Bucket=BUCKET, Key=raw_key, Body=raw)
+    return run_preprocess_for_s3_object(s3, BUCKET, raw_key, engine="batch")["processed_key"]
+
+
+@pytest.fixture
+def s3() -> FakeS3:
+    return FakeS3()
+
+
+@pytest.fixture(scope="session")
+def raw_csv() -> bytes:
+    # qualche migliaio di righe sintetiche con titoli "sporchi" e valori mancanti
+    return synthetic_raw_dataframe(3000, seed=7).to_csv(index=False).encode("utf-8")
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import json
+
+from benchmarks import bench_train
+
+
+def _report(fit_seconds: float, peak_rss_mb: float) -> dict:
+    case = {"n_rows": 1000, "algo": "logreg", "status": "ok", "fit_seconds": fit_seconds, "peak_rss_mb": peak_rss_mb}
+    return {"results": [case, {"n_rows": 1000, "algo": "ridge", "status": "error"}]}
+
+
+def test_compare_flags_only_growth_beyond_tolerance():
+    cases = bench_train.compare(_report(1.3, 100.0), _report(1.0, 90.0), tolerance=0.25)
+
+    assert len(cases) == 1
+    assert cases[0]["ratios"]["fit_seconds"] == 1.3
+    assert cases[0]["regressions"] == ["fit_seconds"]
+
+
+def test_report_roundtrip_and_self_comparison(tmp_path):
+    output = tmp_path / "report.json"
+    argv = ["--sizes", "800", "--algorithms", "complement_nb", "--predict-rows", "100", "--output", str(output)]
+    assert bench_train.main(argv) == 0
+
+    report = json.loads(output.read_text())
+    (case,) = report["results"]
+    assert case["status"] == "ok"
+    assert case["artifact_bytes"] <= case["artifact_raw_bytes"]
+    assert case["peak_rss_mb"] >= case["baseline_rss_mb"] > 0
+    assert report["environment"]["sklearn"]
+
+    # un report confrontato con sé stesso: nessuna regressione
+    (same,) = bench_train.compare(report, report, tolerance=0.25)
+    assert same["regressions"] == []
+    assert set(same["ratios"].values()) == {1.0}
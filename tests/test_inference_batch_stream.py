@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+
+import joblib
+import numpy as np
+import pytest
+
+from src.common.config import S3_DEFAULT_POINTER_KEY
+from src.common.keys import inference_output_keys
+from src.inference import model_store, service
+from src.inference.model_store import ModelCache
+from tests.conftest import BUCKET
+
+INPUT_KEY = "inference/input/batch.csv"
+
+
+class TitleLengthModel:
+    """Modello deterministico: probabilità ricavate dalla lunghezza del titolo."""
+
+    classes_ = np.array(["a", "b", "c", "d"])
+
+    def predict_proba(self, X):
+        lengths = X["Product Title"].fillna("").str.len().to_numpy(dtype=float)
+        raw = np.stack([(lengths + k) % 5 + 1 for k in range(len(self.classes_))], axis=1)
+        return raw / raw.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def batch_s3(s3, monkeypatch):
+    monkeypatch.setattr(model_store, "_MODEL_CACHE", ModelCache(max_models=2, max_bytes=0))
+    monkeypatch.setattr(model_store, "_HOT_SWAP", model_store._HotSwap())
+    monkeypatch.setattr(model_store, "_POINTERS", {})
+    monkeypatch.setattr(model_store, "INFERENCE_USE_BUNDLE", False)
+    monkeypatch.setattr(model_store, "INFERENCE_REVALIDATE_SECONDS", 0)
+
+    buf = io.BytesIO()
+    joblib.dump(TitleLengthModel(), buf)
+    s3.put_object(Bucket=BUCKET, Key="models/run-1/pipeline.joblib", Body=buf.getvalue())
+    pointer = {"model_key": "models/run-1/pipeline.joblib", "run_id": "run-1", "timestamp_utc": "2026-01-01T00:00:00Z"}
+    s3.put_object(Bucket=BUCKET, Key=S3_DEFAULT_POINTER_KEY, Body=json.dumps(pointer))
+    return s3
+
+
+def _run(s3, monkeypatch, engine: str, chunk_rows: int = 7):
+    monkeypatch.setattr(service, "INFERENCE_BATCH_ENGINE", engine)
+    monkeypatch.setattr(service, "INFERENCE_BATCH_CHUNK_ROWS", chunk_rows)
+    service.process_batch_s3_object(s3, BUCKET, INPUT_KEY)
+
+    keys = inference_output_keys("batch.csv")
+    return json.loads(s3.body(keys["json"])), s3.body(keys["csv"]), json.loads(s3.body(keys["summary"]))
+
+
+@pytest.mark.parametrize("n_rows", [0, 1, 7, 50])
+def test_streaming_output_matches_whole_file_path(batch_s3, monkeypatch, n_rows):
+    lines = ["Product Title,Merchant ID"]
+    lines += [f'"titolo {"x" * (i % 11)}, var {i}",{i % 3}' for i in range(n_rows)]
+    batch_s3.put_object(Bucket=BUCKET, Key=INPUT_KEY, Body=("\n".join(lines) + "\n").encode("utf-8"))
+
+    streamed = _run(batch_s3, monkeypatch, "stream")
+    whole = _run(batch_s3, monkeypatch, "batch")
+
+    assert streamed[1] == whole[1]
+    assert streamed[0] == whole[0]
+    assert streamed[2] == whole[2]
+    assert streamed[0]["n_records"] == n_rows
+    assert streamed[0]["default_run_id"] == "run-1"
+
+
+def test_streaming_without_merchant_column(batch_s3, monkeypatch):
+    body = "Product Title\n" + "".join(f"prodotto {i}\n" for i in range(20))
+    batch_s3.put_object(Bucket=BUCKET, Key=INPUT_KEY, Body=body.encode("utf-8"))
+
+    result, csv_bytes, summary = _run(batch_s3, monkeypatch, "stream", chunk_rows=6)
+    assert [p["input"]["Merchant ID"] for p in result["predictions"]] == ["0"] * 20
+    assert csv_bytes.decode("utf-8").count("\n") == 21
+    assert sum(summary["labels_distribution"].values()) == 20
+
+
+@pytest.mark.parametrize("engine", ["stream", "batch"])
+def test_cache_stats_are_logged_not_returned(batch_s3, monkeypatch, caplog, engine):
+    batch_s3.put_object(Bucket=BUCKET, Key=INPUT_KEY, Body=b"Product Title,Merchant ID\ntitolo,1\n")
+
+    with caplog.at_level(logging.INFO, logger=service.__name__):
+        result, _, _ = _run(batch_s3, monkeypatch, engine)
+    assert "model_cache" not in result
+    assert [r.getMessage().split(" ", 1)[0] for r in caplog.records] == ["model_cache"]
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from sklearn.pipeline import Pipeline
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.common.config import FEATURE_COLUMNS, TARGET_COLUMN
+from src.common.keys import inference_bundle_key_for_model_key, job_manifest_key, marker_key_for_job
+from src.inference import model_store
+from src.inference.linear_runtime import LinearBundleModel
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train import service
+from src.train.bundle import export_inference_bundle
+from src.train.compact import build_artifact
+from src.train.core import train_model
+from tests.conftest import BUCKET, preprocess_job
+
+
+@pytest.fixture(scope="module")
+def processed():
+    return preprocess_dataframe(synthetic_raw_dataframe(3000, seed=1)).processed_df
+
+
+@pytest.fixture(scope="module")
+def unseen():
+    X = preprocess_dataframe(synthetic_raw_dataframe(800, seed=2)).processed_df[FEATURE_COLUMNS].copy()
+    # merchant mai visti e titoli senza termini del vocabolario
+    X.loc[X.index[:5], "Merchant ID"] = "999999"
+    X.loc[X.index[5:8], "Product Title"] = ""
+    return X
+
+
+def _artifact_pipeline(df, manifest):
+    return build_artifact(train_model(df, manifest=manifest).pipeline).pipeline
+
+
+@pytest.mark.parametrize(
+    "manifest",
+    [
+        {"algo": "logreg", "params": {"max_iter": 300}},
+        {"algo": "sgd", "params": {"loss": "log_loss"}},
+        {"algo": "logreg", "features": {"tfidf_ngram_range": [1, 3], "tfidf_max_features": 500}},
+    ],
+    ids=["logreg", "sgd_log_loss", "logreg_ngrams"],
+)
+def test_bundle_matches_sklearn(processed, unseen, manifest):
+    pipeline = _artifact_pipeline(processed, manifest)
+    bundle = export_inference_bundle(pipeline, '"etag"')
+    assert bundle is not None
+
+    model = LinearBundleModel.from_bytes(bundle)
+    assert list(model.classes_) == list(pipeline.classes_)
+    np.testing.assert_allclose(model.predict_proba(unseen), pipeline.predict_proba(unseen), rtol=1e-6, atol=1e-9)
+    assert (model.predict(unseen) == pipeline.predict(unseen)).all()
+
+
+def test_bundle_matches_sklearn_binary(processed, unseen):
+    # due classi: LogisticRegression usa la sigmoide, non la softmax
+    top = processed[TARGET_COLUMN].value_counts().index[:2]
+    pipeline = _artifact_pipeline(processed[processed[TARGET_COLUMN].isin(top)], {"algo": "logreg"})
+
+    model = LinearBundleModel.from_bytes(export_inference_bundle(pipeline, '"etag"'))
+    np.testing.assert_allclose(model.predict_proba(unseen), pipeline.predict_proba(unseen), rtol=1e-6, atol=1e-9)
+    assert (model.predict(unseen) == pipeline.predict(unseen)).all()
+
+
+def test_no_bundle_without_linear_probabilities(processed):
+    pipeline = _artifact_pipeline(processed, {"algo": "random_forest", "params": {"n_estimators": 3}})
+    assert export_inference_bundle(pipeline, '"etag"') is None
+
+
+@pytest.fixture
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(model_store, "_MODEL_CACHE", model_store.ModelCache(max_models=4, max_bytes=0))
+    monkeypatch.setattr(model_store, "INFERENCE_REVALIDATE_SECONDS", 0)
+    return model_store
+
+
+def test_model_store_prefers_bundle_of_current_model(s3, raw_csv, fresh_store):
+    manifest = {"algo": "logreg", "params": {"solver": "lbfgs"}, "features": {"tfidf_max_features": 500}}
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, manifest))
+    model_key = res["versioned_model_key"]
+    assert json.loads(s3.body(model_key.replace("pipeline.joblib", "model_info.json")))["inference_bundle_key"]
+
+    assert isinstance(fresh_store.load_model_cached(s3, BUCKET, model_key), LinearBundleModel)
+
+    # pipeline.joblib riscritto senza il bundle corrispondente: ETag diverso, fallback su joblib
+    s3.objects[(BUCKET, model_key)] = (s3.body(model_key), '"rewritten"')
+    assert isinstance(fresh_store.load_model_cached(s3, BUCKET, model_key), Pipeline)
+
+
+def test_retrain_without_bundle_removes_stale_one(s3, raw_csv):
+    manifest = {"algo": "logreg", "params": {"solver": "lbfgs"}, "features": {"tfidf_max_features": 500}}
+    first = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, manifest))
+    bundle_key = inference_bundle_key_for_model_key(first["versioned_model_key"])
+    assert (BUCKET, bundle_key) in s3.objects
+
+    forest = {"algo": "random_forest", "params": {"n_estimators": 3}, "features": {"tfidf_max_features": 500}}
+    s3.put_object(Bucket=BUCKET, Key=job_manifest_key("job-a"), Body=json.dumps(forest))
+    s3.delete_object(Bucket=BUCKET, Key=marker_key_for_job("job-a", first["processed_etag"]))
+    second = service.run_training(s3, BUCKET, first["processed_key"])
+
+    assert second["versioned_model_key"] == first["versioned_model_key"]
+    assert (BUCKET, bundle_key) not in s3.objects
+
+
+def test_inference_handler_import_does_not_load_sklearn():
+    code = "import sys, src.inference.inference_handler; print(any(m.split('.')[0] in ('sklearn', 'joblib') for m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=dict(os.environ, AWS_DEFAULT_REGION="us-east-1"))
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import io
+import json
+import threading
+import time
+
+import joblib
+import pytest
+
+from src.common.config import S3_DEFAULT_POINTER_KEY
+from src.inference import model_store
+from src.inference.model_store import ModelCache
+from tests.conftest import BUCKET
+
+
+class _GatedS3:
+    """Blocca il download di un modello finché il test non apre il cancello."""
+
+    def __init__(self, s3, gated_key: str):
+        self._s3 = s3
+        self.gated_key = gated_key
+        self.gate = threading.Event()
+        self.fail = False
+
+    def __getattr__(self, name):
+        return getattr(self._s3, name)
+
+    def get_object(self, **kwargs):
+        if kwargs["Key"] == self.gated_key:
+            assert self.gate.wait(10)
+            if self.fail:
+                raise RuntimeError("download interrotto")
+        return self._s3.get_object(**kwargs)
+
+
+@pytest.fixture(autouse=True)
+def hot_swap(monkeypatch):
+    monkeypatch.setattr(model_store, "_MODEL_CACHE", ModelCache(max_models=4, max_bytes=0))
+    monkeypatch.setattr(model_store, "_HOT_SWAP", model_store._HotSwap())
+    monkeypatch.setattr(model_store, "_POINTERS", {})
+    monkeypatch.setattr(model_store, "INFERENCE_USE_BUNDLE", False)
+    monkeypatch.setattr(model_store, "INFERENCE_REVALIDATE_SECONDS", 0)
+    monkeypatch.setattr(model_store, "INFERENCE_HOT_SWAP", True)
+    return model_store._HOT_SWAP
+
+
+def _put_model(s3, key: str, value: int) -> None:
+    buf = io.BytesIO()
+    joblib.dump({"model": value}, buf)
+    s3.put_object(Bucket=BUCKET, Key=key, Body=buf.getvalue())
+
+
+def _publish_default(s3, model_key: str, run_id: str) -> None:
+    body = {"model_key": model_key, "run_id": run_id}
+    s3.put_object(Bucket=BUCKET, Key=S3_DEFAULT_POINTER_KEY, Body=json.dumps(body))
+
+
+def _wait_for(predicate) -> None:
+    deadline = time.monotonic() + 10
+    while not predicate():
+        assert time.monotonic() < deadline, "caricamento in background non concluso"
+        time.sleep(0.01)
+
+
+def test_previous_model_answers_while_new_default_loads(s3, hot_swap):
+    _put_model(s3, "models/a/pipeline.joblib", 1)
+    _put_model(s3, "models/b/pipeline.joblib", 2)
+    _publish_default(s3, "models/a/pipeline.joblib", "run-a")
+    gated = _GatedS3(s3, "models/b/pipeline.joblib")
+
+    first = model_store.get_model(gated, BUCKET, {})
+    assert (first.model, first.swap_pending) == ({"model": 1}, False)
+
+    _publish_default(s3, "models/b/pipeline.joblib", "run-b")
+    during = model_store.get_model(gated, BUCKET, {})
+    assert during.model == {"model": 1}
+    assert during.model_key == "models/a/pipeline.joblib"
+    assert during.default_pointer["run_id"] == "run-a"
+    assert during.swap_pending
+
+    # la richiesta successiva non avvia un secondo caricamento dello stesso modello
+    model_store.get_model(gated, BUCKET, {})
+    assert hot_swap.stats()["background_loads"] == 1
+
+    gated.gate.set()
+    _wait_for(lambda: hot_swap.swaps == 1)
+    after = model_store.get_model(gated, BUCKET, {})
+    assert (after.model, after.model_key, after.swap_pending) == ({"model": 2}, "models/b/pipeline.joblib", False)
+    assert after.default_pointer["run_id"] == "run-b"
+
+
+def test_failed_background_load_keeps_current_model_and_retries(s3, hot_swap):
+    _put_model(s3, "models/a/pipeline.joblib", 1)
+    _put_model(s3, "models/b/pipeline.joblib", 2)
+    _publish_default(s3, "models/a/pipeline.joblib", "run-a")
+    gated = _GatedS3(s3, "models/b/pipeline.joblib")
+    model_store.get_model(gated, BUCKET, {})
+
+    _publish_default(s3, "models/b/pipeline.joblib", "run-b")
+    gated.fail = True
+    gated.gate.set()
+    assert model_store.get_model(gated, BUCKET, {}).model == {"model": 1}
+    _wait_for(lambda: hot_swap.errors == 1)
+    assert "download interrotto" in hot_swap.stats()["last_error"]
+
+    gated.fail = False
+    assert model_store.get_model(gated, BUCKET, {}).swap_pending
+    _wait_for(lambda: hot_swap.swaps == 1)
+    assert model_store.get_model(gated, BUCKET, {}).model == {"model": 2}
+    assert hot_swap.stats()["background_loads"] == 2
+
+
+def test_explicit_model_key_and_disabled_hot_swap_load_synchronously(s3, hot_swap, monkeypatch):
+    _put_model(s3, "models/a/pipeline.joblib", 1)
+    _put_model(s3, "models/b/pipeline.joblib", 2)
+    _publish_default(s3, "models/a/pipeline.joblib", "run-a")
+    model_store.get_model(s3, BUCKET, {})
+
+    explicit = model_store.get_model(s3, BUCKET, {"model_key": "models/b/pipeline.joblib"})
+    assert (explicit.model, explicit.source) == ({"model": 2}, "event_override")
+
+    monkeypatch.setattr(model_store, "INFERENCE_HOT_SWAP", False)
+    _publish_default(s3, "models/b/pipeline.joblib", "run-b")
+    assert model_store.get_model(s3, BUCKET, {}).model == {"model": 2}
+    assert hot_swap.stats()["background_loads"] == 0
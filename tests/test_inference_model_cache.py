@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import io
+import json
+import pickle
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.common.config import S3_DEFAULT_POINTER_KEY
+from src.inference import model_store
+from src.inference.model_store import ModelCache, estimate_nbytes
+from tests.conftest import BUCKET
+
+
+class _Blob:
+    """Modello finto con un buffer NumPy della dimensione voluta."""
+
+    def __init__(self, nbytes: int):
+        self.weights = np.zeros(nbytes, dtype=np.uint8)
+
+
+def test_lru_evicts_least_recently_used_beyond_max_models():
+    cache = ModelCache(max_models=2, max_bytes=0)
+    cache.put("a", '"1"', _Blob(10))
+    cache.put("b", '"1"', _Blob(10))
+    assert cache.get("a", '"1"') is not None  # "a" diventa il più recente
+    cache.put("c", '"1"', _Blob(10))
+
+    assert cache.get("b", '"1"') is None
+    stats = cache.stats()
+    assert [e["model_key"] for e in stats["entries"]] == ["a", "c"]
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 1)
+
+
+def test_byte_budget_keeps_latest_model_even_if_too_large():
+    cache = ModelCache(max_models=10, max_bytes=50_000)
+    cache.put("a", '"1"', _Blob(30_000))
+    cache.put("b", '"1"', _Blob(30_000))
+    assert [e["model_key"] for e in cache.stats()["entries"]] == ["b"]
+
+    cache.put("huge", '"1"', _Blob(100_000))
+    assert [e["model_key"] for e in cache.stats()["entries"]] == ["huge"]
+
+
+def test_changed_etag_is_stale():
+    cache = ModelCache(max_models=2, max_bytes=0)
+    cache.put("a", '"1"', _Blob(1))
+    assert cache.get("a", '"2"') is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_estimate_counts_forest_trees():
+    rng = np.random.default_rng(0)
+    X, y = rng.random((2000, 20)), rng.integers(0, 5, 2000)
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+
+    pickled = len(pickle.dumps(forest))
+    assert abs(estimate_nbytes(forest) - pickled) / pickled < 0.1
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(model_store, "_MODEL_CACHE", ModelCache(max_models=2, max_bytes=0))
+    monkeypatch.setattr(model_store, "INFERENCE_USE_BUNDLE", False)
+    monkeypatch.setattr(model_store, "INFERENCE_REVALIDATE_SECONDS", 0)
+    return model_store
+
+
+def _put_model(s3, key: str, value: int) -> None:
+    buf = io.BytesIO()
+    joblib.dump({"model": value}, buf)
+    s3.put_object(Bucket=BUCKET, Key=key, Body=buf.getvalue())
+
+
+def test_alternating_model_keys_are_not_reloaded(s3, store, monkeypatch):
+    _put_model(s3, "models/a/pipeline.joblib", 1)
+    _put_model(s3, "models/b/pipeline.joblib", 2)
+    downloads = []
+    get_object = s3.get_object
+    monkeypatch.setattr(s3, "get_object", lambda **kw: downloads.append(kw["Key"]) or get_object(**kw))
+
+    for _ in range(3):
+        assert store.load_model_cached(s3, BUCKET, "models/a/pipeline.joblib") == {"model": 1}
+        assert store.load_model_cached(s3, BUCKET, "models/b/pipeline.joblib") == {"model": 2}
+    assert downloads == ["models/a/pipeline.joblib", "models/b/pipeline.joblib"]
+
+    # pipeline.joblib riscritto: nuovo ETag, ricaricato
+    _put_model(s3, "models/a/pipeline.joblib", 3)
+    assert store.load_model_cached(s3, BUCKET, "models/a/pipeline.joblib") == {"model": 3}
+    assert store.cache_stats()["stale"] == 1
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class _CountingS3:
+    """Registra le chiamate S3 (operazione, chiave) fatte dal model store."""
+
+    def __init__(self, s3):
+        self._s3 = s3
+        self.calls = []
+
+    def head_object(self, **kwargs):
+        self.calls.append(("head", kwargs["Key"]))
+        return self._s3.head_object(**kwargs)
+
+    def get_object(self, **kwargs):
+        self.calls.append(("get_304" if kwargs.get("IfNoneMatch") else "get", kwargs["Key"]))
+        return self._s3.get_object(**kwargs)
+
+
+@pytest.fixture
+def ttl_store(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(model_store, "time", clock)
+    monkeypatch.setattr(model_store, "_MODEL_CACHE", ModelCache(max_models=2, max_bytes=0))
+    monkeypatch.setattr(model_store, "_POINTERS", {})
+    monkeypatch.setattr(model_store, "INFERENCE_USE_BUNDLE", False)
+    monkeypatch.setattr(model_store, "INFERENCE_REVALIDATE_SECONDS", 30)
+    return clock
+
+
+def _publish_default(s3, model_key: str) -> None:
+    s3.put_object(Bucket=BUCKET, Key=S3_DEFAULT_POINTER_KEY, Body=json.dumps({"model_key": model_key}))
+
+
+def _request(s3) -> object:
+    model_key, _, _ = model_store.resolve_model_key(s3, BUCKET, {})
+    return model_store.load_model_cached(s3, BUCKET, model_key)
+
+
+def test_warm_requests_make_no_s3_calls_until_ttl_expires(s3, ttl_store):
+    _put_model(s3, "models/a/pipeline.joblib", 1)
+    _publish_default(s3, "models/a/pipeline.joblib")
+    counting = _CountingS3(s3)
+
+    assert _request(counting) == {"model": 1}
+    assert [op for op, _ in counting.calls] == ["get", "head", "get"]
+
+    counting.calls.clear()
+    ttl_store.now += 29
+    assert _request(counting) == {"model": 1}
+    assert counting.calls == []
+    assert model_store.cache_stats()["fresh_hits"] == 1
+
+    # TTL scaduto: default.json con GET condizionale (304) + head del modello
+    ttl_store.now += 2
+    assert _request(counting) == {"model": 1}
+    assert [op for op, _ in counting.calls] == ["get_304", "head"]
+
+
+def test_new_default_model_is_picked_up_after_ttl(s3, ttl_store):
+    _put_model(s3, "models/a/pipeline.joblib", 1)
+    _put_model(s3, "models/b/pipeline.joblib", 2)
+    _publish_default(s3, "models/a/pipeline.joblib")
+    assert _request(s3) == {"model": 1}
+
+    _publish_default(s3, "models/b/pipeline.joblib")
+    ttl_store.now += 10
+    assert _request(s3) == {"model": 1}
+    ttl_store.now += 30
+    assert _request(s3) == {"model": 2}
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from src.inference.scoring import prediction_rows, score, top_k_indices
+
+CLASSES = [f"c{i}" for i in range(10)]
+
+
+def _reference_rows(records, proba, classes, top_k):
+    """Vecchio predict_dataframe: sorted(..., reverse=True) per riga."""
+    rows = []
+    for i, rec in enumerate(records):
+        probs_i = proba[i]
+        idx_sorted = sorted(range(len(probs_i)), key=lambda j: probs_i[j], reverse=True)[:top_k]
+        rows.append({
+            "input": rec,
+            "predicted_label": str(classes[idx_sorted[0]]),
+            "confidence": float(probs_i[idx_sorted[0]]),
+            "topk": [{"label": str(classes[j]), "prob": float(probs_i[j])} for j in idx_sorted],
+        })
+    return rows
+
+
+class _ProbaModel:
+    def __init__(self, proba):
+        self.proba = proba
+
+    def predict_proba(self, X):
+        return self.proba
+
+    def predict(self, X):
+        return np.asarray(CLASSES, dtype=object)[self.proba.argmax(axis=1)]
+
+
+def _proba(n_rows: int, seed: int, quantized: bool) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    raw = rng.random((n_rows, len(CLASSES)))
+    if quantized:
+        # probabilità "a voti" come nelle foreste piccole: molte parità
+        raw = np.round(raw * 4)
+    raw[raw.sum(axis=1) == 0, 0] = 1.0
+    return raw / raw.sum(axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("quantized", [False, True])
+@pytest.mark.parametrize("top_k", [1, 3, 10, 20])
+def test_single_pass_matches_per_row_sort(quantized, top_k):
+    proba = _proba(500, seed=top_k, quantized=quantized)
+    records = [{"row": i} for i in range(len(proba))]
+
+    rows = prediction_rows(records, score(_ProbaModel(proba), None, top_k, CLASSES))
+    assert rows == _reference_rows(records, proba, CLASSES, top_k)
+
+
+def test_top_k_ties_prefer_lower_class_index():
+    proba = np.array([[0.2, 0.3, 0.3, 0.2], [0.25, 0.25, 0.25, 0.25]])
+    assert top_k_indices(proba, 2).tolist() == [[1, 2], [0, 1]]
+    assert top_k_indices(proba, 0).shape == (2, 0)
+
+
+def test_models_without_predict_proba_only_predict():
+    class _LabelModel:
+        def predict(self, X):
+            return np.array(["a", "b"])
+
+    rows = prediction_rows([{}, {}], score(_LabelModel(), None, 3, ["a", "b"]))
+    assert rows == [{"input": {}, "predicted_label": "a"}, {"input": {}, "predicted_label": "b"}]
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.common.s3_io import MIN_PART_SIZE, MultipartUploader
+from src.preprocess import service
+from tests.conftest import BUCKET, FakeS3
+
+RAW_KEY = "raw/pricerunner/producer/dataset.csv"
+
+
+def _run(s3, raw: bytes, engine: str) -> dict:
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw)
+    res = service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine=engine)
+    stats = json.loads(s3.body(res["stats_key"]))
+    return {
+        "processed": s3.body(res["processed_key"]),
+        "parquet": pd.read_parquet(io.BytesIO(s3.body(res["processed_parquet_key"]))),
+        "schema": s3.body(res["schema_key"]),
+        "classes": s3.body(res["classes_key"]),
+        # timestamp e metadati del motore cambiano per costruzione
+        "stats": {k: v for k, v in stats.items() if k not in ("timestamp_utc", "parallel")},
+    }
+
+
+def _assert_same_outputs(a: dict, b: dict) -> None:
+    assert a["processed"] == b["processed"]
+    pd.testing.assert_frame_equal(a["parquet"], b["parquet"])
+    assert a["schema"] == b["schema"]
+    assert a["classes"] == b["classes"]
+    assert a["stats"] == b["stats"]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 257, 100_000])
+def test_streaming_matches_batch(s3, raw_csv, monkeypatch, chunk_rows):
+    monkeypatch.setattr(service, "PREPROCESS_CHUNK_ROWS", chunk_rows)
+    batch = _run(s3, raw_csv, "batch")
+    streaming = _run(FakeS3(), raw_csv, "streaming")
+    _assert_same_outputs(batch, streaming)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_matches_batch(s3, raw_csv, monkeypatch, workers):
+    # shard piccoli: anche un dataset di test viene diviso tra più processi
+    monkeypatch.setattr(service, "PREPROCESS_WORKERS", workers)
+    monkeypatch.setattr(service, "MIN_SHARD_BYTES", 1024)
+    batch = _run(s3, raw_csv, "batch")
+
+    parallel_s3 = FakeS3()
+    parallel = _run(parallel_s3, raw_csv, "parallel")
+    _assert_same_outputs(batch, parallel)
+
+    stats = json.loads(parallel_s3.body("processed/pricerunner/producer/stats.json"))
+    assert stats["parallel"]["n_shards"] == workers
+
+
+def test_parallel_keeps_multiline_fields_in_one_shard(s3, monkeypatch):
+    # campi quotati con newline: i confini degli shard devono cadere tra righe CSV, non dentro
+    df = synthetic_raw_dataframe(500, seed=3)
+    df.loc[10, "Product Title"] = 'multi\nline "quoted", title\n\n'
+    df.loc[11, "Category Label"] = "TVs\n"
+    raw = df.to_csv(index=False).encode("utf-8")
+
+    monkeypatch.setattr(service, "PREPROCESS_WORKERS", 4)
+    monkeypatch.setattr(service, "MIN_SHARD_BYTES", 256)
+    _assert_same_outputs(_run(s3, raw, "batch"), _run(FakeS3(), raw, "parallel"))
+
+
+def test_multipart_uploader_assembles_parts_in_order(s3):
+    data = bytes(range(256)) * (MIN_PART_SIZE // 256 * 2 + 7)
+    with MultipartUploader(s3, BUCKET, "out.csv", "text/csv", part_size=MIN_PART_SIZE) as uploader:
+        for i in range(0, len(data), 1_000_000):
+            uploader.write(data[i:i + 1_000_000])
+
+    assert s3.body("out.csv") == data
+    assert uploader.etag.endswith('-2"')
+
+
+def test_multipart_uploader_aborts_on_error(s3):
+    with pytest.raises(RuntimeError):
+        with MultipartUploader(s3, BUCKET, "out.csv", "text/csv", part_size=MIN_PART_SIZE) as uploader:
+            uploader.write(b"x" * (MIN_PART_SIZE + 1))
+            raise RuntimeError("boom")
+
+    assert ("test-bucket", "out.csv") not in s3.objects
+    assert s3._uploads == {}
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from src.common.keys import job_status_key, preprocess_marker_key_for_job
+from src.common.s3_io import safe_etag
+from src.preprocess import service
+from tests.conftest import BUCKET
+
+JOB_ID = "job-1"
+JOB_KEY = f"raw/pricerunner/jobs/{JOB_ID}/dataset.csv"
+
+
+@pytest.fixture
+def gets(s3, monkeypatch):
+    # argomenti di ogni get_object: il probe è l'unica GET con Range
+    calls = []
+    get_object = s3.get_object
+
+    def recording_get(**kwargs):
+        calls.append(kwargs)
+        return get_object(**kwargs)
+
+    monkeypatch.setattr(s3, "get_object", recording_get)
+    return calls
+
+
+def _status(s3) -> dict:
+    return json.loads(s3.body(job_status_key(JOB_ID)))
+
+
+def test_wrong_header_fails_before_full_download(s3, gets):
+    s3.put_object(Bucket=BUCKET, Key=JOB_KEY, Body=b"a,b,c\n" + b"1,2,3\n" * 50_000)
+
+    with pytest.raises(ValueError):
+        service.run_preprocess_for_s3_object(s3, BUCKET, JOB_KEY)
+
+    assert [c.get("Range") for c in gets] == [f"bytes=0-{service.PREPROCESS_HEADER_PROBE_BYTES - 1}"]
+    status = _status(s3)
+    assert status["state"] == "FAILED"
+    assert status["error"]["type"] == "ValueError"
+
+
+def test_empty_object_fails_with_status(s3):
+    s3.put_object(Bucket=BUCKET, Key=JOB_KEY, Body=b"")
+
+    with pytest.raises(ValueError):
+        service.run_preprocess_for_s3_object(s3, BUCKET, JOB_KEY)
+    assert _status(s3)["state"] == "FAILED"
+
+
+def test_probe_reports_full_size_and_marker_uses_it(s3, raw_csv, gets):
+    s3.put_object(Bucket=BUCKET, Key=JOB_KEY, Body=raw_csv)
+
+    res = service.run_preprocess_for_s3_object(s3, BUCKET, JOB_KEY)
+
+    assert res["skipped"] is False
+    assert _status(s3)["state"] == "SUCCEEDED"
+    etag = safe_etag(s3.objects[(BUCKET, JOB_KEY)][1])
+    assert (BUCKET, preprocess_marker_key_for_job(JOB_ID, etag, len(raw_csv))) in s3.objects
+    # probe + download completo vincolato all'ETag del probe
+    assert len(gets) == 2
+    assert gets[1]["IfMatch"] == s3.objects[(BUCKET, JOB_KEY)][1]
+
+
+def test_header_longer_than_probe_is_validated_by_full_parse(s3, raw_csv, monkeypatch):
+    monkeypatch.setattr(service, "PREPROCESS_HEADER_PROBE_BYTES", 10)
+    s3.put_object(Bucket=BUCKET, Key=JOB_KEY, Body=raw_csv)
+
+    probe = service._probe_input(s3, BUCKET, JOB_KEY, 10)
+    res = service.run_preprocess_for_s3_object(s3, BUCKET, JOB_KEY)
+
+    assert probe.header_columns is None
+    assert probe.size == len(raw_csv)
+    assert res["n_rows_processed"] > 0
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src.preprocess import service
+from tests.conftest import BUCKET
+
+RAW_KEY = "raw/pricerunner/producer/dataset.csv"
+OTHER_KEY = "raw/pricerunner/producer/other.csv"
+PROCESSED_KEY = "processed/pricerunner/producer/processed.csv"
+
+
+def _run(s3, key: str = RAW_KEY, **kwargs) -> dict:
+    return service.run_preprocess_for_s3_object(s3, BUCKET, key, engine="batch", **kwargs)
+
+
+def test_same_input_is_skipped_and_processed_csv_untouched(s3, raw_csv):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    first = _run(s3)
+    processed = s3.objects[(BUCKET, PROCESSED_KEY)]
+
+    second = _run(s3)
+
+    assert first["skipped"] is False
+    assert second["skipped"] is True
+    assert second["processed_etag"] == first["processed_etag"]
+    assert second["n_rows_processed"] == first["n_rows_processed"]
+    assert s3.objects[(BUCKET, PROCESSED_KEY)] is processed
+
+
+def test_force_reprocesses(s3, raw_csv):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    _run(s3)
+    assert _run(s3, force=True)["skipped"] is False
+
+
+def test_marker_is_ignored_when_processed_csv_changed(s3, raw_csv):
+    # producer A -> B -> A: il marker di A non vale più dopo che B ha riscritto processed.csv
+    other = raw_csv.replace(b"Samsung", b"Sony")
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    s3.put_object(Bucket=BUCKET, Key=OTHER_KEY, Body=other)
+    first = _run(s3)
+    _run(s3, OTHER_KEY)
+
+    again = _run(s3)
+
+    assert again["skipped"] is False
+    assert again["processed_etag"] == first["processed_etag"]
+
+
+def test_marker_is_ignored_when_processed_csv_missing(s3, raw_csv):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    _run(s3)
+    s3.delete_object(Bucket=BUCKET, Key=PROCESSED_KEY)
+
+    assert _run(s3)["skipped"] is False
+
+
+def test_rewrite_after_probe_fails_instead_of_marking_new_content(s3, raw_csv, monkeypatch):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    get_object = s3.get_object
+
+    def probe_then_rewrite(Bucket, Key, **kwargs):
+        resp = get_object(Bucket=Bucket, Key=Key, **kwargs)
+        if Key == RAW_KEY and "Range" in kwargs:
+            s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv + raw_csv.splitlines(keepends=True)[1])
+        return resp
+
+    monkeypatch.setattr(s3, "get_object", probe_then_rewrite)
+
+    with pytest.raises(ClientError) as exc:
+        _run(s3)
+    assert exc.value.response["Error"]["Code"] == "PreconditionFailed"
+    assert not any(k.startswith("processed/pricerunner/markers/") for _, k in s3.objects)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.common import s3_io
+from src.preprocess import service
+from tests.conftest import BUCKET, FakeS3
+
+RAW_KEY = "raw/pricerunner/producer/dataset.csv"
+
+
+def _outputs(s3, df: pd.DataFrame, engine: str) -> dict:
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=df.to_csv(index=False).encode("utf-8"))
+    res = service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine=engine)
+    stats = json.loads(s3.body(res["stats_key"]))
+    out = {
+        "processed": s3.body(res["processed_key"]),
+        "schema": s3.body(res["schema_key"]),
+        "classes": s3.body(res["classes_key"]),
+        "stats": {k: v for k, v in stats.items() if k not in ("timestamp_utc", "input_etag", "incremental")},
+        "incremental": stats.get("incremental"),
+    }
+    if res["processed_parquet_key"]:
+        out["parquet"] = pd.read_parquet(io.BytesIO(s3.body(res["processed_parquet_key"]))).astype(object)
+    return out
+
+
+def _assert_matches_batch(s3, df: pd.DataFrame) -> dict:
+    incremental = _outputs(s3, df, "incremental")
+    batch = _outputs(FakeS3(), df, "batch")
+    for name in ("processed", "schema", "classes", "stats"):
+        assert incremental[name] == batch[name], name
+    if "parquet" in incremental:
+        pd.testing.assert_frame_equal(incremental["parquet"], batch["parquet"])
+    return incremental["incremental"]
+
+
+@pytest.fixture
+def base() -> pd.DataFrame:
+    return synthetic_raw_dataframe(2000, seed=5)
+
+
+def test_first_version_is_a_full_pass(s3, base):
+    info = _assert_matches_batch(s3, base)
+    assert info == {"applied": False, "reason": "no_previous_index", "raw_rows_hashed": len(base)}
+
+
+def test_append_copies_previous_processed_server_side(s3, base, monkeypatch):
+    monkeypatch.setattr(s3_io, "MIN_PART_SIZE", 10_000)
+    copies = []
+    upload_part_copy = s3.upload_part_copy
+    monkeypatch.setattr(s3, "upload_part_copy", lambda **kw: copies.append(kw) or upload_part_copy(**kw))
+    _assert_matches_batch(s3, base)
+
+    appended = pd.concat([base, synthetic_raw_dataframe(150, seed=6)], ignore_index=True)
+    info = _assert_matches_batch(s3, appended)
+
+    assert info["append_only"] is True
+    assert info["n_rows_delta"] == 150
+    assert info["processed_csv_write"] == "server_side_copy_plus_delta"
+    assert len(copies) == 1
+
+
+@pytest.mark.parametrize("change", ["modify", "delete", "reorder"])
+def test_non_append_changes_match_batch(s3, base, change):
+    _assert_matches_batch(s3, base)
+
+    df = base.copy()
+    if change == "modify":
+        df.loc[10, "Product Title"] = "CHANGED  Title"
+        df.loc[20, "Category Label"] = None
+    elif change == "delete":
+        df = df.drop(index=range(100, 400)).reset_index(drop=True)
+    else:
+        df = df.iloc[::-1].reset_index(drop=True)
+    info = _assert_matches_batch(s3, df)
+
+    assert info["applied"] is True
+    assert info["append_only"] is False
+    assert info["processed_csv_write"] == "full"
+
+
+def test_append_without_parquet_rewrite_removes_parquet(s3, base, monkeypatch):
+    monkeypatch.setattr(service, "PREPROCESS_INCREMENTAL_PARQUET", False)
+    _assert_matches_batch(s3, base)
+
+    appended = pd.concat([base, synthetic_raw_dataframe(50, seed=8)], ignore_index=True)
+    info = _assert_matches_batch(s3, appended)
+
+    assert info["parquet_write"] == "removed"
+    assert (BUCKET, "processed/pricerunner/producer/processed.parquet") not in s3.objects
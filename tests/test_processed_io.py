@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+from src.common import processed_io
+from src.preprocess import service
+from tests.conftest import BUCKET
+
+RAW_KEY = "raw/pricerunner/producer/dataset.csv"
+PROCESSED_KEY = "processed/pricerunner/producer/processed.csv"
+PARQUET_KEY = "processed/pricerunner/producer/processed.parquet"
+
+
+@pytest.fixture
+def preprocessed(s3, raw_csv):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine="batch")
+    return s3
+
+
+def _csv_frame(s3) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(s3.body(PROCESSED_KEY)), dtype=str)
+
+
+def test_loader_prefers_parquet_with_same_content(preprocessed):
+    df, fmt = processed_io.load_processed_dataframe(preprocessed, BUCKET, PROCESSED_KEY)
+
+    assert fmt == "parquet"
+    # il csv rilegge i titoli vuoti come NaN: a valle entrambi diventano ""
+    pd.testing.assert_frame_equal(df.astype(object).fillna(""), _csv_frame(preprocessed).astype(object).fillna(""))
+
+
+def test_loader_falls_back_to_csv_without_parquet(preprocessed):
+    preprocessed.delete_object(Bucket=BUCKET, Key=PARQUET_KEY)
+
+    df, fmt = processed_io.load_processed_dataframe(preprocessed, BUCKET, PROCESSED_KEY)
+
+    assert fmt == "csv"
+    pd.testing.assert_frame_equal(df, _csv_frame(preprocessed))
+
+
+def test_disabled_parquet_removes_stale_artifact(preprocessed, raw_csv, monkeypatch):
+    # un parquet di una versione precedente non deve più essere letto
+    monkeypatch.setattr(service, "PREPROCESS_WRITE_PARQUET", False)
+    res = service.run_preprocess_for_s3_object(preprocessed, BUCKET, RAW_KEY, engine="streaming", force=True)
+
+    assert res["processed_parquet_key"] is None
+    assert (BUCKET, PARQUET_KEY) not in preprocessed.objects
+    assert processed_io.load_processed_dataframe(preprocessed, BUCKET, PROCESSED_KEY)[1] == "csv"
+
+
+@pytest.mark.parametrize("engine", ["batch", "streaming", "parallel", "incremental"])
+def test_csv_and_parquet_share_a_generation_per_run(s3, raw_csv, engine):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    generations = []
+    for _ in range(2):
+        service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine=engine, force=True)
+        csv_generation = processed_io.processed_generation(s3.head_object(Bucket=BUCKET, Key=PROCESSED_KEY))
+        assert csv_generation is not None
+        assert processed_io.processed_generation(s3.head_object(Bucket=BUCKET, Key=PARQUET_KEY)) == csv_generation
+        generations.append(csv_generation)
+    assert generations[0] != generations[1]
+
+
+def test_parquet_of_another_generation_is_ignored(preprocessed, raw_csv):
+    # run interrotta dopo il parquet: processed.csv è ancora quello della run precedente
+    stale_parquet = preprocessed.body(PARQUET_KEY)
+    preprocessed.put_object(Bucket=BUCKET, Key=PARQUET_KEY, Body=stale_parquet, Metadata={"processed-generation": "other"})
+
+    df, fmt = processed_io.load_processed_dataframe(preprocessed, BUCKET, PROCESSED_KEY)
+    assert fmt == "csv"
+    pd.testing.assert_frame_equal(df, _csv_frame(preprocessed))
+
+    chunks = list(processed_io.iter_processed_chunks(preprocessed, BUCKET, PROCESSED_KEY, chunk_rows=1000))
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), _csv_frame(preprocessed))
+
+
+def test_csv_without_generation_is_read_as_csv(preprocessed):
+    # processed.csv scritto da una versione precedente del preprocess (senza metadata)
+    preprocessed.put_object(Bucket=BUCKET, Key=PROCESSED_KEY, Body=preprocessed.body(PROCESSED_KEY))
+    assert processed_io.load_processed_dataframe(preprocessed, BUCKET, PROCESSED_KEY)[1] == "csv"
+
+
+class _RewriteAfterHead:
+    """Riscrive processed.csv subito dopo il primo head, come un preprocess concorrente."""
+
+    def __init__(self, s3):
+        self._s3 = s3
+
+    def __getattr__(self, name):
+        return getattr(self._s3, name)
+
+    def head_object(self, Bucket, Key, **kwargs):
+        head = self._s3.head_object(Bucket=Bucket, Key=Key, **kwargs)
+        if Key == PROCESSED_KEY:
+            self._s3.put_object(Bucket=Bucket, Key=Key, Body=self._s3.body(Key) + b"x,y,z\n")
+        return head
+
+
+def test_csv_rewritten_after_head_fails_instead_of_mixing_versions(preprocessed):
+    preprocessed.delete_object(Bucket=BUCKET, Key=PARQUET_KEY)
+
+    with pytest.raises(ClientError) as exc:
+        processed_io.load_processed_dataframe(_RewriteAfterHead(preprocessed), BUCKET, PROCESSED_KEY)
+    assert exc.value.response["Error"]["Code"] == "PreconditionFailed"
+
+
+def _recorded_sha256(s3) -> str:
+    return processed_io.processed_content_id(s3.head_object(Bucket=BUCKET, Key=PROCESSED_KEY))
+
+
+@pytest.mark.parametrize("engine", ["batch", "streaming", "parallel", "incremental"])
+def test_processed_csv_records_its_content_sha256(s3, raw_csv, engine):
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    res = service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine=engine)
+
+    sha256 = hashlib.sha256(s3.body(PROCESSED_KEY)).hexdigest()
+    assert _recorded_sha256(s3) == res["processed_sha256"] == sha256
+
+
+def test_append_only_run_hashes_previous_rows_and_delta(s3, raw_csv):
+    lines = raw_csv.split(b"\n")
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=b"\n".join(lines[:2001]) + b"\n")
+    service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine="incremental")
+    s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=raw_csv)
+    res = service.run_preprocess_for_s3_object(s3, BUCKET, RAW_KEY, engine="incremental")
+
+    stats = json.loads(s3.body(res["stats_key"]))
+    assert stats["incremental"]["append_only"] is True
+    assert _recorded_sha256(s3) == hashlib.sha256(s3.body(PROCESSED_KEY)).hexdigest()
+
+
+def test_content_id_falls_back_to_etag_without_metadata(preprocessed):
+    preprocessed.put_object(Bucket=BUCKET, Key=PROCESSED_KEY, Body=preprocessed.body(PROCESSED_KEY))
+    head = preprocessed.head_object(Bucket=BUCKET, Key=PROCESSED_KEY)
+    assert processed_io.processed_content_id(head) == head["ETag"].strip('"')
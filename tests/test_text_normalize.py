@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import contextlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import TEXT_NORMALIZERS
+
+EDGE_CASES = [
+    "  Samsung  Galaxy\tS9 ",
+    "APPLE\t\tiPhone\n64GB",
+    "",
+    "   ",
+    None,
+    np.nan,
+    12345,
+    "Straße ÉTÉ",
+    "a b  c",
+    "　fullwidth　space",
+    "x\r\ny\x0bz\x0cw",
+]
+
+
+def _python_strings():
+    # pandas >= 3: stringhe Arrow-backed, .str.replace(r"\s+") usa RE2 (solo spazi ASCII)
+    try:
+        return pd.option_context("future.infer_string", False)
+    except (KeyError, pd.errors.OptionError):
+        return contextlib.nullcontext()
+
+
+def _titles() -> pd.Series:
+    titles = synthetic_raw_dataframe(2000, seed=11, dirty_fraction=0.5)["Product Title"]
+    return pd.concat([titles.astype(object), pd.Series(EDGE_CASES, dtype=object)], ignore_index=True)
+
+
+@pytest.mark.parametrize("engine", sorted(TEXT_NORMALIZERS))
+def test_normalizers_match_reference(engine):
+    with _python_strings():
+        s = _titles()
+        expected = TEXT_NORMALIZERS["pandas"](s)
+        out = TEXT_NORMALIZERS[engine](s)
+    assert out.index.equals(s.index)
+    assert out.astype(object).tolist() == expected.astype(object).tolist()
+
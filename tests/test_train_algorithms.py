@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train.algorithms import ALGORITHMS, canonical_name, get_algorithm
+from src.train.core import build_classifier, feature_config, featurize, train_on_features
+from src.train.manifest import normalize_manifest
+
+FAST_PARAMS = {"logreg": {"solver": "lbfgs", "max_iter": 300}, "random_forest": {"n_estimators": 20}}
+
+
+@pytest.fixture(scope="module")
+def features():
+    df = preprocess_dataframe(synthetic_raw_dataframe(1500, seed=3)).processed_df
+    return featurize(df, feature_config({"features": {"tfidf_max_features": 500}}))
+
+
+@pytest.mark.parametrize("algo", sorted(ALGORITHMS))
+def test_every_registered_algorithm_trains(features, algo):
+    result = train_on_features(features, {"algo": algo, "params": FAST_PARAMS.get(algo, {})})
+
+    assert result.model_info["algo"] == algo
+    assert result.model_info["model_type"].endswith(f"{get_algorithm(algo).model_type})")
+    assert result.metrics["accuracy"] > 0.5
+    X = features.X_test[:5]
+    assert len(result.pipeline.named_steps["clf"].predict(X)) == 5
+    # predict_proba solo dove il classificatore la espone (ridge no)
+    assert hasattr(result.pipeline.named_steps["clf"], "predict_proba") == (algo != "ridge")
+
+
+def test_aliases_resolve_to_canonical_names():
+    assert canonical_name("RF") == "random_forest"
+    assert canonical_name("svm") == "linear_svc"
+    assert canonical_name("nope") is None
+    _, model_type = build_classifier("logistic", {})
+    assert model_type == "LogisticRegression"
+
+
+def test_unknown_algorithm_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported algo 'nope'"):
+        build_classifier("nope", {})
+
+
+def test_v0_manifest_accepts_algorithm_key():
+    assert normalize_manifest({"algorithm": "SGD"})["algo"] == "sgd"
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.common.keys import job_status_key
+from src.train import checkpoint, service
+from src.train.core import feature_config, featurize, train_on_features
+from tests.conftest import BUCKET, preprocess_job
+
+VERSION_PREFIX = "models/pricerunner/versions/jobs/test-job"
+
+
+@pytest.fixture(scope="module")
+def features():
+    df = preprocess_dataframe(synthetic_raw_dataframe(3000, seed=4)).processed_df
+    return featurize(df, feature_config({}))
+
+
+def _expired() -> checkpoint.TrainingDeadline:
+    # nessun tempo residuo: dopo il primo segmento di ogni invocazione si scrive un checkpoint
+    return checkpoint.TrainingDeadline(expires_at=time.monotonic() - 1, margin_seconds=0)
+
+
+def _fit_with_restarts(s3, features, algo, params):
+    """Una invocazione per segmento, con lo stato che passa solo dal checkpoint su S3."""
+    state, invocations = None, 0
+    while True:
+        invocations += 1
+        fitted = checkpoint.fit_segmented(
+            features,
+            algo,
+            params,
+            _expired(),
+            state=state,
+            on_checkpoint=lambda st: checkpoint.save_checkpoint(s3, BUCKET, VERSION_PREFIX, st, {}),
+        )
+        if fitted is not None:
+            return fitted, invocations
+        state, _ = checkpoint.load_checkpoint(s3, BUCKET, VERSION_PREFIX)
+
+
+@pytest.mark.parametrize(
+    "algo, params, min_invocations",
+    [
+        ("random_forest", {"n_estimators": 10}, 4),
+        ("sgd", {"max_iter": 30}, 6),
+        ("logreg", {"max_iter": 30, "tol": 1e-12}, 6),
+        ("logreg", {"solver": "lbfgs", "max_iter": 200}, 2),
+    ],
+)
+def test_checkpointed_fit_matches_uninterrupted(s3, features, monkeypatch, algo, params, min_invocations):
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_TREES", 3)
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_ITERATIONS", 5)
+    # senza deadline: stesso schedule a segmenti, nessun checkpoint
+    reference = checkpoint.fit_segmented(features, algo, params, None).clf
+
+    fitted, invocations = _fit_with_restarts(s3, features, algo, params)
+    assert invocations >= min_invocations
+    np.testing.assert_array_equal(fitted.clf.predict_proba(features.X_test), reference.predict_proba(features.X_test))
+    assert fitted.clf.get_params() == reference.get_params()
+    # parametri registrati come quelli del fit in un colpo solo
+    single = train_on_features(features, {"algo": algo, "params": params}).pipeline.named_steps["clf"]
+    assert fitted.clf.get_params() == single.get_params()
+
+
+def test_forest_segments_match_single_fit(features, monkeypatch):
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_TREES", 3)
+    params = {"n_estimators": 10}
+    single = train_on_features(features, {"algo": "random_forest", "params": params}).pipeline.named_steps["clf"]
+    segmented = checkpoint.fit_segmented(features, "random_forest", params, None).clf
+    np.testing.assert_array_equal(segmented.predict_proba(features.X_test), single.predict_proba(features.X_test))
+
+
+@pytest.mark.parametrize("algo", ["logreg", "sgd"])
+def test_iteration_segments_reach_single_fit_quality(features, monkeypatch, algo):
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_ITERATIONS", 10)
+    single = checkpoint.fit_segmented(features, algo, {}, None)
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_ITERATIONS", 10_000)
+    one_segment = checkpoint.fit_segmented(features, algo, {}, None)
+
+    assert abs(single.metrics["accuracy"] - one_segment.metrics["accuracy"]) < 0.02
+    # n_iter_ complessivo sui blocchi, max_iter ripristinato
+    assert int(np.max(single.clf.n_iter_)) > 10
+    assert single.clf.max_iter == one_segment.clf.max_iter
+    assert single.clf.warm_start is False
+
+
+def test_iteration_checkpoint_carries_coefficients(s3, features, monkeypatch):
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_ITERATIONS", 4)
+    params = {"max_iter": 40, "tol": 1e-12}
+    saved = []
+    assert checkpoint.fit_segmented(features, "logreg", params, _expired(), on_checkpoint=saved.append) is None
+
+    checkpoint.save_checkpoint(s3, BUCKET, VERSION_PREFIX, saved[0], {})
+    state, meta = checkpoint.load_checkpoint(s3, BUCKET, VERSION_PREFIX)
+    assert (meta["progress"], meta["total"], meta["segment"]) == (4, 40, 1)
+    np.testing.assert_array_equal(state.clf.coef_, saved[0].clf.coef_)
+    np.testing.assert_array_equal(state.clf.intercept_, saved[0].clf.intercept_)
+    assert int(np.max(state.clf.n_iter_)) == 4
+
+
+def test_checkpointed_forest_has_identical_trees(s3, features, monkeypatch):
+    # il pickle della foresta non è confrontabile byte per byte (padding dei nodi): si confrontano gli alberi
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_TREES", 4)
+    params = {"n_estimators": 9}
+    reference = train_on_features(features, {"algo": "random_forest", "params": params}).pipeline.named_steps["clf"]
+    fitted, _ = _fit_with_restarts(s3, features, "random_forest", params)
+
+    assert len(fitted.clf.estimators_) == len(reference.estimators_)
+    for ours, theirs in zip(fitted.clf.estimators_, reference.estimators_):
+        assert ours.random_state == theirs.random_state
+        np.testing.assert_array_equal(ours.tree_.feature, theirs.tree_.feature)
+        np.testing.assert_array_equal(ours.tree_.threshold, theirs.tree_.threshold)
+        np.testing.assert_array_equal(ours.tree_.value, theirs.tree_.value)
+
+
+def test_job_resumes_from_checkpoint_with_same_run(s3, raw_csv, monkeypatch):
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_TREES", 5)
+    manifest = {"algo": "random_forest", "params": {"n_estimators": 10}, "features": {"tfidf_max_features": 500}}
+    processed_key = preprocess_job(s3, "job-a", raw_csv, manifest)
+
+    first = service.run_training(s3, BUCKET, processed_key, deadline=_expired())
+    continuation = first["continuation"]
+    assert continuation["n"] == 1
+    status = json.loads(s3.body(job_status_key("job-a")))
+    assert status["state"] == "RUNNING"
+    assert s3.body(status["artifacts"]["checkpoint_key"])
+
+    done = service.run_training(s3, BUCKET, processed_key, deadline=_expired(), continuation=continuation)
+    assert "continuation" not in done
+    assert done["run_id"] == first["run_id"]
+    metrics = json.loads(s3.body(f"{done['version_prefix']}/metrics.json"))
+    assert metrics["continuations"] == 1
+    assert not any("/checkpoint/" in k for _, k in s3.objects)
+    assert json.loads(s3.body(job_status_key("job-a")))["state"] == "SUCCEEDED"
+
+
+class _LambdaContext:
+    invoked_function_arn = "arn:aws:lambda:eu-south-1:123456789012:function:train"
+
+    def __init__(self, remaining_seconds: float):
+        self._expires_at = time.monotonic() + remaining_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self._expires_at - time.monotonic()) * 1000)
+
+
+@pytest.fixture
+def train_handler(s3, monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-south-1")
+    from src.train import train_handler
+
+    monkeypatch.setattr(train_handler, "s3", s3)
+    monkeypatch.setattr(train_handler, "TRAIN_TIMEOUT_GUARD_SECONDS", 0.2)
+    return train_handler
+
+
+def _event(processed_key: str) -> dict:
+    return {"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": processed_key}}}]}
+
+
+def test_job_is_marked_failed_before_lambda_timeout(s3, raw_csv, train_handler, monkeypatch):
+    processed_key = preprocess_job(s3, "job-a", raw_csv, {"algo": "logreg"})
+    statuses = []
+
+    def slow_training(*args, **kwargs):
+        # segmento più lungo del tempo residuo: Lambda verrebbe terminata senza except
+        time.sleep(0.6)
+        statuses.append(json.loads(s3.body(job_status_key("job-a"))))
+        return {"ok": True}
+
+    monkeypatch.setattr(train_handler, "run_training", slow_training)
+    train_handler.handler(_event(processed_key), _LambdaContext(0.4))
+
+    assert statuses[0]["state"] == "FAILED"
+    assert statuses[0]["error"]["type"] == "TimeoutError"
+
+
+def test_timeout_guard_is_cancelled_when_training_returns(s3, raw_csv, train_handler, monkeypatch):
+    processed_key = preprocess_job(s3, "job-a", raw_csv, {"algo": "logreg"})
+    monkeypatch.setattr(train_handler, "run_training", lambda *args, **kwargs: {"ok": True})
+
+    train_handler.handler(_event(processed_key), _LambdaContext(0.4))
+    time.sleep(0.4)
+    assert json.loads(s3.body(job_status_key("job-a")))["state"] != "FAILED"
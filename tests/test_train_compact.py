@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import io
+
+import joblib
+import numpy as np
+import pytest
+from scipy import sparse
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train import compact
+from src.train.core import feature_config, featurize, train_on_features
+
+
+@pytest.fixture(scope="module")
+def data():
+    df = preprocess_dataframe(synthetic_raw_dataframe(2000, seed=5)).processed_df
+    return df, featurize(df, feature_config({"features": {"tfidf_max_features": 2000}}))
+
+
+@pytest.mark.parametrize(
+    "algo, params",
+    [
+        ("logreg", {"solver": "lbfgs", "max_iter": 300}),
+        ("sgd", {}),
+        ("complement_nb", {}),
+    ],
+)
+def test_compacted_artifact_keeps_predictions(data, algo, params):
+    df, features = data
+    pipeline = train_on_features(features, {"algo": algo, "params": params}).pipeline
+    artifact = compact.build_artifact(pipeline)
+    blob, stats = artifact.data, artifact.stats
+    loaded = joblib.load(io.BytesIO(blob))
+
+    assert stats["compacted"] is True
+    assert stats["bytes"] == len(blob) < stats["raw_bytes"]
+    # la pipeline passata non viene modificata
+    assert pipeline.named_steps["clf"].get_params() == loaded.named_steps["clf"].get_params()
+    np.testing.assert_array_equal(loaded.predict(df.head(300)), pipeline.predict(df.head(300)))
+    np.testing.assert_allclose(loaded.predict_proba(df.head(300)), pipeline.predict_proba(df.head(300)), atol=1e-4)
+    assert all(getattr(v, "stop_words_", None) is None for v in compact._vectorizers(loaded))
+
+
+def test_sparse_coef_roundtrips_through_dense_coef(data):
+    _, features = data
+    pipeline = train_on_features(features, {"algo": "sgd"}).pipeline
+    # pesi quasi tutti nulli (come con una penalità l1): sotto SPARSIFY_MAX_DENSITY
+    pipeline.named_steps["clf"].coef_[:, 100:] = 0.0
+    original = np.array(pipeline.named_steps["clf"].coef_)
+    loaded = joblib.load(io.BytesIO(compact.build_artifact(pipeline).data))
+
+    clf = loaded.named_steps["clf"]
+    assert sparse.issparse(clf.coef_)
+    coef = compact.dense_coef(clf)
+    assert coef.dtype == np.float64
+    np.testing.assert_array_equal(coef, original)
+
+
+def test_disabled_compaction_returns_raw_dump(data, monkeypatch):
+    monkeypatch.setattr(compact, "TRAIN_COMPACT_MODEL", False)
+    _, features = data
+    pipeline = train_on_features(features, {"algo": "complement_nb"}).pipeline
+    artifact = compact.build_artifact(pipeline)
+    blob, stats = artifact.data, artifact.stats
+
+    assert stats["compacted"] is False
+    assert stats["bytes"] == stats["raw_bytes"] == len(blob)
+    assert joblib.load(io.BytesIO(blob)).named_steps["clf"].feature_log_prob_.dtype == np.float64
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train import checkpoint, service
+from src.train.core import feature_config
+from src.train.cv import cross_validate
+from src.train.manifest import normalize_cv
+from tests.conftest import BUCKET, preprocess_job
+
+FEATURES = {"tfidf_max_features": 500}
+CANDIDATES = [
+    {"algo": "logreg", "params": {"solver": "lbfgs", "C": 0.5, "max_iter": 300}},
+    {"algo": "complement_nb", "params": {}},
+]
+
+
+@pytest.fixture(scope="module")
+def processed():
+    return preprocess_dataframe(synthetic_raw_dataframe(1500, seed=6)).processed_df
+
+
+def _metrics(s3, res: dict) -> dict:
+    return json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))
+
+
+def test_parallel_folds_match_serial(processed):
+    config = feature_config({"features": FEATURES})
+    serial = cross_validate(processed, config, CANDIDATES, folds=3, workers=1)
+    parallel = cross_validate(processed, config, CANDIDATES, folds=3, workers=3)
+
+    assert (serial["workers"], parallel["workers"]) == (1, 3)
+    for a, b in zip(serial["candidates"], parallel["candidates"]):
+        assert [(f["fold"], f["accuracy"], f["f1_macro"]) for f in a["per_fold"]] == [
+            (f["fold"], f["accuracy"], f["f1_macro"]) for f in b["per_fold"]
+        ]
+    assert len(serial["fold_featurize_seconds"]) == 3
+
+
+def test_normalize_cv_forms():
+    assert normalize_cv(None) is None
+    assert normalize_cv(4) == {"folds": 4, "workers": None}
+    assert normalize_cv(True) == {"folds": 5, "workers": None}
+    assert normalize_cv({"folds": 3, "workers": 2}) == {"folds": 3, "workers": 2}
+    with pytest.raises(ValueError):
+        normalize_cv(1)
+
+
+def test_sweep_is_ranked_by_cv_mean(s3, raw_csv):
+    manifest = {"features": FEATURES, "cv": {"folds": 3, "workers": 1}, "sweep": {"candidates": CANDIDATES}}
+    metrics = _metrics(s3, service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, manifest)))
+
+    sweep = metrics["sweep"]
+    assert sweep["ranked_by"] == "cv_mean"
+    means = [row["cv_f1_macro_mean"] for row in sweep["leaderboard"]]
+    assert means == sorted(means, reverse=True)
+    assert sweep["best_candidate_id"] == sweep["leaderboard"][0]["candidate_id"]
+
+
+def test_cv_result_travels_with_continuation(s3, raw_csv, monkeypatch):
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_TREES", 5)
+    manifest = {
+        "algo": "random_forest",
+        "params": {"n_estimators": 10},
+        "features": FEATURES,
+        "cv": {"folds": 2, "workers": 1},
+    }
+    processed_key = preprocess_job(s3, "job-a", raw_csv, manifest)
+    expired = checkpoint.TrainingDeadline(expires_at=0, margin_seconds=0)
+
+    first = service.run_training(s3, BUCKET, processed_key, deadline=expired)
+    cv_first = first["continuation"]["cv"]
+    assert cv_first["folds"] == 2
+
+    def no_second_cv(*args, **kwargs):
+        raise AssertionError("cross-validation recomputed on continuation")
+
+    monkeypatch.setattr(service, "cross_validate", no_second_cv)
+    done = service.run_training(s3, BUCKET, processed_key, deadline=expired, continuation=first["continuation"])
+    cv = _metrics(s3, done)["cv"]
+    assert cv["f1_macro_mean"] == cv_first["candidates"][0]["f1_macro_mean"]
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train import service
+from src.train.core import build_classifier, dedup_rows, feature_config, featurize, train_on_features
+from src.train.feature_cache import load_features, save_features
+from tests.conftest import BUCKET, preprocess_job
+
+
+@pytest.fixture(scope="module")
+def duplicated():
+    df = preprocess_dataframe(synthetic_raw_dataframe(1000, seed=8)).processed_df
+    # ogni riga ripetuta 3 volte, come nei listing dello stesso prodotto
+    return pd.concat([df] * 3, ignore_index=True)
+
+
+def _features(df, dedup):
+    return featurize(df, feature_config({"features": {"tfidf_max_features": 500, "dedup": dedup}}))
+
+
+def test_dedup_rows_counts_and_inverse():
+    X = pd.DataFrame({"a": ["x", "y", "x", "x"], "b": ["1", "1", "1", "2"]})
+    y = pd.Series(["p", "p", "p", "p"])
+    first, counts, inverse = dedup_rows(X, y)
+
+    assert first.tolist() == [0, 1, 3]
+    assert counts.tolist() == [2.0, 1.0, 1.0]
+    assert inverse.tolist() == [0, 1, 0, 2]
+
+
+def test_weighted_fit_matches_fit_on_all_rows(duplicated):
+    plain, dedup = _features(duplicated, False), _features(duplicated, True)
+    assert dedup.n_train_rows == plain.X_train.shape[0]
+    assert dedup.X_train.shape[0] < plain.X_train.shape[0]
+    # stesso preprocessor (idf calcolato su tutte le righe)
+    np.testing.assert_array_equal((dedup.X_test != plain.X_test).nnz, 0)
+
+    manifest = {"algo": "logreg", "params": {"solver": "lbfgs", "max_iter": 1000}}
+    a = train_on_features(plain, manifest)
+    b = train_on_features(dedup, manifest)
+    assert b.metrics["n_train"] == a.metrics["n_train"]
+    assert b.metrics["dedup"]["weighted_fit"] is True
+    assert b.metrics["dedup"]["compression_ratio"] > 2
+    np.testing.assert_allclose(
+        b.pipeline.named_steps["clf"].predict_proba(plain.X_test),
+        a.pipeline.named_steps["clf"].predict_proba(plain.X_test),
+        atol=1e-3,
+    )
+
+
+@pytest.mark.parametrize("algo, params", [("logreg", {"solver": "saga"}), ("random_forest", {})])
+def test_unweighted_fits_get_original_rows(duplicated, algo, params):
+    features = _features(duplicated, True)
+    clf, _ = build_classifier(algo, params)
+    X, y, kwargs = features.fit_arguments(clf)
+
+    weighted = features.weighted_fit(clf)
+    if weighted:
+        assert kwargs["sample_weight"].sum() == features.n_train_rows
+    else:
+        assert kwargs == {}
+        assert X.shape[0] == len(y) == features.n_train_rows
+    # saga: passo ridotto dal peso massimo, meglio le righe originali
+    assert weighted is (algo == "random_forest")
+
+
+@pytest.mark.parametrize(
+    "manifest, dedup",
+    [
+        ({"algo": "logreg", "params": {"solver": "lbfgs"}}, True),
+        ({"algo": "logreg", "params": {"solver": "saga"}}, False),
+        ({"algo": "sgd", "params": {}}, True),
+        # sweep: basta un candidato con fit pesato, gli altri ricevono le righe riespanse
+        ({"algo": "logreg", "params": {"solver": "saga"}, "sweep": {"candidates": [{"algo": "random_forest", "params": {}}]}}, True),
+    ],
+)
+def test_dedup_only_for_weighted_fits(manifest, dedup):
+    config = feature_config({**manifest, "features": {"dedup": True}})
+    assert config["dedup"] is dedup
+
+
+def test_skipped_dedup_is_recorded_in_metrics(s3):
+    raw = synthetic_raw_dataframe(600, seed=8).to_csv(index=False).encode("utf-8")
+    manifest = {
+        "algo": "logreg",
+        "params": {"solver": "saga", "max_iter": 50},
+        "features": {"tfidf_max_features": 500, "dedup": True},
+    }
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw, manifest))
+    metrics = json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))
+    assert metrics["dedup"] == {"used": False, "reason": "unweighted_fit"}
+
+
+def test_feature_cache_keeps_weights(s3, duplicated):
+    features = _features(duplicated, True)
+    save_features(s3, BUCKET, "etag", features)
+    cached = load_features(s3, BUCKET, "etag", features.config)
+
+    np.testing.assert_array_equal(cached.sample_weight, features.sample_weight)
+    np.testing.assert_array_equal(cached.train_inverse, features.train_inverse)
+    assert cached.n_train_rows == features.n_train_rows
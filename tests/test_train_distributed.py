@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import io
+
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.common.processed_io import load_processed_classes
+from src.train import distributed, service
+from src.train.distributed import train_distributed
+from tests.conftest import BUCKET, preprocess_job
+
+MANIFEST = {"algo": "sgd_distributed", "params": {"shards": 3, "workers": 2, "epochs": 2}}
+
+
+@pytest.fixture
+def processed_key(s3, raw_csv):
+    return preprocess_job(s3, "job-a", raw_csv)
+
+
+def _head(s3, key):
+    head = s3.head_object(Bucket=BUCKET, Key=key)
+    return int(head["ContentLength"]), head["ETag"]
+
+
+def _shard_bytes(s3, processed_key, n_shards):
+    size, etag = _head(s3, processed_key)
+    header, tasks = distributed.plan_shards(s3, BUCKET, processed_key, etag, size, n_shards)
+    return header, [distributed.read_shard_rows(s3, BUCKET, processed_key, etag, t) for t in tasks]
+
+
+@pytest.mark.parametrize("n_shards", [1, 3, 7, 64])
+def test_shards_cover_every_row_once(s3, processed_key, n_shards):
+    header, shards = _shard_bytes(s3, processed_key, n_shards)
+    assert header + b"".join(shards) == s3.body(processed_key)
+
+
+@pytest.mark.parametrize("n_shards", [2, 5, 64])
+def test_shards_split_only_outside_quoted_fields(s3, monkeypatch, n_shards):
+    df = synthetic_raw_dataframe(400, seed=3)
+    merchants = df["Merchant ID"].astype("string")
+    df["Merchant ID"] = merchants.where(df.index % 3 != 0, merchants + '\nshop "north"\n' + merchants)
+    processed_key = preprocess_job(s3, "job-q", df.to_csv(index=False).encode("utf-8"))
+    body = s3.body(processed_key)
+    assert b'\nshop ""north""\n' in body
+
+    # blocchi minuscoli: righe quotate a cavallo tra due letture sequenziali del padre
+    monkeypatch.setattr(distributed, "_SCAN_BLOCK", 97)
+    header, shards = _shard_bytes(s3, processed_key, n_shards)
+    assert header + b"".join(shards) == body
+    expected = pd.read_csv(io.BytesIO(body), dtype=str)
+    parts = [pd.read_csv(io.BytesIO(header + rows), dtype=str) for rows in shards]
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), expected)
+
+
+class _ParentOnlyClient:
+    """Client del processo padre: solo la lettura sequenziale, gli shard devono usare client_factory."""
+
+    def __init__(self, s3):
+        self._s3 = s3
+
+    def head_object(self, **kwargs):
+        return self._s3.head_object(**kwargs)
+
+    def get_object(self, Range=None, **kwargs):
+        assert Range is None, f"shard read with the parent client: {Range}"
+        return self._s3.get_object(**kwargs)
+
+
+def test_distributed_training_reads_shards_with_worker_clients(s3, processed_key):
+    result = distributed.train_distributed(
+        _ParentOnlyClient(s3),
+        BUCKET,
+        processed_key,
+        load_processed_classes(s3, BUCKET, processed_key),
+        manifest=MANIFEST,
+        client_factory=lambda: s3,
+    )
+
+    info = result.metrics["distributed"]
+    n_rows = len(pd.read_csv(io.BytesIO(s3.body(processed_key))))
+    assert info["shards"] == 3
+    assert sum(info["shard_rows"]) == result.metrics["n_train"] + info["n_holdout"] == n_rows
+    assert result.metrics["accuracy"] > 0.5
+    assert result.pipeline.named_steps["clf"].coef_.shape[0] == result.metrics["n_classes"]
+
+
+def test_run_training_forwards_client_factory(s3, raw_csv, monkeypatch):
+    processed_key = preprocess_job(s3, "job-d", raw_csv, MANIFEST)
+    factory = lambda: s3  # noqa: E731
+    seen = {}
+
+    def fake_train_distributed(*args, **kwargs):
+        seen.update(kwargs)
+        return train_distributed(*args, **kwargs)
+
+    monkeypatch.setattr(service, "train_distributed", fake_train_distributed)
+    service.run_training(s3, BUCKET, processed_key, client_factory=factory)
+    assert seen["client_factory"] is factory
+
+
+def test_rewritten_dataset_fails_shard_reads(s3, processed_key):
+    size, etag = _head(s3, processed_key)
+    _, tasks = distributed.plan_shards(s3, BUCKET, processed_key, etag, size, 2)
+    # stessa dimensione, contenuto diverso: solo l'ETag rivela la riscrittura
+    s3.put_object(Bucket=BUCKET, Key=processed_key, Body=s3.body(processed_key).replace(b"a", b"e"))
+
+    with pytest.raises(ClientError) as exc:
+        distributed.read_shard_rows(s3, BUCKET, processed_key, etag, tasks[1])
+    assert exc.value.response["Error"]["Code"] == "PreconditionFailed"
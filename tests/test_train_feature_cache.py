@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import json
+
+from src.common.config import S3_FEATURE_CACHE_PREFIX
+from src.train import service
+from tests.conftest import BUCKET, preprocess_job, reupload_multipart
+
+MANIFEST = {"algo": "logreg", "params": {"solver": "lbfgs"}, "features": {"tfidf_max_features": 500}}
+
+
+def _metrics(s3, res: dict) -> dict:
+    return json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))
+
+
+def test_second_job_on_same_dataset_hits_feature_cache(s3, raw_csv, monkeypatch):
+    # la model cache eviterebbe del tutto il secondo fit
+    monkeypatch.setattr(service, "TRAIN_MODEL_CACHE", False)
+    first = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+    second = service.run_training(s3, BUCKET, preprocess_job(s3, "job-b", raw_csv, MANIFEST))
+
+    assert first["processed_etag"] == second["processed_etag"]
+    a, b = _metrics(s3, first), _metrics(s3, second)
+    assert a["feature_cache"]["hit"] is False
+    assert a["processed_format"] == "parquet"
+    assert b["feature_cache"]["hit"] is True
+    assert b["processed_format"] == "feature_cache"
+    # stesse matrici, stesso modello
+    assert (b["accuracy"], b["f1_macro"], b["n_train"]) == (a["accuracy"], a["f1_macro"], a["n_train"])
+
+
+def test_same_content_with_another_etag_hits_feature_cache(s3, raw_csv, monkeypatch):
+    monkeypatch.setattr(service, "TRAIN_MODEL_CACHE", False)
+    first = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+    processed_key = preprocess_job(s3, "job-b", raw_csv, MANIFEST)
+    reupload_multipart(s3, processed_key)
+    second = service.run_training(s3, BUCKET, processed_key)
+
+    assert first["processed_etag"] != second["processed_etag"]
+    a, b = _metrics(s3, first), _metrics(s3, second)
+    assert a["processed_content_id"] == b["processed_content_id"]
+    assert b["feature_cache"]["hit"] is True
+
+
+def test_different_feature_config_misses(s3, raw_csv):
+    service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+    other = dict(MANIFEST, features={"tfidf_max_features": 300})
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-b", raw_csv, other))
+
+    assert _metrics(s3, res)["feature_cache"]["hit"] is False
+
+
+def test_disabled_cache_is_not_read_or_written(s3, raw_csv, monkeypatch):
+    monkeypatch.setattr(service, "TRAIN_FEATURE_CACHE", False)
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+
+    cache_info = _metrics(s3, res)["feature_cache"]
+    assert (cache_info["enabled"], cache_info["hit"]) == (False, False)
+    assert not any(k.startswith(S3_FEATURE_CACHE_PREFIX) for _, k in s3.objects)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+
+from src.common.config import S3_MODEL_CACHE_PREFIX
+from src.common.keys import job_status_key
+from src.train import checkpoint, service
+from src.train.model_cache import model_cache_key
+from tests.conftest import BUCKET, preprocess_job, reupload_multipart
+
+MANIFEST = {"algo": "logreg", "params": {"solver": "lbfgs"}, "features": {"tfidf_max_features": 500}}
+
+
+def _metrics(s3, res: dict) -> dict:
+    return json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))
+
+
+def test_identical_job_reuses_cached_model(s3, raw_csv, monkeypatch):
+    first = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+    assert _metrics(s3, first)["model_cache"]["hit"] is False
+
+    def no_fit(*args, **kwargs):
+        raise AssertionError("model fitted on a cache hit")
+
+    monkeypatch.setattr(service, "_train_in_memory", no_fit)
+    second = service.run_training(s3, BUCKET, preprocess_job(s3, "job-b", raw_csv, MANIFEST))
+
+    assert second["model_cache_hit"] is True
+    assert s3.body(second["versioned_model_key"]) == s3.body(first["versioned_model_key"])
+    metrics = _metrics(s3, second)
+    assert metrics["model_cache"]["source_run_id"] == first["run_id"]
+    assert (metrics["job_id"], metrics["run_id"]) == ("job-b", second["run_id"])
+    # bundle copiato con lo stesso ETag di pipeline.joblib
+    info = json.loads(s3.body(f"{second['version_prefix']}/model_info.json"))
+    assert info["inference_bundle_key"].startswith(second["version_prefix"])
+    assert json.loads(s3.body(job_status_key("job-b")))["state"] == "SUCCEEDED"
+
+
+def test_cache_key_follows_content_not_etag(s3, raw_csv):
+    first = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+    processed_key = preprocess_job(s3, "job-b", raw_csv, MANIFEST)
+    reupload_multipart(s3, processed_key)
+    second = service.run_training(s3, BUCKET, processed_key)
+
+    assert second["model_cache_hit"] is True
+    assert _metrics(s3, second)["model_cache"]["source_run_id"] == first["run_id"]
+
+
+def test_different_params_miss(s3, raw_csv):
+    service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, MANIFEST))
+    other = dict(MANIFEST, params={"solver": "lbfgs", "C": 0.5})
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-b", raw_csv, other))
+
+    assert "model_cache_hit" not in res
+    assert _metrics(s3, res)["model_cache"]["hit"] is False
+
+
+def test_sweep_bypasses_cache(s3, raw_csv):
+    manifest = dict(MANIFEST, sweep={"candidates": [{"algorithm": "complement_nb"}]})
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, manifest))
+
+    assert _metrics(s3, res)["model_cache"] == {"hit": False, "cache_key": None, "bypass": "sweep"}
+    assert not any(k.startswith(S3_MODEL_CACHE_PREFIX) for _, k in s3.objects)
+
+
+def test_cache_key_tracks_aliases_and_fit_schedule(monkeypatch):
+    forest = {"algo": "random_forest", "params": {"n_estimators": 10}}
+    key = model_cache_key("etag", forest)
+    assert model_cache_key("etag", dict(forest, algo="rf")) == key
+    assert model_cache_key("other-etag", forest) != key
+
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_TREES", 7)
+    assert model_cache_key("etag", forest) != key
+
+
+def test_cache_key_tracks_iteration_segments_only_for_segmented_solvers(monkeypatch):
+    saga = {"algo": "logreg", "params": {}}
+    liblinear = {"algo": "logreg", "params": {"solver": "liblinear"}}
+    keys = model_cache_key("etag", saga), model_cache_key("etag", liblinear)
+
+    monkeypatch.setattr(checkpoint, "TRAIN_SEGMENT_ITERATIONS", 7)
+    assert model_cache_key("etag", saga) != keys[0]
+    assert model_cache_key("etag", liblinear) == keys[1]
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import io
+import json
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.config import TARGET_COLUMN
+from src.common.processed_io import iter_processed_chunks, load_processed_dataframe
+from src.train import service
+from src.train.streaming import StratifiedHoldout
+from tests.conftest import BUCKET, preprocess_job
+
+MANIFEST = {
+    "algo": "sgd_streaming",
+    "params": {"chunk_rows": 400, "title_n_features": 2 ** 12, "merchant_n_features": 2 ** 8},
+}
+
+
+@pytest.fixture
+def processed_key(s3, raw_csv) -> str:
+    return preprocess_job(s3, "job-stream", raw_csv, MANIFEST)
+
+
+def _parquet_key(processed_key: str) -> str:
+    return processed_key.replace(".csv", ".parquet")
+
+
+@pytest.mark.parametrize("source", ["parquet", "csv"])
+def test_chunks_cover_the_whole_dataset(s3, processed_key, source):
+    if source == "csv":
+        s3.delete_object(Bucket=BUCKET, Key=_parquet_key(processed_key))
+    full, fmt = load_processed_dataframe(s3, BUCKET, processed_key)
+
+    chunks = list(iter_processed_chunks(s3, BUCKET, processed_key, 700))
+
+    assert fmt == source
+    assert all(len(c) <= 700 for c in chunks)
+    streamed = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(streamed.astype(object).fillna(""), full.astype(object).fillna(""))
+
+
+def test_holdout_is_stratified_and_spans_the_stream():
+    labels = np.array(["a"] * 900 + ["b"] * 100, dtype=object)
+    holdout = StratifiedHoldout(["a", "b"], eval_fraction=0.2, max_eval_rows=50)
+    picked = []
+    for start in range(0, len(labels), 100):
+        chunk = labels[start:start + 100]
+        mask = holdout.split(chunk)
+        df = pd.DataFrame({"Product Title": [str(start + i) for i in range(len(chunk))], "Merchant ID": "m", TARGET_COLUMN: chunk})
+        holdout.offer(df[mask])
+        picked.append(mask.sum())
+
+    X, y = holdout.sample()
+
+    assert holdout.held_out.tolist() == [180, 20]
+    # stesse proporzioni delle classi, righe prese anche dagli ultimi chunk
+    assert (y == "a").sum() / (y == "b").sum() == pytest.approx(9, rel=0.2)
+    assert X["Product Title"].astype(int).max() >= 900
+    assert len(y) <= 50
+
+
+@pytest.mark.parametrize("source", ["parquet", "csv"])
+def test_streaming_training_job(s3, processed_key, source):
+    if source == "csv":
+        s3.delete_object(Bucket=BUCKET, Key=_parquet_key(processed_key))
+
+    n_rows = len(load_processed_dataframe(s3, BUCKET, processed_key)[0])
+    res = service.run_training(s3, BUCKET, processed_key)
+
+    metrics = json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))
+    assert metrics["processed_format"] == "stream"
+    assert metrics["streaming"]["n_chunks"] > 1
+    assert metrics["streaming"]["n_holdout"] + metrics["n_train"] == n_rows
+    assert metrics["n_test"] > 0
+    assert metrics["accuracy"] > 0.5
+    pipeline = joblib.load(io.BytesIO(s3.body(res["versioned_model_key"])))
+    assert pipeline.predict(pd.DataFrame({"Product Title": ["samsung galaxy 128gb"], "Merchant ID": ["1"]})).shape == (1,)
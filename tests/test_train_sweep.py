@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import io
+import json
+
+import joblib
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.preprocess_core import preprocess_dataframe
+from src.train import service
+from src.train.core import feature_config, featurize, train_candidates
+from tests.conftest import BUCKET, preprocess_job
+
+CANDIDATES = [
+    {"algo": "logreg", "params": {"C": 0.5, "solver": "lbfgs", "max_iter": 300}},
+    {"algo": "logreg", "params": {"C": 2.0, "solver": "lbfgs", "max_iter": 300}},
+    {"algo": "random_forest", "params": {"n_estimators": 20}},
+]
+
+
+@pytest.fixture(scope="module")
+def features():
+    df = preprocess_dataframe(synthetic_raw_dataframe(1500, seed=2)).processed_df
+    return featurize(df, feature_config({"features": {"tfidf_max_features": 500}}))
+
+
+def test_parallel_candidates_match_serial(features):
+    serial = train_candidates(features, CANDIDATES, workers=1)
+    parallel = train_candidates(features, CANDIDATES, workers=2)
+
+    for s, p in zip(serial, parallel):
+        assert s.model_info["params"] == p.model_info["params"]
+        X = features.X_test
+        np.testing.assert_array_equal(s.pipeline.named_steps["clf"].predict(X), p.pipeline.named_steps["clf"].predict(X))
+        assert s.metrics["f1_macro"] == p.metrics["f1_macro"]
+
+
+def test_worker_params_are_not_rewritten(features):
+    results = train_candidates(features, CANDIDATES, workers=2)
+
+    # nessun n_jobs iniettato nei params registrati né lasciato sul modello
+    assert [r.model_info["params"] for r in results] == [c["params"] for c in CANDIDATES]
+    assert results[2].pipeline.named_steps["clf"].n_jobs == -1
+
+
+def test_sweep_writes_candidates_and_leaderboard(s3, raw_csv):
+    manifest = {
+        "features": {"tfidf_max_features": 500},
+        "sweep": {"grid": [{"algorithm": "logreg", "params": {"C": [0.5, 2.0], "max_iter": 300}}], "metric": "accuracy", "workers": 2},
+    }
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-sweep", raw_csv, manifest))
+
+    metrics = json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))
+    board = metrics["sweep"]["leaderboard"]
+    assert metrics["sweep"]["n_candidates"] == 2
+    assert [row["rank"] for row in board] == [1, 2]
+    assert board[0]["accuracy"] >= board[1]["accuracy"]
+    assert metrics["accuracy"] == board[0]["accuracy"]
+    assert {row["candidate_id"] for row in board} == {"00-logreg", "01-logreg"}
+    for row in board:
+        assert (BUCKET, row["model_key"]) in s3.objects
+    best = joblib.load(io.BytesIO(s3.body(f"{res['version_prefix']}/pipeline.joblib")))
+    assert best.named_steps["clf"].C == board[0]["params"]["C"]
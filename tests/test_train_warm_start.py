@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+
+from benchmarks.synthetic import synthetic_raw_dataframe
+from src.preprocess.service import run_preprocess_for_s3_object
+from src.train import service, warm_start
+from tests.conftest import BUCKET, preprocess_job
+
+FEATURES = {"tfidf_max_features": 500}
+PRODUCER_RAW_KEY = "raw/pricerunner/producer/dataset.csv"
+
+
+def _csv(df) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def _producer_run(s3, raw: bytes) -> dict:
+    s3.put_object(Bucket=BUCKET, Key=PRODUCER_RAW_KEY, Body=raw)
+    processed_key = run_preprocess_for_s3_object(s3, BUCKET, PRODUCER_RAW_KEY, engine="batch")["processed_key"]
+    return service.run_training(s3, BUCKET, processed_key)
+
+
+def _warm_start(s3, res: dict) -> dict:
+    return json.loads(s3.body(f"{res['version_prefix']}/metrics.json"))["warm_start"]
+
+
+def test_producer_warm_starts_from_default_model(s3, monkeypatch):
+    monkeypatch.setattr(service, "TRAIN_WARM_START", True)
+    df = synthetic_raw_dataframe(2500, seed=1)
+    first = _producer_run(s3, _csv(df.iloc[:2000]))
+    assert _warm_start(s3, first) == {"used": False, "reason": "no_default_model"}
+
+    # stesso dataset con righe nuove in coda: drift entro le soglie
+    second = _producer_run(s3, _csv(df))
+    info = _warm_start(s3, second)
+    assert info["used"] is True
+    assert info["base_run_id"] == first["run_id"]
+    assert info["n_iter"] >= 1
+    assert info["drift"]["vocabulary_drift"] < warm_start.TRAIN_WARM_START_MAX_VOCABULARY_DRIFT
+    assert info["drift"]["category_drift"] < warm_start.TRAIN_WARM_START_MAX_CATEGORY_DRIFT
+
+
+def test_new_vocabulary_falls_back_to_cold_start(s3, monkeypatch):
+    monkeypatch.setattr(service, "TRAIN_WARM_START", True)
+    df = synthetic_raw_dataframe(2000, seed=1)
+    _producer_run(s3, _csv(df))
+
+    # stesse classi e merchant, titoli con termini mai visti dal vocabolario base
+    drifted = df.copy()
+    drifted["Product Title"] = drifted["Product Title"].str.split().str.join("x ")
+    res = _producer_run(s3, _csv(drifted))
+
+    info = _warm_start(s3, res)
+    assert (info["used"], info["reason"]) == (False, "vocabulary_drift")
+    assert info["drift"]["vocabulary_drift"] > 0.5
+    assert info["drift"]["category_drift"] < warm_start.TRAIN_WARM_START_MAX_CATEGORY_DRIFT
+
+
+def test_new_merchants_fall_back_to_cold_start(s3, monkeypatch):
+    monkeypatch.setattr(service, "TRAIN_WARM_START", True)
+    df = synthetic_raw_dataframe(2000, seed=1)
+    _producer_run(s3, _csv(df))
+
+    drifted = df.copy()
+    drifted.loc[drifted.index[::2], "Merchant ID"] = "new-merchant"
+    res = _producer_run(s3, _csv(drifted))
+
+    info = _warm_start(s3, res)
+    assert (info["used"], info["reason"]) == (False, "category_drift")
+    assert info["drift"]["new_merchants"] >= 1
+    assert 0.4 < info["drift"]["category_drift"] < 0.6
+
+
+def test_changed_classes_fall_back_to_cold_start(s3, monkeypatch):
+    monkeypatch.setattr(service, "TRAIN_WARM_START", True)
+    _producer_run(s3, _csv(synthetic_raw_dataframe(2000, seed=1)))
+
+    df = synthetic_raw_dataframe(2000, seed=2)
+    df = df[df["Category Label"] != df["Category Label"].iloc[0]]
+    res = _producer_run(s3, _csv(df))
+
+    info = _warm_start(s3, res)
+    assert (info["used"], info["reason"]) == (False, "classes_changed")
+
+
+def test_job_sweep_does_not_warm_start(s3, raw_csv):
+    manifest = {
+        "algo": "logreg",
+        "features": FEATURES,
+        "warm_start": True,
+        "sweep": {"candidates": [{"algorithm": "logreg", "params": {"solver": "lbfgs"}}]},
+    }
+    res = service.run_training(s3, BUCKET, preprocess_job(s3, "job-a", raw_csv, manifest))
+
+    assert _warm_start(s3, res) == {"used": False, "reason": "sweep"}